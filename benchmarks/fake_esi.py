@@ -0,0 +1,270 @@
+"""Stand-in ESI for load tests, serving recorded or synthesised data.
+
+Fixtures are read from a directory laid out like:
+
+    versions.json            list of spec versions
+    {version}.json           swagger.json for each version
+    status.json              ESI's status.json
+    types/{id}.json          /universe/types/{id}/ responses
+    dogma/attributes/{id}.json
+    dogma/effects/{id}.json
+
+which record() can fill from the real ESI. Anything missing is made up:
+types are synthesised with deterministic names and dogma, and any other
+GET answers with an empty object.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+from collections import Counter
+from email.utils import formatdate
+
+import requests
+from aiohttp import web
+
+
+ERROR_WINDOW = 60  # seconds, as ESI's error limit
+SYNTH_TYPES = 2000  # types in the synthesised universe
+CACHE_SECONDS = 60  # Expires given to every response
+_NUMBERS = re.compile(r"/\d+(?=/|$)")
+
+
+class FakeESI:
+    """ESI stub with adjustable latency and error rate.
+
+    Args:
+        fixtures: directory of recorded responses, or None
+        latency: mean seconds added to each response (exponential)
+        error_rate: fraction of requests answered with a 502
+    """
+
+    def __init__(self, fixtures=None, latency=0.0, error_rate=0.0):
+        """Load the fixtures, there's nothing to start until app()."""
+
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = Counter()  # {(method, route, status): count}
+        self._errors = []  # times of recent 5xx responses
+        self._specs = {}  # {version: raw swagger.json}
+
+        versions = self._fixture("versions.json") or [
+            x for x in ("latest", "legacy", "dev") if self._raw(x + ".json")
+        ]
+        for version in versions or ["latest"]:
+            raw = self._raw(version + ".json")
+            self._specs[version] = raw or json.dumps(_synth_spec(version))
+
+    def app(self):
+        """Return the aiohttp application."""
+
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self._handle)
+        return app
+
+    def _raw(self, name):
+        """Return a fixture file's bytes, or None."""
+
+        if not self.fixtures:
+            return None
+        try:
+            with open(os.path.join(self.fixtures, name), "rb") as fixture:
+                return fixture.read()
+        except OSError:
+            return None
+
+    def _fixture(self, name):
+        """Return a parsed fixture file, or None."""
+
+        raw = self._raw(name)
+        return None if raw is None else json.loads(raw)
+
+    def _headers(self, status):
+        """Return ESI-like headers, including the error limit."""
+
+        now = time.time()
+        if status >= 500:
+            self._errors.append(now)
+        self._errors = [x for x in self._errors if x > now - ERROR_WINDOW]
+        reset = ERROR_WINDOW - int(now - self._errors[0]) if self._errors \
+            else ERROR_WINDOW
+        return {
+            "Expires": formatdate(now + CACHE_SECONDS, usegmt=True),
+            "X-Esi-Error-Limit-Remain": str(max(100 - len(self._errors), 0)),
+            "X-Esi-Error-Limit-Reset": str(reset),
+        }
+
+    async def _handle(self, request):
+        """Answer any request, after the configured latency and errors."""
+
+        if self.latency:
+            await asyncio.sleep(random.expovariate(1 / self.latency))
+
+        path = "/" + request.match_info["path"]
+        if path != "/ping" and random.random() < self.error_rate:
+            status, body = 502, {"error": "loadtest injected error"}
+        elif request.method == "POST":
+            status, body = 200, self._post(path, await request.json())
+        else:
+            status, body = 200, self._get(path, request.query)
+
+        route = _NUMBERS.sub("/{id}", path)
+        self.requests[(request.method, route, status)] += 1
+
+        headers = self._headers(status)
+        if isinstance(body, tuple):  # (pages, body)
+            headers["X-Pages"] = str(body[0])
+            body = body[1]
+        if isinstance(body, (str, bytes)):  # already encoded
+            return web.Response(
+                status=status,
+                body=body.encode("utf-8") if isinstance(body, str) else body,
+                headers=headers,
+                content_type="application/json",
+            )
+        return web.json_response(body, status=status, headers=headers)
+
+    def _get(self, path, query):
+        """Return the body for a GET."""
+
+        parts = [x for x in path.split("/") if x]
+        if path == "/ping":
+            return "ok"
+        if path == "/versions/":
+            return list(self._specs)
+        if len(parts) == 2 and parts[1] == "swagger.json":
+            return self._specs.get(parts[0], b"{}")
+        if path == "/status.json":
+            return self._fixture("status.json") or []
+        if parts[-2:] == ["v1", "status"]:
+            return {
+                "players": random.randint(10000, 30000),
+                "server_version": "1",
+                "start_time": "2020-01-01T11:00:00Z",
+            }
+        if parts[-3:] == ["v1", "universe", "types"]:
+            page = int(query.get("page", 1))
+            ids = list(range(1, SYNTH_TYPES + 1))
+            return -(-len(ids) // 1000), ids[(page - 1) * 1000:page * 1000]
+        if parts[-3:-1] == ["universe", "types"]:
+            return self._fixture("types/{}.json".format(parts[-1])) or \
+                _synth_type(int(parts[-1]))
+        if parts[-3:-1] in (["dogma", "attributes"], ["dogma", "effects"]):
+            kind, dogma_id = parts[-2], int(parts[-1])
+            return self._fixture("dogma/{}/{}.json".format(kind, dogma_id)) \
+                or _synth_dogma(kind, dogma_id)
+        if parts[-1] == "search":
+            words = query.get("search", "").split()
+            ids = [int(x) for x in words if x.isdigit()]
+            return {"inventory_type": ids} if ids else {}
+        return {}
+
+    @staticmethod
+    def _post(path, body):
+        """Return the body for a POST."""
+
+        if path.endswith("/universe/names/"):
+            return [{
+                "id": x,
+                "name": _synth_type(x)["name"],
+                "category": "inventory_type",
+            } for x in body]
+        return []
+
+    def summary(self):
+        """Return lines of request counts by route and status."""
+
+        return [
+            "{:>7,d}  {} {} {}".format(count, status, method, route)
+            for (method, route, status), count in self.requests.most_common()
+        ]
+
+
+def _synth_spec(version):
+    """Return a small swagger spec."""
+
+    return {
+        "swagger": "2.0",
+        "info": {"version": version, "title": "EVE Swagger Interface"},
+        "basePath": "/{}".format(version),
+        "paths": {
+            "/status/": {"get": {"operationId": "get_status"}},
+            "/universe/types/{type_id}/": {"get": {
+                "operationId": "get_universe_types_type_id",
+                "parameters": [{
+                    "name": "type_id",
+                    "in": "path",
+                    "required": True,
+                    "type": "integer",
+                }],
+            }},
+        },
+    }
+
+
+def _synth_type(type_id):
+    """Return a made up, but stable, type."""
+
+    rand = random.Random(type_id)
+    return {
+        "type_id": type_id,
+        "name": "Loadtest Type {}".format(type_id),
+        "description": "synthesised by benchmarks/fake_esi.py",
+        "group_id": rand.randint(1, 1000),
+        "published": True,
+        "dogma_attributes": [
+            {"attribute_id": x, "value": rand.random() * 1000}
+            for x in rand.sample(range(1, 300), 10)
+        ],
+        "dogma_effects": [
+            {"effect_id": x, "is_default": rand.random() < 0.2}
+            for x in rand.sample(range(1, 100), 3)
+        ],
+    }
+
+
+def _synth_dogma(kind, dogma_id):
+    """Return a made up dogma attribute or effect."""
+
+    key = "attribute_id" if kind == "attributes" else "effect_id"
+    return {key: dogma_id, "name": "loadtest{}{}".format(kind[0], dogma_id)}
+
+
+def record(directory, base_url, type_ids=(34, 35, 36, 587, 11567)):
+    """Save ESI's specs, status and some types with their dogma as fixtures."""
+
+    def _save(name, url):
+        res = requests.get(url)
+        res.raise_for_status()
+        os.makedirs(os.path.dirname(os.path.join(directory, name)),
+                    exist_ok=True)
+        with open(os.path.join(directory, name), "wb") as fixture:
+            fixture.write(res.content)
+        return res.json()
+
+    versions = _save("versions.json", "{}/versions/".format(base_url))
+    for version in versions:
+        _save(version + ".json", "{}/{}/swagger.json".format(base_url, version))
+    _save("status.json", "{}/status.json?version=latest".format(base_url))
+
+    for type_id in type_ids:
+        item = _save(
+            "types/{}.json".format(type_id),
+            "{}/v3/universe/types/{}/".format(base_url, type_id),
+        )
+        for attr in item.get("dogma_attributes", []):
+            _save(
+                "dogma/attributes/{}.json".format(attr["attribute_id"]),
+                "{}/v1/dogma/attributes/{}/".format(
+                    base_url, attr["attribute_id"],
+                ),
+            )
+        for effect in item.get("dogma_effects", []):
+            _save(
+                "dogma/effects/{}.json".format(effect["effect_id"]),
+                "{}/v1/dogma/effects/{}/".format(base_url, effect["effect_id"]),
+            )
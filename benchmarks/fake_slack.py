@@ -0,0 +1,164 @@
+"""Stand-in Slack Web and RTM APIs for load tests.
+
+Serves just enough of the Web API for the bot to connect, join channels
+and reply, and pushes message events down the RTM websocket. Replies are
+matched to the oldest unanswered message in their channel to time them.
+"""
+
+import time
+import uuid
+import random
+import asyncio
+from collections import deque
+
+from aiohttp import web
+from aiohttp import WSMsgType
+
+
+BOT_USER = {"id": "UBOTLOAD01", "name": "esi-bot"}
+PRIMARY = "esi"  # first of the bot's BOT_CHANNELS
+
+
+class FakeSlack:
+    """Fake Slack workspace, generating messages from its users.
+
+    Args:
+        base_url: URL this server will be reachable at
+        channels: number of channels to spread messages over
+        users: number of users to send messages as
+    """
+
+    def __init__(self, base_url, channels=10, users=200):
+        """Create the workspace, serve it with app()."""
+
+        self.base_url = base_url
+        self.channels = {
+            "C{:08d}".format(x): PRIMARY if not x else "load-{}".format(x)
+            for x in range(channels)
+        }
+        self.users = {"U{:08d}".format(x): "user{}".format(x)
+                      for x in range(users)}
+        self.joined = asyncio.Event()
+        self.sent = 0
+        self.replies = 0
+        self.refused = 0  # ephemeral replies, ie from admission control
+        self.unsolicited = 0  # replies to no outstanding message
+        self.latencies = []  # seconds per reply
+        self.methods = {}  # {Web API method: calls}
+        self.connections = set()  # ids of the transports calls came in on
+        self._waiting = {x: deque() for x in self.channels}  # send times
+        self._sockets = set()
+
+    def app(self):
+        """Return the aiohttp application."""
+
+        app = web.Application(client_max_size=16 * 1024 ** 2)
+        app.router.add_post("/api/{method}", self._api)
+        app.router.add_post("/upload/{file_id}", self._upload)
+        app.router.add_get("/rtm", self._rtm)
+        return app
+
+    @property
+    def outstanding(self):
+        """Return the number of messages without a reply yet."""
+
+        return sum(len(x) for x in self._waiting.values())
+
+    async def _api(self, request):
+        """Answer a Web API method."""
+
+        method = request.match_info["method"]
+        self.methods[method] = self.methods.get(method, 0) + 1
+        self.connections.add(id(request.transport))
+        form = await request.post()
+        reply = {"ok": True}
+
+        if method in ("rtm.start", "rtm.connect"):
+            reply.update({
+                "url": "{}/rtm".format(self.base_url.replace("http", "ws", 1)),
+                "self": BOT_USER,
+                "team": {"id": "TLOAD", "domain": "loadtest"},
+                "channels": [],
+                "groups": [],
+                "users": [],
+                "ims": [],
+            })
+        elif method == "channels.list":
+            reply["channels"] = [
+                {"id": x, "name": y} for x, y in self.channels.items()
+            ]
+        elif method == "users.list":
+            reply["members"] = [
+                {"id": x, "name": y} for x, y in self.users.items()
+            ]
+        elif method == "channels.join":
+            reply["channel"] = {
+                "id": form.get("channel"),
+                "name": self.channels.get(form.get("channel")),
+            }
+            self.joined.set()
+        elif method == "files.getUploadURLExternal":
+            file_id = "F{}".format(uuid.uuid4().hex[:10])
+            reply.update({
+                "upload_url": "{}/upload/{}".format(self.base_url, file_id),
+                "file_id": file_id,
+            })
+        elif method in ("chat.postMessage", "chat.postEphemeral"):
+            self._replied(form.get("channel"), method == "chat.postEphemeral")
+        elif method == "files.completeUploadExternal":
+            self._replied(form.get("channel_id"))
+        elif method == "files.upload":
+            self._replied(form.get("channels"))
+
+        return web.json_response(reply)
+
+    async def _upload(self, request):
+        """Accept an uploaded file."""
+
+        await request.read()
+        return web.Response(text="OK - {}".format(request.match_info["file_id"]))
+
+    def _replied(self, channel, ephemeral=False):
+        """Time a reply against its channel's oldest outstanding message."""
+
+        waiting = self._waiting.get(channel)
+        if not waiting:
+            self.unsolicited += 1
+            return
+
+        self.latencies.append(time.perf_counter() - waiting.popleft())
+        self.replies += 1
+        if ephemeral:
+            self.refused += 1
+
+    async def _rtm(self, request):
+        """Hold an RTM websocket open, events are pushed by send()."""
+
+        socket = web.WebSocketResponse(heartbeat=30)
+        await socket.prepare(request)
+        await socket.send_json({"type": "hello"})
+        self._sockets.add(socket)
+        try:
+            async for msg in socket:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self._sockets.discard(socket)
+        return socket
+
+    async def send(self, text):
+        """Send a message from a random user in a random channel."""
+
+        channel = random.choice(list(self.channels))
+        event = {
+            "type": "message",
+            "client_msg_id": str(uuid.uuid4()),
+            "user": random.choice(list(self.users)),
+            "channel": channel,
+            "text": text,
+            "ts": "{:.6f}".format(time.time()),
+        }
+        self._waiting[channel].append(time.perf_counter())
+        self.sent += 1
+        for socket in list(self._sockets):
+            await socket.send_json(event)
@@ -0,0 +1,70 @@
+"""Compare the stdlib and esi_bot.codec on real swagger.json files.
+
+Usage:
+    python benchmarks/json_codec.py [swagger.json ...]
+
+With no arguments the latest, dev and legacy specs are downloaded from ESI.
+"""
+
+import sys
+import json
+import time
+
+import requests
+
+from esi_bot import ESI
+from esi_bot import codec
+
+
+def _best(func, arg, rounds=5):
+    """Return the best of some rounds of func(arg), in milliseconds."""
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def _stdlib_pretty(obj):
+    """Pretty print with the standard library, as codec.pretty used to."""
+
+    return json.dumps(obj, sort_keys=True, indent=4)
+
+
+def main():
+    """Benchmark each spec, print a table."""
+
+    if sys.argv[1:]:
+        specs = {}
+        for path in sys.argv[1:]:
+            with open(path, "rb") as spec_file:
+                specs[path] = spec_file.read()
+    else:
+        specs = {
+            version: requests.get(
+                "{}/{}/swagger.json".format(ESI, version)
+            ).content for version in ("latest", "dev", "legacy")
+        }
+
+    print("backend: {}".format(codec.BACKEND))
+    print("{:<28} {:>8} {:>10} {:>10} {:>11} {:>11} {:>9}".format(
+        "spec", "MB", "json.loads", "codec", "json.dumps", "codec", "same",
+    ))
+    for name, raw in specs.items():
+        spec = json.loads(raw)
+        print("{:<28} {:>8.2f} {:>8.1f}ms {:>8.1f}ms {:>9.1f}ms {:>9.1f}ms "
+              "{:>9}".format(
+                  name[-28:],
+                  len(raw) / 1024 ** 2,
+                  _best(json.loads, raw),
+                  _best(codec.loads, raw),
+                  _best(_stdlib_pretty, spec),
+                  _best(codec.pretty, spec),
+                  str(_stdlib_pretty(spec) == codec.pretty(spec)),
+              ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Load test the bot against stand-in Slack and ESI servers.
+
+Usage:
+    python benchmarks/loadtest.py [--rate 10] [--duration 60] [options]
+
+Starts the fakes from benchmarks/fake_slack.py and benchmarks/fake_esi.py,
+runs the bot (python -m esi_bot.bot) against them through its base URL
+settings, sends it messages at a steady rate and then reports throughput,
+reply latency percentiles, the requests it made to ESI and its memory use
+over time. Needs aiohttp, install with esi-bot[asyncio].
+
+Messages are synthesised from a mix of commands, or replayed in order from
+a file of one message per line with --replay. Fixtures recorded with
+--record are served by the ESI stub with --fixtures.
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+from aiohttp import web
+
+from fake_esi import FakeESI
+from fake_esi import record
+from fake_slack import FakeSlack
+
+
+DEFAULT_MIX = (  # (weight, message), {type} is a random type ID
+    (30, "!esi item {type}"),
+    (15, "!esi item {type} {type} {type}"),
+    (15, "!esi /latest/universe/types/{type}/"),
+    (15, "!esi status"),
+    (10, "!esi tq"),
+    (10, "!esi help"),
+    (5, "!esi version"),
+)
+UNLIMITED = ",".join(
+    "{}=1000000:1000000".format(x)
+    for x in ("user", "channel", "cheap", "api", "heavy")
+)
+SAMPLE_INTERVAL = 1  # seconds between memory samples
+
+
+def _free_port():
+    """Return a port that's free to listen on right now."""
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _messages(args):
+    """Yield message texts forever."""
+
+    if args.replay:
+        with open(args.replay, "r", encoding="utf-8") as replay:
+            lines = [x.strip() for x in replay if x.strip()]
+        while True:
+            yield from lines
+
+    weights, templates = zip(*DEFAULT_MIX)
+    while True:
+        template = random.choices(templates, weights)[0]
+        while "{type}" in template:
+            template = template.replace(
+                "{type}", str(random.randint(1, args.types)), 1,
+            )
+        yield template
+
+
+def _rss(pid):
+    """Return the resident memory of the pid in MB, or None."""
+
+    try:
+        with open("/proc/{}/status".format(pid), "r") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _percentile(values, percent):
+    """Return the percentile of the values."""
+
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _bot_env(args, esi, esi_china, slack):
+    """Return the environment to run the bot with."""
+
+    env = dict(os.environ)
+    env.update({
+        "SLACK_TOKEN": "xoxb-loadtest",
+        "BOT_CHANNELS": ",".join(slack.channels.values()),
+        "ESI_BOT_ESI_URL": esi,
+        "ESI_BOT_ESI_CHINA_URL": esi_china,
+        "ESI_BOT_SLACK_API": "{}/api".format(slack.base_url),
+        "ESI_BOT_ENGINE": args.engine,
+        "ESI_BOT_LOG_LEVEL": args.log_level,
+        "ESI_BOT_CACHE_DIR": tempfile.mkdtemp(prefix="esi-bot-loadtest-"),
+    })
+    if not args.keep_budgets:
+        env["ESI_BOT_BUDGETS"] = UNLIMITED
+    return env
+
+
+async def _serve(app, *ports):
+    """Serve the app on local ports, return its runner."""
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    for port in ports:
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def _run(args):
+    """Run the load test, print the report."""
+
+    esi_ports = (_free_port(), _free_port())  # ESI and ESI China
+    slack_port = _free_port()
+    esi = FakeESI(args.fixtures, args.esi_latency, args.esi_errors)
+    slack = FakeSlack(
+        "http://127.0.0.1:{}".format(slack_port),
+        channels=args.channels,
+        users=args.users,
+    )
+    runners = [
+        await _serve(esi.app(), *esi_ports),
+        await _serve(slack.app(), slack_port),
+    ]
+    env = _bot_env(
+        args,
+        *["http://127.0.0.1:{}".format(x) for x in esi_ports],
+        slack,
+    )
+
+    if args.no_bot:
+        print("fakes are up, run the bot with:")
+        for key in sorted(set(env) - set(os.environ)):
+            print("    export {}={}".format(key, env[key]))
+    else:
+        log = open(args.log, "wb")  # pylint: disable=consider-using-with
+        bot = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "-m", "esi_bot.bot"],
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        print("bot started as pid {}, logging to {}".format(bot.pid, args.log))
+
+    try:
+        await asyncio.wait_for(slack.joined.wait(), args.startup)
+        await asyncio.sleep(1)  # let it post its startup message
+
+        memory = []  # [(seconds in, MB)]
+        messages = _messages(args)
+        start = time.perf_counter()
+        sampled = 0
+        while time.perf_counter() - start < args.duration:
+            await slack.send(next(messages))
+            elapsed = time.perf_counter() - start
+            if not args.no_bot and elapsed - sampled >= SAMPLE_INTERVAL:
+                sampled = elapsed
+                memory.append((elapsed, _rss(bot.pid)))
+            # open loop, the schedule doesn't wait on replies
+            await asyncio.sleep(max(0, slack.sent / args.rate - elapsed))
+        sending = time.perf_counter() - start
+
+        drain = time.perf_counter()
+        while slack.outstanding and time.perf_counter() - drain < args.drain:
+            await asyncio.sleep(0.1)
+        if not args.no_bot:
+            memory.append((time.perf_counter() - start, _rss(bot.pid)))
+    finally:
+        if not args.no_bot:
+            bot.terminate()
+            bot.wait()
+            log.close()
+        for runner in runners:
+            await runner.cleanup()
+
+    _report(slack, esi, sending, memory)
+
+
+def _report(slack, esi, sending, memory):
+    """Print the results."""
+
+    print()
+    print("sent {:,d} messages in {:.1f}s ({:.1f}/s), {:,d} replies ({:,d} "
+          "refused), {:,d} unanswered".format(
+              slack.sent,
+              sending,
+              slack.sent / sending,
+              slack.replies,
+              slack.refused,
+              slack.outstanding,
+          ))
+    print("reply latency ms: p50 {:,.0f}  p90 {:,.0f}  p99 {:,.0f}  "
+          "max {:,.0f}".format(*[
+              _percentile(slack.latencies, x) * 1000 for x in (50, 90, 99, 100)
+          ]))
+
+    print()
+    print("ESI requests: {:,d}".format(sum(esi.requests.values())))
+    for line in esi.summary():
+        print(line)
+
+    print()
+    print("Slack Web API calls: {:,d} over {:,d} connections".format(
+        sum(slack.methods.values()),
+        len(slack.connections),
+    ))
+    for method, calls in sorted(slack.methods.items(), key=lambda x: -x[1]):
+        print("{:>7,d}  {}".format(calls, method))
+
+    if memory:
+        print()
+        print("bot RSS MB: {}".format("  ".join(
+            "{:.0f}s {:.1f}".format(at, rss)
+            for at, rss in memory[::max(1, len(memory) // 10)] + memory[-1:]
+            if rss is not None
+        )))
+
+
+def main():
+    """Parse args, run the load test or record fixtures."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=10,
+                        help="messages per second (default 10)")
+    parser.add_argument("--duration", type=float, default=60,
+                        help="seconds to send messages for (default 60)")
+    parser.add_argument("--drain", type=float, default=30,
+                        help="seconds to wait for late replies (default 30)")
+    parser.add_argument("--startup", type=float, default=120,
+                        help="seconds to wait for the bot to join channels")
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--types", type=int, default=500,
+                        help="type IDs to pick from for item commands")
+    parser.add_argument("--replay", help="file of messages, one per line")
+    parser.add_argument("--fixtures", help="directory of recorded ESI data")
+    parser.add_argument("--record", metavar="DIR",
+                        help="record fixtures from ESI into DIR and exit")
+    parser.add_argument("--esi-latency", type=float, default=0.05,
+                        help="mean ESI response seconds (default 0.05)")
+    parser.add_argument("--esi-errors", type=float, default=0.0,
+                        help="fraction of ESI requests that 502")
+    parser.add_argument("--engine", default="gevent",
+                        choices=("gevent", "asyncio"))
+    parser.add_argument("--keep-budgets", action="store_true",
+                        help="keep the bot's default command rate limits")
+    parser.add_argument("--log", default="loadtest-bot.log",
+                        help="file for the bot's output")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--no-bot", action="store_true",
+                        help="only run the fakes, for a bot started by hand")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, "https://esi.evetech.net")
+        print("recorded ESI fixtures in {}".format(args.record))
+        return
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,21 @@
 """ESI Slack bot."""
 
 # pylint: disable=unused-argument,wrong-import-position,wrong-import-order
-from gevent import monkey
-monkey.patch_all()
+import os
+
+# "asyncio" runs the bot on an event loop (see esi_bot.aio) without gevent
+ENGINE = os.environ.get("ESI_BOT_ENGINE", "gevent")
+if ENGINE == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
 
-import os  # noqa E402
 import logging  # noqa E402
 import pkg_resources  # noqa E402
 from functools import partial  # noqa E402
 from collections import namedtuple  # noqa E402
-from concurrent.futures import as_completed  # noqa E402
+from itertools import islice  # noqa E402
+from concurrent.futures import wait  # noqa E402
+from concurrent.futures import FIRST_COMPLETED  # noqa E402
 from concurrent.futures import ThreadPoolExecutor  # noqa E402
 
 import requests  # noqa E402
@@ -23,10 +29,18 @@ logging.basicConfig(
     format="%(asctime)s:%(name)s:%(levelname)s: %(message)s",
 )
 
-ESI = "https://esi.evetech.net"
-ESI_CHINA = "https://esi.evepc.163.com"
+# base URLs can be pointed elsewhere, ie at benchmarks/loadtest.py's stubs
+ESI = os.environ.get("ESI_BOT_ESI_URL", "https://esi.evetech.net")
+ESI_CHINA = os.environ.get("ESI_BOT_ESI_CHINA_URL", "https://esi.evepc.163.com")
+SLACK_API = os.environ.get("ESI_BOT_SLACK_API", "https://slack.com/api")
 ESI_ISSUES = "https://github.com/esi/esi-issues/"
 ESI_DOCS = "https://docs.esi.evetech.net/"
+GITHUB_API = "https://api.github.com"
+HOST_POOLS = {  # base_url: (pool size, connections to pre-warm, ping path)
+    ESI: (100, 10, "/ping"),
+    ESI_CHINA: (50, 10, "/ping"),
+    GITHUB_API: (10, 2, "/rate_limit"),  # /rate_limit is free
+}
 SNIPPET = namedtuple(
     "Snippet",
     ("content", "filename", "filetype", "comment", "title"),
@@ -35,22 +49,47 @@ REPLY = namedtuple("Reply", ("content", "attachments"))
 EPHEMERAL = namedtuple("Ephemeral", ("content", "attachments"))
 MESSAGE = namedtuple("Message", ("speaker", "command", "args"))
 COMMANDS = {}  # trigger: function
+COMMAND_COSTS = {}  # trigger: cost class, see esi_bot.admission
 EXTENDED_HELP = {}  # name: docstring
 __version__ = pkg_resources.get_distribution("esi-bot").version
 
+from esi_bot import codec  # noqa E402
+from esi_bot import tracing  # noqa E402
+from esi_bot.pools import mount_pools  # noqa E402
+from esi_bot.pools import TimeoutRetry  # noqa E402
+from esi_bot.governor import GOVERNOR  # noqa E402
+from esi_bot.http_cache import ResponseCache  # noqa E402
+from esi_bot.memory import MEMORY  # noqa E402
+
 
 def _build_session():
-    """Build a requests session with a pool and retries."""
+    """Build a requests session with per-host pools and retries."""
 
     ses = requests.Session()
     ses.headers["User-Agent"] = "esi-bot/{}".format(__version__)
-    adapt = HTTPAdapter(max_retries=3, pool_connections=10, pool_maxsize=100)
+    adapt = HTTPAdapter(
+        max_retries=TimeoutRetry(3),
+        pool_connections=10,
+        pool_maxsize=100,
+    )
     ses.mount("http://", adapt)
     ses.mount("https://", adapt)
+    mount_pools(ses, HOST_POOLS)
     return ses
 
 
 SESSION = _build_session()
+RESPONSES = ResponseCache()
+MEMORY.register(
+    "response-cache",
+    lambda: RESPONSES,
+    budget=64,
+    evict=RESPONSES.compact,
+    count=lambda: len(RESPONSES),
+)
+FANOUT_WORKERS = 100
+READ_CHUNK = 64 * 1024  # bytes read at a time from capped responses
+FANOUT = ThreadPoolExecutor(max_workers=FANOUT_WORKERS)
 
 
 def command(func=None, **kwargs):
@@ -61,6 +100,8 @@ def command(func=None, **kwargs):
     KWargs:
         trigger: string, list of strings, or compiled regex pattern.
                  optional, will default to the function name
+        cost: string cost class for admission control, "cheap" (default),
+              "api" for a few upstream requests or "heavy" for fan outs
     """
 
     if func is None:
@@ -69,6 +110,10 @@ def command(func=None, **kwargs):
     LOG.info("Registered command '%s'", func.__name__)
 
     COMMANDS[kwargs.get("trigger", func.__name__)] = func
+    COMMAND_COSTS[kwargs.get("trigger", func.__name__)] = kwargs.get(
+        "cost",
+        "cheap",
+    )
     EXTENDED_HELP[func.__name__] = func.__doc__
     if isinstance(kwargs.get("trigger"), (list, tuple)):
         for trigger in kwargs.get("trigger"):
@@ -76,20 +121,108 @@ def command(func=None, **kwargs):
     return None
 
 
-def do_request(url, return_response=False):
-    """Make a GET request, return the status code and json response."""
+def do_request(url, return_response=False, body=None, headers=None,
+               essential=False, timeout=None, max_bytes=None):
+    """Make a GET request, return the status code and json response.
+
+    If a body is passed it is sent as json in a POST request instead.
+    A timeout (seconds) gives up on the request with a 499 status.
+
+    With max_bytes the body is streamed and reading stops at that many
+    bytes, dropping the connection, with JSON cut back to its last whole
+    top level item (see codec.truncate). Returned responses have their
+    truncated attribute set to if that happened.
+
+    Requests to ESI go through the error limit governor, which may refuse
+    them with a 420 status. Essential requests (specs, status) are allowed
+    to dig deeper into the error budget than user driven ones.
+
+    ESI GET responses are shared through RESPONSES until they expire, and
+    identical concurrent requests (ie from other workspaces) are made once.
 
+    NB: failed or refused requests return a (status, message) tuple, even
+        if return_response is set
+    """
+
+    with tracing.span("do_request", url=url) as span:
+        res = _cached_request(url, return_response, body, headers, essential,
+                              timeout, max_bytes)
+        if isinstance(res, tuple):
+            span.set(status=res[0])
+        else:
+            span.set(status=res.status_code, truncated=res.truncated)
+        return res
+
+
+def _cached_request(url, return_response, body, headers, essential,
+                    timeout, max_bytes):
+    """Make the request for do_request, through the shared cache."""
+
+    headers = dict(headers or {})
     if url.startswith(ESI_CHINA) and "language" not in url:
-        headers = {"Accept-Language": "zh"}
-    else:
-        headers = {}
+        headers.setdefault("Accept-Language", "zh")
+
+    # truncated bodies aren't shared, they're only what the caller wanted
+    if return_response or body is not None or max_bytes is not None or \
+            not url.startswith((ESI, ESI_CHINA)):
+        return _do_request(url, return_response, body, headers, essential,
+                           timeout, max_bytes)
+
+    key = (url, headers.get("Accept-Language"))
+    cached = RESPONSES.get(key)
+    if cached is None and RESPONSES.lead(key):
+        res = None
+        try:
+            res = _do_request(url, True, None, headers, essential, timeout)
+        finally:
+            RESPONSES.done(key, res)
+        if isinstance(res, tuple):
+            return res
+        return res.status_code, _content(res.content)
+
+    if cached is None:
+        # an identical request finished while we waited on it
+        cached = RESPONSES.get(key)
+    if cached is None:
+        return _do_request(url, False, None, headers, essential, timeout)
+
+    status, raw = cached
+    return status, _content(raw)
+
+
+def _do_request(url, return_response, body, headers, essential,
+                timeout=None, max_bytes=None):
+    """Make the request for do_request, without the shared cache."""
+
+    governed = url.startswith((ESI, ESI_CHINA))
+    if governed:
+        refusal = GOVERNOR.admit(essential=essential)
+        if refusal:
+            LOG.warning("refusing to request %s: %s", url, refusal)
+            return 420, "refusing to request {}: {}".format(url, refusal)
 
     try:
-        res = SESSION.get(url, headers=headers)
+        with tracing.span("http", url=url):
+            stream = max_bytes is not None
+            if body is None:
+                res = SESSION.get(url, headers=headers, timeout=timeout,
+                                  stream=stream)
+            else:
+                headers.setdefault("Content-Type", "application/json")
+                res = SESSION.post(url, headers=headers, timeout=timeout,
+                                   stream=stream, data=codec.dumps(body))
+            res.truncated = False
+            if stream:
+                _read_capped(res, max_bytes)
     except Exception as error:
+        if governed:
+            GOVERNOR.record()
         LOG.warning("failed to request %s: %r", url, error)
         return 499, "failed to request {}".format(url)
 
+    if governed:
+        GOVERNOR.record(res.status_code, res.headers)
+
     try:
         res.raise_for_status()
     except Exception as error:
@@ -100,32 +233,75 @@ def do_request(url, return_response=False):
     if return_response:
         return res
 
+    return res.status_code, _content(res.content)
+
+
+def _read_capped(res, max_bytes):
+    """Read a streamed response's body, up to max_bytes of it."""
+
+    chunks = []
+    size = 0
+    for chunk in res.iter_content(READ_CHUNK):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_bytes:
+            break
+
+    body = b"".join(chunks)
+    if size > max_bytes:
+        res.truncated = True
+        res.close()  # rather than reading the rest to reuse the connection
+        body = codec.truncate(body, max_bytes)
+    res._content = body  # pylint: disable=protected-access
+
+
+def _content(raw):
+    """Parse a response body as json, or return it as text."""
+
     try:
-        content = res.json()
+        return codec.loads(raw)
     except ValueError:
-        content = res.text
-
-    return res.status_code, content
+        return raw.decode("utf-8", "replace")
 
 
-def multi_request(urls):
+def multi_request(urls, request_func=None, essential=False):
     """Request a bunch of urls in parallel.
 
+    Requests run on the process wide FANOUT pool, each call keeps at most
+    as many in flight as the ESI error budget allows.
+
     Args:
         urls: iterator of string urls to request
+        request_func: optional replacement for do_request, called per url
+        essential: boolean passed on to do_request
 
     Returns:
         dictionary of {url: (response_code, content)}
     """
 
-    with ThreadPoolExecutor(max_workers=100) as pool:
-        futures = {}  # future: url
+    if request_func is None:
+        request_func = partial(do_request, essential=essential)
 
-        for url in urls:
-            futures[pool.submit(do_request, url)] = url
+    def _submit(url):
+        # each request runs in its own copy of the context, so it's traced
+        GOVERNOR.fanout(1)
+        future = FANOUT.submit(tracing.propagate(request_func), url)
+        future.add_done_callback(lambda _: GOVERNOR.fanout(-1))
+        return future
 
-        results = {}
-        for res in as_completed(futures.keys()):
-            results[futures[res]] = res.result()
+    with tracing.span("multi_request") as span:
+        urls = iter(urls)
+        futures = {}  # future: url
+        for url in islice(urls, GOVERNOR.concurrency(FANOUT_WORKERS)):
+            futures[_submit(url)] = url
 
+        results = {}
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for res in done:
+                results[futures.pop(res)] = res.result()
+                for url in islice(urls, 1):
+                    futures[_submit(url)] = url
+
+        span.set(requests=len(results))
         return results
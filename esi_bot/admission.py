@@ -0,0 +1,166 @@
+"""Token bucket admission control for commands.
+
+Every command has a cost class. Running it takes the class's cost in
+tokens from the speaker's bucket, the channel's bucket and the class's
+own process wide bucket, it's refused if any of them can't cover it.
+Heavy commands are also shed outright while ESI is already busy.
+
+Budgets are configured with ESI_BOT_BUDGETS, a comma separated list of
+scope=capacity:tokens per second, ie "user=60:0.5,heavy=200:2", where
+scope is user, channel or a cost class name.
+"""
+
+
+import os
+import math
+import time
+import threading
+
+from esi_bot import GOVERNOR
+from esi_bot import FANOUT_WORKERS
+from esi_bot.governor import ERROR_FLOOR
+
+
+COST_CLASSES = {  # name: tokens per run
+    "cheap": 1,  # links and canned replies
+    "api": 5,  # a few upstream requests
+    "heavy": 20,  # fans out to ESI, ie item, request, refresh
+}
+DEFAULT_COST = "cheap"
+
+BUDGETS = {  # scope: (capacity, tokens refilled per second)
+    "user": (60, 0.5),
+    "channel": (150, 1.5),
+    "cheap": (300, 10),
+    "api": (300, 5),
+    "heavy": (300, 2),
+}
+
+# fan out requests queued or running at which heavy work is shed, a full
+# pool's worth waiting behind the ones running
+SHED_PENDING = 2 * FANOUT_WORKERS
+
+
+def _parse_budgets(config):
+    """Parse ESI_BOT_BUDGETS style config over the default budgets."""
+
+    budgets = dict(BUDGETS)
+    for part in config.split(","):
+        try:
+            scope, budget = part.split("=")
+            capacity, rate = budget.split(":")
+            budgets[scope.strip()] = (float(capacity), float(rate))
+        except ValueError:
+            continue
+    return budgets
+
+
+class TokenBucket:
+    """A bucket of tokens, refilled continuously up to its capacity."""
+
+    def __init__(self, capacity, rate):
+        """Create a full bucket."""
+
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        """Add the tokens earned since the last refill."""
+
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate,
+        )
+        self.updated = now
+
+    def wait_for(self, cost):
+        """Return the seconds until cost tokens are available, 0 if now."""
+
+        self.refill()
+        if self.tokens >= cost:
+            return 0
+        if cost > self.capacity:
+            return float("inf")
+        return (cost - self.tokens) / self.rate
+
+    @property
+    def full(self):
+        """Boolean of if the bucket has refilled completely."""
+
+        self.refill()
+        return self.tokens >= self.capacity
+
+
+class Admission:
+    """Per user, per channel and per cost class command admission."""
+
+    def __init__(self, budgets=None):
+        """Create an admission controller with no buckets yet."""
+
+        self._lock = threading.Lock()
+        self._budgets = budgets or _parse_budgets(
+            os.environ.get("ESI_BOT_BUDGETS", "")
+        )
+        self._buckets = {}  # {(scope, key): TokenBucket}
+        self.admitted = 0
+        self.limited = 0
+        self.shed = 0
+
+    def _bucket(self, scope, key):
+        """Return the bucket for the scope and key, creating it if needed."""
+
+        if (scope, key) not in self._buckets:
+            self._buckets[(scope, key)] = TokenBucket(*self._budgets[scope])
+        return self._buckets[(scope, key)]
+
+    def admit(self, user, channel, cost_class=DEFAULT_COST):
+        """Decide if a command may run, taking its cost if so.
+
+        Returns:
+            None if the command may run, otherwise a refusal string
+        """
+
+        cost_class = cost_class if cost_class in COST_CLASSES else \
+            DEFAULT_COST
+
+        busy = GOVERNOR.pending >= SHED_PENDING
+        if cost_class == "heavy" and (busy or GOVERNOR.remaining() <= ERROR_FLOOR):
+            self.shed += 1
+            return "ESI is busy right now, please try that again in a bit"
+
+        cost = COST_CLASSES[cost_class]
+        with self._lock:
+            buckets = {
+                "you can run that": self._bucket("user", user),
+                "this channel can run that": self._bucket("channel", channel),
+                "that's busy, try": self._bucket(cost_class, None),
+            }
+            waits = {k: v.wait_for(cost) for k, v in buckets.items()}
+            which, wait = max(waits.items(), key=lambda x: x[1])
+            if wait == float("inf"):
+                self.limited += 1
+                return "that costs more than the budget allows"
+            if wait:
+                self.limited += 1
+                return "slow down, {} again in {}s".format(
+                    which,
+                    math.ceil(wait),
+                )
+
+            for bucket in buckets.values():
+                bucket.tokens -= cost
+            self.admitted += 1
+            return None
+
+    def prune(self):
+        """Drop buckets which have refilled, they're the same as new ones."""
+
+        with self._lock:
+            for key in [k for k, v in self._buckets.items() if v.full]:
+                self._buckets.pop(key)
+
+
+ADMISSION = Admission()
@@ -0,0 +1,342 @@
+"""Asyncio engine, async ESI requests and a Slack RTM client.
+
+Used by the bot when ESI_BOT_ENGINE is "asyncio", and by async commands
+under either engine. Needs aiohttp, install with esi-bot[asyncio].
+"""
+
+
+import time
+import asyncio
+import weakref
+from functools import partial
+from collections import namedtuple
+
+import aiohttp
+
+from esi_bot import ESI
+from esi_bot import ESI_CHINA
+from esi_bot import LOG
+from esi_bot import GOVERNOR
+from esi_bot import RESPONSES
+from esi_bot import SLACK_API
+from esi_bot import HOST_POOLS
+from esi_bot import READ_CHUNK
+from esi_bot import FANOUT_WORKERS
+from esi_bot import codec
+from esi_bot import tracing
+from esi_bot import __version__
+from esi_bot import slack as slack_api
+from esi_bot.pools import KEEPALIVE_INTERVAL
+
+
+TIMEOUT = aiohttp.ClientTimeout(total=60, connect=10)
+SLACK_TIMEOUT = aiohttp.ClientTimeout(
+    connect=slack_api.CONNECT_TIMEOUT,
+    sock_read=slack_api.READ_TIMEOUT,
+)
+RTM_HEARTBEAT = 30  # seconds
+
+# like requests.Response, for the attributes the bot uses
+RESPONSE = namedtuple(
+    "Response",
+    ("status_code", "headers", "content", "truncated"),
+    defaults=(False,),
+)
+
+_SESSIONS = weakref.WeakKeyDictionary()  # {event loop: ClientSession}
+_INFLIGHT = weakref.WeakKeyDictionary()  # {event loop: {key: Future}}
+
+
+def session():
+    """Return the keep-alive ClientSession for the running event loop."""
+
+    loop = asyncio.get_running_loop()
+    if loop not in _SESSIONS:
+        _SESSIONS[loop] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit_per_host=max(x[0] for x in HOST_POOLS.values()),
+                keepalive_timeout=KEEPALIVE_INTERVAL,
+            ),
+            timeout=TIMEOUT,
+            headers={"User-Agent": "esi-bot/{}".format(__version__)},
+        )
+    return _SESSIONS[loop]
+
+
+async def close():
+    """Close the running event loop's ClientSession, if it has one."""
+
+    ses = _SESSIONS.pop(asyncio.get_running_loop(), None)
+    if ses is not None:
+        await ses.close()
+
+
+def run(coro):
+    """Run a coroutine to completion from sync code, ie a gevent command."""
+
+    async def _run():
+        try:
+            return await coro
+        finally:
+            await close()
+
+    return asyncio.run(_run())
+
+
+async def do_request(url, return_response=False, body=None, headers=None,
+                     essential=False, timeout=None, max_bytes=None):
+    """Make an async GET request, return the status code and json response.
+
+    Behaves like esi_bot.do_request, sharing its governor and response
+    cache. Identical concurrent ESI requests on the loop are made once.
+
+    NB: failed or refused requests return a (status, message) tuple, even
+        if return_response is set, otherwise that returns a RESPONSE
+        (which is a namedtuple, so check for that rather than tuple)
+    """
+
+    with tracing.span("do_request", url=url) as span:
+        res = await _cached_request(
+            url, return_response, body, headers, essential, timeout,
+            max_bytes,
+        )
+        span.set(status=res[0])  # RESPONSE is a tuple of status first
+        return res
+
+
+async def _cached_request(url, return_response, body, headers, essential,
+                          timeout, max_bytes):
+    """Make the request for do_request, through the shared cache."""
+
+    headers = dict(headers or {})
+    if url.startswith(ESI_CHINA) and "language" not in url:
+        headers.setdefault("Accept-Language", "zh")
+
+    if return_response or body is not None or max_bytes is not None or \
+            not url.startswith((ESI, ESI_CHINA)):
+        res = await _do_request(url, body, headers, essential, timeout,
+                                max_bytes)
+        if return_response or not isinstance(res, RESPONSE):
+            return res
+        return res.status_code, _content(res.content)
+
+    key = (url, headers.get("Accept-Language"))
+    cached = RESPONSES.get(key)
+    if cached is not None:
+        return cached[0], _content(cached[1])
+
+    inflight = _INFLIGHT.setdefault(asyncio.get_running_loop(), {})
+    if key in inflight:
+        res = await asyncio.shield(inflight[key])
+    else:
+        future = inflight[key] = asyncio.get_running_loop().create_future()
+        res = (499, "failed to request {}".format(url))
+        try:
+            res = await _do_request(url, None, headers, essential, timeout)
+            if isinstance(res, RESPONSE):
+                RESPONSES.store(key, *res[:3])
+        finally:
+            inflight.pop(key)
+            future.set_result(res)
+
+    if not isinstance(res, RESPONSE):
+        return res
+    return res.status_code, _content(res.content)
+
+
+async def _do_request(url, body, headers, essential, timeout=None,
+                      max_bytes=None):
+    """Make the request for do_request, returning a RESPONSE or tuple."""
+
+    governed = url.startswith((ESI, ESI_CHINA))
+    if governed:
+        refusal = GOVERNOR.admit(essential=essential, wait=False)
+        if refusal:
+            LOG.warning("refusing to request %s: %s", url, refusal)
+            return 420, "refusing to request {}: {}".format(url, refusal)
+        await asyncio.sleep(GOVERNOR.backoff())
+
+    options = {"headers": headers}
+    if timeout is not None:  # otherwise the session's TIMEOUT applies
+        options["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+    try:
+        if body is None:
+            request = session().get(url, **options)
+        else:
+            headers.setdefault("Content-Type", "application/json")
+            request = session().post(url, data=codec.dumps(body), **options)
+        with tracing.span("http", url=url):
+            async with request as res:
+                if max_bytes is None:
+                    raw, truncated = await res.read(), False
+                else:
+                    raw, truncated = await _read_capped(res, max_bytes)
+    except Exception as error:  # pylint: disable=broad-except
+        if governed:
+            GOVERNOR.record()
+        LOG.warning("failed to request %s: %r", url, error)
+        return 499, "failed to request {}".format(url)
+
+    if governed:
+        GOVERNOR.record(res.status, res.headers)
+
+    if res.status >= 400:
+        LOG.warning("request to %s failed: %d", url, res.status)
+    else:
+        LOG.info("requested: %s", url)
+
+    return RESPONSE(res.status, res.headers, raw, truncated)
+
+
+async def _read_capped(res, max_bytes):
+    """Read a response body up to max_bytes, return it and if it was cut."""
+
+    chunks = []
+    size = 0
+    async for chunk in res.content.iter_chunked(READ_CHUNK):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_bytes:
+            res.close()  # rather than reading the rest to reuse the connection
+            return codec.truncate(b"".join(chunks), max_bytes), True
+    return b"".join(chunks), False
+
+
+def _content(raw):
+    """Parse a response body as json, or return it as text."""
+
+    try:
+        return codec.loads(raw)
+    except ValueError:
+        return raw.decode("utf-8", "replace")
+
+
+async def multi_request(urls, request_func=None, essential=False):
+    """Request a bunch of urls concurrently.
+
+    Concurrency is scaled down as ESI's error budget shrinks.
+
+    Args:
+        urls: iterator of string urls to request
+        request_func: optional async replacement for do_request
+        essential: boolean passed on to do_request
+
+    Returns:
+        dictionary of {url: (response_code, content)}
+    """
+
+    if request_func is None:
+        request_func = partial(do_request, essential=essential)
+
+    limit = asyncio.Semaphore(GOVERNOR.concurrency(FANOUT_WORKERS))
+    urls = list(urls)
+    GOVERNOR.fanout(len(urls))
+
+    async def _request(url):
+        try:
+            async with limit:
+                return url, await request_func(url)
+        finally:
+            GOVERNOR.fanout(-1)
+
+    return dict(await asyncio.gather(*[_request(x) for x in urls]))
+
+
+class Slack:
+    """Async Slack Web API and RTM client for a single workspace."""
+
+    def __init__(self, token):
+        """Create a client for the token, it connects in events()."""
+
+        self._token = token
+        self.connected = False
+
+    async def api_call(self, method, **kwargs):
+        """Call a Web API method, return its json response."""
+
+        form = aiohttp.FormData()
+        for key, value in kwargs.items():
+            if value is None:
+                continue
+            if key == "file":
+                form.add_field(key, value.read(), filename=kwargs.get(
+                    "filename", "file"
+                ))
+            elif isinstance(value, (list, dict)):
+                form.add_field(key, codec.dumps(value).decode("utf-8"))
+            elif isinstance(value, bool):
+                form.add_field(key, str(value).lower())
+            else:
+                form.add_field(key, str(value))
+
+        start = time.perf_counter()
+        try:
+            async with session().post(
+                    "{}/{}".format(SLACK_API, method),
+                    data=form,
+                    headers={"Authorization": "Bearer {}".format(
+                        self._token
+                    )},
+                    timeout=SLACK_TIMEOUT,
+            ) as res:
+                reply = codec.loads(await res.read())
+        except Exception as error:  # pylint: disable=broad-except
+            slack_api.record(method, time.perf_counter() - start, False)
+            LOG.warning("slack %s failed: %r", method, error)
+            return {"ok": False, "error": repr(error)}
+
+        slack_api.record(method, time.perf_counter() - start, reply.get("ok"))
+        return reply
+
+    async def events(self):
+        """Connect to the RTM API, yield events until disconnected.
+
+        Raises:
+            ConnectionError if the RTM connection can't be started
+        """
+
+        rtm = await self.api_call("rtm.connect")
+        if not rtm.get("ok"):
+            raise ConnectionError(
+                "rtm.connect failed: {}".format(rtm.get("error"))
+            )
+
+        async with session().ws_connect(
+                rtm["url"],
+                heartbeat=RTM_HEARTBEAT,
+        ) as websocket:
+            self.connected = True
+            try:
+                async for msg in websocket:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        event = codec.loads(msg.data)
+                        if "type" in event:
+                            yield event
+                    elif msg.type == aiohttp.WSMsgType.ERROR:
+                        break
+            finally:
+                self.connected = False
+
+
+class SlackBridge:
+    """Blocking access to an async Slack client, from executor threads.
+
+    Lets the sync Processor, Users and Channels run unchanged.
+    """
+
+    def __init__(self, slack, loop):
+        """Bridge calls from other threads onto the client's event loop."""
+
+        self._slack = slack
+        self._loop = loop
+
+    def api_call(self, method, **kwargs):
+        """Call a Web API method, blocking until it's answered."""
+
+        return self.wait(self._slack.api_call(method, **kwargs))
+
+    def wait(self, coro):
+        """Run a coroutine on the event loop, blocking for its result."""
+
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
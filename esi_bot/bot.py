@@ -2,48 +2,242 @@
 
 import os
 import time
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 from slackclient import SlackClient
 
 from esi_bot import ESI
 from esi_bot import ESI_CHINA
 from esi_bot import LOG
+from esi_bot import ENGINE
+from esi_bot import SESSION
+from esi_bot import HOST_POOLS
 from esi_bot import request
+from esi_bot.pools import KEEPALIVE_INTERVAL
+from esi_bot.pools import warm_all
+from esi_bot.slack import SLACK_POOLS
+from esi_bot.slack import SLACK_SESSION
+from esi_bot.slack import pooled
+from esi_bot.scheduler import SCHEDULER
+from esi_bot.type_names import SYNC_CHECK
+from esi_bot.type_names import sync_stale
+from esi_bot.issue_mirror import SYNC_INTERVAL
+from esi_bot.issue_mirror import issue_mirror
+from esi_bot.latency import PROBE_INTERVAL
+from esi_bot.latency import probe_all
+from esi_bot.memory import MEMORY
+from esi_bot.memory import MEASURE_INTERVAL
+from esi_bot.loop_monitor import MONITOR
 from esi_bot.processor import Processor
 from esi_bot.commands import (  # noqa: F401;  # pylint: disable=unused-import
-    get_help, issue_details, issue_new, links, misc, status_esi, status_server, type_info)
+    admin, get_help, issue_details, issue_new, links, misc, status_esi, status_server, type_info)
+from esi_bot.commands.status_server import POLL_INTERVAL
+from esi_bot.commands.status_server import add_listener
+from esi_bot.commands.status_server import poll_all
+
+
+DISPATCH_WORKERS = 20  # events processed at once, across all workspaces
+GC_INTERVAL = 10  # seconds between prunes of replied to messages
+NAMES_INTERVAL = 300  # seconds between Slack user and channel name syncs
+SPECS_INTERVAL = 900  # seconds between ESI spec refreshes
+
+
+def _slack_tokens():
+    """Return the Slack tokens to connect with, one per workspace."""
+
+    tokens = os.environ.get("SLACK_TOKENS") or os.environ["SLACK_TOKEN"]
+    return [x.strip() for x in tokens.split(",") if x.strip()]
+
+
+def _slack_client(token):
+    """Return a SlackClient for the token, on the pooled session."""
+
+    return pooled(SlackClient(token))
+
+
+def _connect(slack, processor):
+    """Connect a workspace to the RTM API and join its channels."""
+
+    if not slack.rtm_connect(auto_reconnect=True):
+        raise SystemExit("Connection to slack failed :(")
+
+    if not processor.on_server_connect():
+        raise SystemExit("Could not join channels")
+
+    LOG.info("Connected to Slack")
+    add_listener(processor.announce)
+
+
+def _rtm_events(slack):
+    """Yield every event waiting on a workspace's RTM websocket.
+
+    NB: rtm_read only reads a single websocket message per call
+    """
+
+    while True:
+        try:
+            events = slack.rtm_read()
+        except BlockingIOError:  # nothing to read on an unencrypted socket
+            return
+        if not events:
+            return
+        yield from events
+
+
+def _schedule(processors):
+    """Add the bot's periodic jobs to the scheduler and start it.
+
+    Args:
+        processors: list of every workspace's Processor, which may grow
+    """
+
+    def _garbage_collect():
+        for processor in list(processors):
+            processor.garbage_collect()
+
+    def _sync_names():
+        for processor in list(processors):
+            processor.sync_names()
+
+    def _refresh_specs():
+        request.do_refresh(ESI)
+        request.do_refresh(ESI_CHINA)
+
+    def _sync_issues():
+        issue_mirror().sync()
+
+    def _keep_alive():
+        warm_all(SESSION, HOST_POOLS, idle=KEEPALIVE_INTERVAL)
+        warm_all(SLACK_SESSION, SLACK_POOLS, idle=KEEPALIVE_INTERVAL)
+
+    # names and specs were loaded on startup, so those jobs start later
+    SCHEDULER.add("garbage-collect", _garbage_collect, GC_INTERVAL)
+    SCHEDULER.add("slack-names", _sync_names, NAMES_INTERVAL,
+                  delay=NAMES_INTERVAL)
+    SCHEDULER.add("esi-specs", _refresh_specs, SPECS_INTERVAL,
+                  delay=SPECS_INTERVAL)
+    SCHEDULER.add("esi-status", status_esi.refresh_all, status_esi.MAX_AGE)
+    SCHEDULER.add("server-status", poll_all, POLL_INTERVAL)
+    SCHEDULER.add("keep-alive", _keep_alive, KEEPALIVE_INTERVAL)
+    SCHEDULER.add("type-names", sync_stale, SYNC_CHECK)
+    SCHEDULER.add("esi-issues", _sync_issues, SYNC_INTERVAL)
+    SCHEDULER.add("latency-probe", probe_all, PROBE_INTERVAL)
+    SCHEDULER.add("memory", MEMORY.enforce, MEASURE_INTERVAL)
+    SCHEDULER.start()
+
+
+def _process_event(processor, event):
+    """Process an event on the dispatcher, logging any failure."""
+
+    try:
+        processor.process_event(event)
+    except Exception:  # pylint: disable=broad-except
+        LOG.exception("failed to process event: %r", event)
 
 
 def main():
-    """Connect to the slack RTM API and pull messages forever."""
+    """Connect to the slack RTM API and pull messages forever.
+
+    Every workspace shares the ESI specs, response cache, request pool and
+    event dispatcher, only their users and channels are kept apart.
+    """
+
+    if ENGINE == "asyncio":
+        asyncio.run(_main_async())
+        return
 
     LOG.info("ESI bot launched")
+    MONITOR.start()
     request.do_refresh(ESI)
     request.do_refresh(ESI_CHINA)
     LOG.info("Loaded ESI specs")
-    slack = SlackClient(os.environ["SLACK_TOKEN"])
-    processor = Processor(slack)
+
+    workspaces = []  # [(SlackClient, Processor)]
+    for token in _slack_tokens():
+        slack = _slack_client(token)
+        workspaces.append((slack, Processor(slack)))
+    _schedule([x[1] for x in workspaces])
+
+    dispatcher = ThreadPoolExecutor(max_workers=DISPATCH_WORKERS)
     while True:
-        if slack.rtm_connect(auto_reconnect=True):
-            if not processor.on_server_connect():
-                raise SystemExit("Could not join channels")
+        for slack, processor in workspaces:
+            if slack.server.connected is not True:
+                _connect(slack, processor)
+
+            for msg in _rtm_events(slack):
+                dispatcher.submit(_process_event, processor, msg)
 
-            LOG.info("Connected to Slack")
-            cycle = 0
-            while slack.server.connected is True:
-                cycle += 1
+        time.sleep(1)  # rtm_read should block, but it doesn't :/
 
-                for msg in slack.rtm_read():
-                    processor.process_event(msg)
 
-                if cycle > 10:
-                    processor.garbage_collect()
-                    cycle = 0
+async def _main_async():
+    """Run every workspace on an event loop, for the asyncio engine.
+
+    Commands (and everything else sync) run unchanged on the dispatcher,
+    talking to Slack through a bridge to the loop.
+    """
+
+    from esi_bot import aio  # pylint: disable=import-outside-toplevel
+
+    LOG.info("ESI bot launched, asyncio engine")
+    loop = asyncio.get_running_loop()
+    dispatcher = ThreadPoolExecutor(max_workers=DISPATCH_WORKERS)
+    watcher = asyncio.ensure_future(MONITOR.watch_async())
+    await loop.run_in_executor(dispatcher, request.do_refresh, ESI)
+    await loop.run_in_executor(dispatcher, request.do_refresh, ESI_CHINA)
+    LOG.info("Loaded ESI specs")
+
+    processors = []  # filled in as the workspaces start
+    _schedule(processors)
+
+    try:
+        await asyncio.gather(*[
+            _run_workspace(aio, token, dispatcher, processors)
+            for token in _slack_tokens()
+        ])
+    finally:
+        watcher.cancel()
+        await aio.close()
+
+
+async def _run_workspace(aio, token, dispatcher, processors):
+    """Receive events for a workspace forever, reconnecting as needed."""
+
+    loop = asyncio.get_running_loop()
+    slack = aio.Slack(token)
+    bridge = aio.SlackBridge(slack, loop)
+    processor = await loop.run_in_executor(
+        dispatcher,
+        partial(Processor, bridge, run_coroutine=bridge.wait),
+    )
+    processors.append(processor)
+
+    while True:
+        try:
+            async for event in slack.events():
+                if event["type"] == "hello":
+                    joined = await loop.run_in_executor(
+                        dispatcher,
+                        processor.on_server_connect,
+                    )
+                    if not joined:
+                        raise SystemExit("Could not join channels")
+                    LOG.info("Connected to Slack")
+                    add_listener(processor.announce)
 
-                time.sleep(1)  # rtm_read should block, but it doesn't :/
+                loop.run_in_executor(
+                    dispatcher,
+                    _process_event,
+                    processor,
+                    event,
+                )
+        except ConnectionError as error:
+            raise SystemExit("Connection to slack failed :(") from error
 
-        else:
-            raise SystemExit("Connection to slack failed :(")
+        LOG.warning("Disconnected from Slack, reconnecting")
+        await asyncio.sleep(1)
 
 
 if __name__ == '__main__':
@@ -2,8 +2,9 @@
 
 
 import os
-import time
 
+from esi_bot import MEMORY
+from esi_bot.memory import evict_oldest
 from esi_bot.utils import paginated_id_to_names
 
 
@@ -15,19 +16,20 @@ class Channels:
 
         self._slack = slack
         self._channels = {}  # {id: name}
-        self._last_sync = 0
         self._allowed = os.environ.get("BOT_CHANNELS", "esi").split(",")
         self._joined = {}  # {id: name}
         self.primary = None  # primary channel ID
+        MEMORY.register(
+            "slack-channels",
+            lambda: self._channels,
+            budget=8,
+            evict=lambda x: evict_oldest(self._channels, x),
+        )
         self.update_names()
 
     def update_names(self):
-        """Update our names cache once per minute at max."""
-
-        if time.time() - self._last_sync < 60:
-            return
+        """Update our names cache, run periodically by the scheduler."""
 
-        self._last_sync = time.time()
         channels = paginated_id_to_names(
             self._slack,
             "channels.list",
@@ -0,0 +1,228 @@
+"""JSON encoding and decoding, with a fast native backend if installed.
+
+The native backend (orjson) is used for parsing specs and responses and
+for encoding, with its pretty output rewritten to be byte for byte the
+same as json.dumps(sort_keys=True, indent=4). Anything it can't encode
+(non-str keys, huge ints) falls back to the stdlib. Set ESI_BOT_JSON to
+"stdlib" to disable the native backend.
+"""
+
+
+import os
+import re
+import json
+import codecs
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+if os.environ.get("ESI_BOT_JSON", "orjson") == "stdlib":
+    orjson = None  # pylint: disable=invalid-name
+
+BACKEND = "orjson" if orjson else "stdlib"
+
+# orjson only renders a float differently to repr() when it has an exponent
+# or is below 1e-4, both can be found by quick literal searches for a token
+# at the end of a line (strings never span lines so only bare numbers can)
+_EXPONENT = re.compile(rb"e[-+]?\d+(?=,?$)", re.MULTILINE)
+_TINY = re.compile(rb"0\.0000\d+(?=,?$)", re.MULTILINE)
+_FLOAT = re.compile(rb"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+TRUNCATE_GUESSES = 32  # commas from the end tried as truncate() cuts
+# strings (perhaps unterminated) or the structural characters outside them
+_STRUCTURE = re.compile(rb'"(?:[^"\\]|\\.)*"?|[][{},]', re.DOTALL)
+_ERRORS = "esi_bot.codec"
+
+
+def loads(data):
+    """Parse JSON from bytes or str.
+
+    Raises:
+        ValueError on invalid JSON
+    """
+
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """Encode compact JSON with sorted keys, as bytes.
+
+    NB: the output is stable within a backend, use for hashing and storage
+    """
+
+    if orjson:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, sort_keys=True).encode("utf-8")
+
+
+def truncate(raw, max_bytes):
+    """Cut JSON bytes to at most max_bytes, keeping them valid if possible.
+
+    Top level arrays and objects are cut after their last complete item
+    and closed, so a long list keeps its first items. Anything else is
+    just cut short.
+    """
+
+    raw = raw[:max_bytes]
+    start = len(raw) - len(raw.lstrip())
+    closing = {b"[": b"]", b"{": b"}"}.get(raw[start:start + 1])
+    if closing is None or max_bytes - start < 2:
+        return raw
+
+    # the last top level comma is usually among the last few, and parsing
+    # a candidate is much quicker than scanning the structure in python
+    if raw.rstrip().endswith(closing):
+        try:
+            loads(raw)
+        except ValueError:
+            pass
+        else:
+            return raw  # it was complete after all
+
+    cut = len(raw)
+    for _ in range(TRUNCATE_GUESSES):
+        cut = raw.rfind(b",", start, cut)
+        if cut < 0:
+            break
+        try:
+            loads(raw[:cut] + closing)
+        except ValueError:
+            continue
+        return raw[:cut] + closing
+
+    depth = 0
+    cut = start + 1
+    for match in _STRUCTURE.finditer(raw, start):
+        char = raw[match.start()]
+        if char in b"[{":
+            depth += 1
+        elif char in b"]}":
+            depth -= 1
+            if not depth:
+                return raw[:match.end()]  # it was complete after all
+        elif char == ord(",") and depth == 1:
+            cut = match.start()
+
+    return raw[:cut] + closing
+
+
+def pretty(obj):
+    """Return json.dumps(obj, sort_keys=True, indent=4), but faster."""
+
+    if orjson:
+        try:
+            encoded = orjson.dumps(
+                obj,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS,
+            )
+        except TypeError:
+            pass
+        else:
+            return _stdlib_style(encoded)
+    return json.dumps(obj, sort_keys=True, indent=4)
+
+
+def iterpretty(obj, batch=100):
+    """Yield pretty(obj) in chunks, so consumers can stop early.
+
+    Top level lists and dictionaries are encoded a batch of items at a
+    time, the pretty form of a slice is the same items at the same indent
+    wrapped in brackets, which are stripped off.
+    """
+
+    if isinstance(obj, dict) and all(isinstance(x, str) for x in obj):
+        keys = sorted(obj)
+        chunks = (
+            {key: obj[key] for key in keys[start:start + batch]}
+            for start in range(0, len(keys), batch)
+        )
+        opening, closing = "{\n", "\n}"
+    elif isinstance(obj, list):
+        chunks = (
+            obj[start:start + batch] for start in range(0, len(obj), batch)
+        )
+        opening, closing = "[\n", "\n]"
+    else:
+        chunks = None
+
+    if not obj or chunks is None:
+        yield pretty(obj)
+        return
+
+    yield opening
+    for index, chunk in enumerate(chunks):
+        if index:
+            yield ",\n"
+        yield pretty(chunk)[2:-2]
+    yield closing
+
+
+def _stdlib_style(encoded):
+    """Rewrite orjson's pretty bytes to match the stdlib's output exactly."""
+
+    # stdlib indents by 4, doubling the leading spaces of each line is
+    # quicker than any replace or regex over the whole output
+    encoded = b"\n".join([
+        line[:len(line) - len(line.lstrip(b" "))] + line
+        for line in encoded.split(b"\n")
+    ])
+
+    encoded = _float_repr(encoded)
+
+    if encoded.isascii() and b"\x7f" not in encoded:
+        return encoded.decode("ascii")
+    text = encoded.decode("utf-8").encode("ascii", _ERRORS).decode("ascii")
+    return text.replace("\x7f", "\\u007f")
+
+
+def _float_repr(encoded):
+    """Render the float tokens repr() disagrees with the way it does."""
+
+    spans = {}
+    for pattern in (_EXPONENT, _TINY):
+        for match in pattern.finditer(encoded):
+            start = max(
+                encoded.rfind(b" ", 0, match.start()),
+                encoded.rfind(b"\n", 0, match.start()),
+            ) + 1
+            if _FLOAT.fullmatch(encoded, start, match.end()):
+                spans[start] = match.end()
+
+    if not spans:
+        return encoded
+
+    parts = []
+    previous = 0
+    for start in sorted(spans):
+        parts.append(encoded[previous:start])
+        parts.append(repr(float(encoded[start:spans[start]])).encode("ascii"))
+        previous = spans[start]
+    parts.append(encoded[previous:])
+    return b"".join(parts)
+
+
+def _ascii_escape(error):
+    """Escape characters the way ensure_ascii does, as a codecs handler."""
+
+    escaped = []
+    for char in error.object[error.start:error.end]:
+        code = ord(char)
+        if code < 0x10000:
+            escaped.append("\\u{:04x}".format(code))
+        else:
+            code -= 0x10000
+            escaped.append("\\u{:04x}\\u{:04x}".format(
+                0xd800 | (code >> 10),
+                0xdc00 | (code & 0x3ff),
+            ))
+    return "".join(escaped), error.end
+
+
+codecs.register_error(_ERRORS, _ascii_escape)
@@ -0,0 +1,279 @@
+"""Commands for bot admins to inspect the bot's internals."""
+
+import time
+
+from esi_bot import EPHEMERAL
+from esi_bot import MEMORY
+from esi_bot import command
+from esi_bot import tracing
+from esi_bot.pools import STATS
+from esi_bot.slack import METHODS
+from esi_bot.memory import MB
+from esi_bot.memory import rss
+from esi_bot.scheduler import SCHEDULER
+from esi_bot.loop_monitor import MONITOR
+from esi_bot.utils import is_admin
+
+
+def _admin_only(msg):
+    """Return an ephemeral refusal for non-admins, or None."""
+
+    if is_admin(msg):
+        return None
+    return EPHEMERAL(
+        content="sorry, `{}` is for bot admins only".format(msg.command),
+        attachments=None,
+    )
+
+
+@command(trigger=("connections", "pools"))
+def connections(msg):
+    """Show connection setup and response timings per upstream host."""
+
+    refusal = _admin_only(msg)
+    if refusal:
+        return refusal
+
+    if not STATS:
+        return "no upstream connections yet"
+
+    lines = ["{:<24} {:>6} {:>9} {:>8} {:>8} {:>9}".format(
+        "host", "conns", "tcp ms", "tls ms", "reqs", "ttfb ms",
+    )]
+    for host, stats in sorted(STATS.items()):
+        summary = stats.summary()
+        lines.append("{:<24} {:>6,d} {:>9,.1f} {:>8,.1f} {:>8,d} {:>9,.1f}".format(
+            host,
+            summary["connections"],
+            summary["connect_ms"],
+            summary["tls_ms"],
+            summary["requests"],
+            summary["ttfb_ms"],
+        ))
+    return "```{}```".format("\n".join(lines))
+
+
+@command
+def slack(msg):
+    """Show Slack Web API call counts and timings per method."""
+
+    refusal = _admin_only(msg)
+    if refusal:
+        return refusal
+
+    if not METHODS:
+        return "no Slack Web API calls yet"
+
+    lines = ["{:<32} {:>7} {:>7} {:>9} {:>9}".format(
+        "method", "calls", "errors", "avg ms", "max ms",
+    )]
+    for method, stats in sorted(
+            METHODS.items(),
+            key=lambda x: x[1].total,
+            reverse=True,
+    ):
+        summary = stats.summary()
+        lines.append("{:<32} {:>7,d} {:>7,d} {:>9,.1f} {:>9,.1f}".format(
+            method,
+            summary["calls"],
+            summary["errors"],
+            summary["avg_ms"],
+            summary["max_ms"],
+        ))
+    return "```{}```".format("\n".join(lines))
+
+
+@command(trigger=("loop", "blocking"))
+def loop(msg):
+    """Show event loop lag and the commands which have blocked it."""
+
+    refusal = _admin_only(msg)
+    if refusal:
+        return refusal
+
+    summary = MONITOR.summary()
+    lines = [
+        "{} loop lag avg {:,.1f}ms, p99 {:,.1f}ms, max {:,.1f}ms "
+        "({:,d} samples)".format(
+            summary["engine"],
+            summary["lag_avg"] * 1000,
+            summary["lag_p99"] * 1000,
+            summary["lag_max"] * 1000,
+            summary["lag_samples"],
+        ),
+        "{:,d} blocks over {}s, {:,.1f}s blocked in total".format(
+            summary["blocks"],
+            summary["threshold"],
+            summary["blocked"],
+        ),
+    ]
+
+    if summary["commands"]:
+        lines.append("")
+        lines.append("{:<20} {:>7} {:>9} {:>9}".format(
+            "command", "blocks", "total s", "max s",
+        ))
+        for name, (count, total, longest) in sorted(
+                summary["commands"].items(),
+                key=lambda x: x[1][1],
+                reverse=True,
+        ):
+            lines.append("{:<20} {:>7,d} {:>9,.2f} {:>9,.2f}".format(
+                name or "(no command)", count, total, longest,
+            ))
+
+    if MONITOR.blocks:
+        block = MONITOR.blocks[-1]
+        lines.append("")
+        lines.append("last block, {:.2f}s by `{}`:".format(
+            block.seconds,
+            block.text or "non-command work",
+        ))
+        lines.extend(x.rstrip() for x in block.stack[-6:])
+
+    return "```{}```".format("\n".join(lines))
+
+
+@command
+def jobs(msg):
+    """Show the periodic jobs and their run times, or run one now.
+
+    Usage:
+        jobs               list the jobs
+        jobs run <name>    run a job now, outside of its schedule
+    """
+
+    refusal = _admin_only(msg)
+    if refusal:
+        return refusal
+
+    if msg.args[:1] == ["run"]:
+        name = " ".join(msg.args[1:])
+        if not SCHEDULER.run_now(name):
+            return "there is no job named `{}`".format(name)
+        return "running `{}`".format(name)
+
+    if not SCHEDULER.jobs:
+        return "no jobs scheduled"
+
+    now = time.time()
+    lines = ["{:<16} {:>8} {:>6} {:>5} {:>5} {:>9} {:>9} {:>8}".format(
+        "job", "every s", "runs", "fail", "skip", "avg ms", "max ms", "ago s",
+    )]
+    errors = []
+    for name, job in sorted(SCHEDULER.jobs.items()):
+        summary = job.summary()
+        lines.append(
+            "{:<16} {:>8,.0f} {:>6,d} {:>5,d} {:>5,d} {:>9,.1f} {:>9,.1f} "
+            "{:>8}".format(
+                name,
+                summary["interval"],
+                summary["runs"],
+                summary["failures"],
+                summary["skipped"],
+                summary["avg"] * 1000,
+                summary["max"] * 1000,
+                "running" if summary["running"] else
+                "{:,.0f}".format(now - summary["last_run"])
+                if summary["last_run"] else "-",
+            )
+        )
+        if summary["last_error"]:
+            errors.append("{}: {}".format(name, summary["last_error"]))
+
+    if errors:
+        lines.append("")
+        lines.extend(errors)
+    return "```{}```".format("\n".join(lines))
+
+
+@command
+def memory(msg):
+    """Show the entries, size and budget of each in-memory store."""
+
+    refusal = _admin_only(msg)
+    if refusal:
+        return refusal
+
+    stores = [x.summary() for x in MEMORY.stores.values()]
+    measured = [x["measured"] for x in stores if x["measured"]]
+    if not measured:
+        return "not measured yet, try `jobs run memory`"
+
+    lines = ["{:<18} {:>9} {:>9} {:>9} {:>6} {:>9}".format(
+        "store", "entries", "MB", "budget", "evict", "evicted",
+    )]
+    for name, summary in sorted(
+            zip(MEMORY.stores, stores),
+            key=lambda x: x[1]["bytes"],
+            reverse=True,
+    ):
+        lines.append("{:<18} {:>9,d} {:>9,.1f} {:>9} {:>6,d} {:>9,d}".format(
+            name,
+            summary["entries"],
+            summary["bytes"] / MB,
+            "{:,.0f}".format(summary["budget"] / MB)
+            if summary["budget"] else "-",
+            summary["evictions"],
+            summary["evicted"],
+        ))
+
+    resident = rss()
+    lines.append("")
+    lines.append("{:,.1f}MB in stores{}, measured {:,.0f}s ago".format(
+        MEMORY.total / MB,
+        " of {:,.1f}MB resident".format(resident / MB) if resident else "",
+        time.time() - min(measured),
+    ))
+    return "```{}```".format("\n".join(lines))
+
+
+@command
+def traces(msg):
+    """Show the slowest traced messages, or the spans of one by its ID."""
+
+    refusal = _admin_only(msg)
+    if refusal:
+        return refusal
+
+    if msg.args:
+        found = tracing.find(msg.args[0])
+        if found is None:
+            return "no kept trace starts with `{}`".format(msg.args[0])
+        return "```{}```".format("\n".join(_waterfall(found)))
+
+    kept = tracing.slowest()
+    if not kept:
+        return "no traces yet"
+
+    lines = ["{:<12} {:>9} {:>6}  {}".format("trace", "ms", "spans", "command")]
+    for found in kept:
+        lines.append("{:<12} {:>9,.1f} {:>6,d}  {}".format(
+            found.trace_id[:12],
+            found.duration * 1000,
+            len(found.spans),
+            found.attr("command") or "",
+        ))
+    if tracing.OTLP_ENDPOINT:
+        lines.append("{:,d} exported, {:,d} dropped by a slow collector".format(
+            tracing.EXPORTS["exported"],
+            tracing.EXPORTS["dropped"],
+        ))
+    return "```{}```".format("\n".join(lines))
+
+
+def _waterfall(found):
+    """Return lines of a trace's spans, indented by depth."""
+
+    depths = {None: -1}
+    lines = ["{:>9} {:>9}  {}".format("start ms", "ms", "span")]
+    for span in found.spans:
+        depths[span.span_id] = depths.get(span.parent_id, 0) + 1
+        lines.append("{:>9,.1f} {:>9,.1f}  {}{} {}".format(
+            (span.start - found.root.start) * 1000,
+            (span.duration or 0) * 1000,
+            "  " * depths[span.span_id],
+            span.name,
+            " ".join("{}={}".format(*x) for x in span.attrs.items()),
+        ))
+    return lines
@@ -1,21 +1,84 @@
-"""Command for looking up an ESI issue."""
+"""Commands for looking up and searching ESI issues."""
 
 import re
 
+from esi_bot import REPLY
+from esi_bot import ESI_ISSUES
 from esi_bot import command
-from esi_bot import do_request
+from esi_bot.github import ISSUES_API
+from esi_bot.github import github_requests
+from esi_bot.issue_mirror import issue_mirror
 
 
-@command(trigger=re.compile(r"^#?(?P<gh_issue>[0-9]+)$"))
+ISSUE_NUMBER = re.compile(r"^#?(?P<gh_issue>[0-9]+)$")
+MAX_ISSUES = 10  # per message
+
+
+@command(trigger=ISSUE_NUMBER, cost="api")
 def issue(match, msg):
-    """Look up ESI-issue details on GitHub."""
+    """Look up ESI-issue details on GitHub.
+
+    Multiple issue numbers can be given at once, ie `!esi 1234 #1235`
+    """
+
+    numbers = [match.groupdict()["gh_issue"]]
+    for arg in msg.args:
+        arg_match = ISSUE_NUMBER.match(arg)
+        if arg_match and arg_match.group("gh_issue") not in numbers:
+            numbers.append(arg_match.group("gh_issue"))
+
+    urls = {
+        "{}/{}".format(ISSUES_API, number): number
+        for number in numbers[:MAX_ISSUES]
+    }
+    results = github_requests(urls)
+
+    replies = []
+    for url, number in urls.items():
+        code, details = results[url]
+        if code >= 400:
+            replies.append(
+                "failed to lookup details for issue {}".format(number)
+            )
+        else:
+            replies.append("{} ({})".format(
+                details["html_url"],
+                details["state"],
+            ))
+    return "\n".join(replies)
+
+
+@command(cost="api")
+def issues(msg):
+    """Return a link to ESI issues, or search them.
+
+    Usage:
+        issues                   link to esi-issues
+        issues search <terms>    find matching esi-issues
+    """
+
+    if msg.args[:1] != ["search"]:
+        return ESI_ISSUES
+
+    query = " ".join(msg.args[1:])
+    if not query:
+        return "usage: !esi issues search <terms>"
+
+    mirror = issue_mirror()
+    if not mirror.ready:
+        return "I'm still mirroring esi-issues, try again in a bit"
 
-    code, details = do_request(
-        "https://api.github.com/repos/esi/esi-issues/issues/{}".format(
-            match.groupdict()["gh_issue"]
-        )
-    )
+    results = mirror.search(query)
+    if not results:
+        return "no esi-issues found matching `{}`".format(query)
 
-    if code >= 400:
-        return "failed to lookup details for issue {}".format(msg.command)
-    return "{} ({})".format(details["html_url"], details["state"])
+    return REPLY(content="\n".join(
+        "<{}issues/{}|#{}> {} ({}{})".format(
+            ESI_ISSUES,
+            number,
+            number,
+            title,
+            state,
+            "".join(", {}".format(label) for label in labels),
+        ) for number, title, labels, state in results
+    ), attachments=None)
@@ -1,7 +1,6 @@
 """Commands which return links to various useful resources."""
 
 from esi_bot import ESI_DOCS
-from esi_bot import ESI_ISSUES
 from esi_bot import command
 from esi_bot.utils import esi_base_url
 
@@ -25,13 +24,6 @@ def faq(*_):
     return "{}docs/FAQ".format(ESI_DOCS)
 
 
-@command
-def issues(*_):
-    """Return a link to ESI issues."""
-
-    return ESI_ISSUES
-
-
 @command
 def sso(*_):
     """Return a link to SSO issues."""
@@ -46,13 +38,6 @@ def webui(msg):
     return "{}/ui/".format(esi_base_url(msg))
 
 
-@command(trigger=("diff", "diffs"))
-def diff(msg):
-    """Return a link to the ESI spec diffs page."""
-
-    return "{}/diff/latest/dev/".format(esi_base_url(msg))
-
-
 @command(trigger=("source", "repo"))
 def source(*_):
     """Return a link to the repo for this bot."""
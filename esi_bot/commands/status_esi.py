@@ -4,15 +4,88 @@ import time
 
 from esi_bot import ESI
 from esi_bot import ESI_CHINA
+from esi_bot import MEMORY
 from esi_bot import REPLY
 from esi_bot import command
 from esi_bot import do_request
 from esi_bot.utils import esi_base_url
 
 STATUS = {
-    ESI: {"timestamp": 0, "status": []},
-    ESI_CHINA: {"timestamp": 0, "status": []},
+    ESI: {"timestamp": 0, "status": [], "routes": {}},
+    ESI_CHINA: {"timestamp": 0, "status": [], "routes": {}},
 }
+MAX_AGE = 60  # seconds before status.json is fetched again
+ROUTE_MAX_AGE = 300  # seconds before route_status ignores our copy
+
+
+def _evict_status(fraction):
+    """Drop held copies of status.json, the scheduler fetches them again."""
+
+    held = [x for x in STATUS if STATUS[x]["status"]]
+    dropped = held[:max(1, int(len(held) * fraction + 0.5))]
+    for base_url in dropped:
+        STATUS[base_url].update({"timestamp": 0, "status": [], "routes": {}})
+    return len(dropped)
+
+
+MEMORY.register(
+    "esi-status",
+    lambda: STATUS,
+    budget=4,
+    evict=_evict_status,
+    count=lambda: sum(len(x["status"]) for x in STATUS.values()),
+)
+
+
+def refresh_status(base_url, max_age=MAX_AGE):
+    """Fetch status.json for the ESI base url, if our copy is stale.
+
+    The statuses are indexed under STATUS[base_url]["routes"] by their
+    method and route template, ie ("get", "/characters/{character_id}/"),
+    which are the same templates the spec's routes are matched against.
+
+    Returns:
+        boolean of if a current copy of status.json is held
+    """
+
+    if time.time() - STATUS[base_url]["timestamp"] <= max_age:
+        return True
+
+    code, esi_status = do_request(
+        "{}/status.json".format(base_url),
+        essential=True,
+    )
+    if code != 200 or not isinstance(esi_status, list):
+        return False
+
+    STATUS[base_url].update({
+        "timestamp": time.time(),
+        "status": esi_status,
+        "routes": {
+            (route["method"], route["route"]): route["status"]
+            for route in esi_status
+        },
+    })
+    return True
+
+
+def refresh_all():
+    """Fetch status.json for every ESI, for the scheduler's job."""
+
+    for base_url in STATUS:
+        refresh_status(base_url, max_age=0)
+
+
+def route_status(base_url, template, method="get"):
+    """Return a route's color in status.json, or None if it's unknown.
+
+    NB: doesn't request status.json, the scheduler keeps it fresh and a
+        copy older than ROUTE_MAX_AGE isn't held against the route
+    """
+
+    if time.time() - STATUS[base_url]["timestamp"] > ROUTE_MAX_AGE:
+        return None
+    return STATUS[base_url]["routes"].get((method, template))
 
 
 def _status_str(statuses):
@@ -32,19 +105,14 @@ def _status_str(statuses):
     return ""
 
 
-@command
+@command(cost="api")
 def status(msg):
     """Return the current ESI health/status."""
 
     base_url = esi_base_url(msg)
 
-    now = time.time()
-    if now - STATUS[base_url]["timestamp"] > 60:
-        code, esi_status = do_request("{}/status.json".format(base_url))
-        if code == 200:
-            STATUS[base_url]["status"] = esi_status
-        else:
-            return ":fire: (failed to fetch status.json)"
+    if not refresh_status(base_url):
+        return ":fire: (failed to fetch status.json)"
 
     attachments = []
     categories = [
@@ -1,14 +1,165 @@
 """Commands for checking the status of various EVE servers."""
 
+import os
+import time
+import threading
 from datetime import datetime
 
 from esi_bot import ESI
 from esi_bot import ESI_CHINA
+from esi_bot import LOG
 from esi_bot import REPLY
 from esi_bot import command
 from esi_bot import do_request
 
 
+SERVERS = {"tranquility": ESI, "serenity": ESI_CHINA}
+POLL_INTERVAL = int(os.environ.get("ESI_BOT_STATUS_INTERVAL", 30))
+CONFIRM_POLLS = 2  # consecutive polls in a new state before it's announced
+
+
+class ServerPoller:
+    """Keep the latest status of a server in memory, announce changes.
+
+    A change is only announced once CONFIRM_POLLS polls in a row agree on
+    it, so a single failed or odd poll doesn't announce an outage and then
+    its recovery.
+    """
+
+    def __init__(self, datasource):
+        """Create a new poller for the datasource."""
+
+        self.datasource = datasource
+        self.latest = None  # (status code, response, timestamp)
+        self.announced = None  # (status code, response) last announced from
+        self.listeners = []  # functions called with announcement strings
+        self._streak = (None, 0)  # (state, consecutive polls in it)
+        self._lock = threading.Lock()
+
+    def poll(self, max_age=None):
+        """Request the current status, announce any transitions.
+
+        Args:
+            max_age: optional seconds, skip polling if the latest is newer
+        """
+
+        with self._lock:
+            if max_age is not None and self.latest is not None and \
+                    time.time() - self.latest[2] < max_age:
+                return
+            status_code, response = do_request(
+                "{}/v1/status/?datasource={}".format(
+                    SERVERS[self.datasource],
+                    self.datasource,
+                ),
+                essential=True,
+            )
+            self.latest = (status_code, response, time.time())
+            announcements = self._confirm((status_code, response))
+
+        for announcement in announcements:
+            for listener in self.listeners:
+                listener(announcement)
+
+    def _confirm(self, current):
+        """Track the state of a poll, return any confirmed transitions."""
+
+        state = _state(*current)
+        streak = self._streak[1] + 1 if state == self._streak[0] else 1
+        self._streak = (state, streak)
+
+        if self.announced is None:
+            self.announced = current
+            return []
+        if state is None or streak < CONFIRM_POLLS or \
+                state == _state(*self.announced):
+            return []
+
+        previous, self.announced = self.announced, current
+        return _transitions(self.datasource.capitalize(), previous, current)
+
+    def current(self):
+        """Return the latest (status code, response), polling if stale."""
+
+        self.poll(max_age=POLL_INTERVAL * 2)
+        return self.latest[:2]
+
+
+POLLERS = {x: ServerPoller(x) for x in SERVERS}
+
+
+def add_listener(listener):
+    """Send the transitions of every server to the listener."""
+
+    for poller in POLLERS.values():
+        if listener not in poller.listeners:
+            poller.listeners.append(listener)
+
+
+def poll_all():
+    """Poll every server once, for the scheduler's server status job."""
+
+    for poller in POLLERS.values():
+        try:
+            poller.poll()
+        except Exception as error:  # pylint: disable=broad-except
+            LOG.warning(
+                "failed to poll %s status: %r",
+                poller.datasource,
+                error,
+            )
+
+
+def _state(status_code, response):
+    """Return what's announced about a status response, or None if unknown.
+
+    Returns:
+        tuple of ("online", start time, vip), ("offline",) or None
+    """
+
+    if status_code == 503:
+        return ("offline",)
+    if status_code != 200:
+        return None
+    return ("online", response["start_time"], response.get("vip") is True)
+
+
+def _transitions(server_name, previous, current):
+    """Describe the changes between two (status code, response) pairs.
+
+    Returns:
+        list of announcement strings
+    """
+
+    old_code, old = previous
+    new_code, new = current
+
+    if old_code == 200 and new_code == 503:
+        return [":fire: {} is offline".format(server_name)]
+
+    if new_code != 200:
+        return []
+
+    if old_code == 503:
+        return [":tada: {} is back online (started at {}{})".format(
+            server_name,
+            new["start_time"],
+            ", in VIP" * int(new.get("vip") is True),
+        )]
+    if old_code != 200:
+        return []
+
+    announcements = []
+    if new["start_time"] != old["start_time"]:
+        announcements.append(":arrows_counterclockwise: {} restarted "
+                             "at {}".format(server_name, new["start_time"]))
+    if new.get("vip") and not old.get("vip"):
+        announcements.append(":lock: {} is in VIP mode".format(server_name))
+    elif old.get("vip") and not new.get("vip"):
+        announcements.append(":unlock: {} left VIP mode".format(server_name))
+    return announcements
+
+
 @command(trigger=("tq", "tranquility"))
 def tranquility(*_):
     """Display current status of Tranquility, the main game server."""
@@ -26,17 +177,10 @@ def serenity(*_):
 def server_status(datsource):
     """Generate a reply describing the status of an EVE server/datasource."""
 
-    if datsource == "tranquility":
-        base_url = ESI
-    elif datsource == "serenity":
-        base_url = ESI_CHINA
-    else:
+    if datsource not in POLLERS:
         return "Cannot request server status for `{}`".format(datsource)
 
-    status_code, response = do_request("{}/v1/status/?datasource={}".format(
-        base_url,
-        datsource,
-    ))
+    status_code, response = POLLERS[datsource].current()
     server_name = datsource.capitalize()
 
     if status_code == 200:
@@ -1,39 +1,70 @@
 """Commands for looking up info on an EVE item type."""
 
-import json
 import time
 
 from esi_bot import SNIPPET
+from esi_bot import codec
 from esi_bot import command
 from esi_bot import do_request
 from esi_bot import multi_request
+from esi_bot.type_names import LANGUAGES
+from esi_bot.type_names import type_names
+from esi_bot.type_names import parse_language
 from esi_bot.utils import esi_base_url
 
 
-@command(trigger=("item", "item_id", "type", "type_id"))
+MAX_COMPARE = 10  # types in a single comparison
+MAX_COLUMN = 40  # characters
+
+
+@command(trigger=("item", "item_id", "type", "type_id"), cost="heavy")
 def item(msg):
-    """Look up a type by ID, including dogma information."""
+    """Look up a type by ID or name, including dogma information.
+
+    Several type IDs compare the types' attributes side by side.
+
+    Options:
+        language=<code>    look up names and details in another language
+    """
 
     start = time.time()
 
-    if not msg.args:
-        return "usage: !esi {} <id>".format(msg.command)
+    language, args = parse_language(msg.args)
+    if language is not None and language not in LANGUAGES:
+        return "ESI only supports the languages {}".format(", ".join(LANGUAGES))
+    args = [x for x in args if x.lstrip("-") not in ("china", "cn", "serenity")]
+    if not args:
+        return "usage: !esi {} <id or name>".format(msg.command)
+
+    base_url = esi_base_url(msg)
+    names = type_names(base_url, language)
 
-    item_id = msg.args[0]
+    type_ids = [x for arg in args for x in arg.split(",") if x]
+    if len(type_ids) > 1 and all(x.isdigit() for x in type_ids):
+        return _compare(msg, names, list(dict.fromkeys(type_ids)), language)
+
+    item_id = args[0]
 
     try:
         int(item_id)
     except ValueError:
-        return "get outta here hackerman"
+        item_id = _find_type(names, " ".join(args))
+        if not isinstance(item_id, int):
+            return item_id
 
-    type_url = "{}/v3/universe/types/{}/".format(esi_base_url(msg), item_id)
+    type_url = _type_url(base_url, item_id, language)
 
     ret, res = do_request(type_url)
+    if not isinstance(res, dict):
+        # refused by the error limit governor (420) or failed (499)
+        return "couldn't look up item {}: {}".format(item_id, res)
+    if ret == 200:
+        names.add(int(item_id), res["name"])
 
     reqs = _expand_dogma(res, *_get_dogma_urls(msg, res))
 
     return SNIPPET(
-        content=json.dumps(res, sort_keys=True, indent=4),
+        content=codec.iterpretty(res),
         filename="{}.json".format(item_id),
         filetype="json",
         comment="Item {}: {} ({:,d} request{} in {:,.0f}ms)".format(
@@ -47,6 +78,145 @@ def item(msg):
     )
 
 
+def _type_url(base_url, type_id, language=None):
+    """Return the ESI url for a type's details."""
+
+    return "{}/v3/universe/types/{}/{}".format(
+        base_url,
+        type_id,
+        "?language={}".format(language) if language else "",
+    )
+
+
+def _compare(msg, names, type_ids, language):
+    """Compare several types side by side.
+
+    Types are fetched concurrently, then the union of their dogma
+    attribute and effect urls is fetched once and shared between them.
+
+    Returns:
+        SNIPPET reply of the comparison table
+    """
+
+    start = time.time()
+    if len(type_ids) > MAX_COMPARE:
+        return "I can only compare up to {} types at once".format(
+            MAX_COMPARE
+        )
+
+    base_url = esi_base_url(msg)
+    type_urls = {_type_url(base_url, x, language): x for x in type_ids}
+    fetched = multi_request(type_urls)
+
+    types = []  # [(type ID, status, details, attr urls, effect urls)]
+    for url, type_id in type_urls.items():
+        ret, res = fetched[url]
+        if ret == 200:
+            names.add(int(type_id), res["name"])
+            types.append((type_id, ret, res, *_get_dogma_urls(msg, res)))
+        else:
+            types.append((type_id, ret, res, {}, {}))
+
+    dogma_urls = set()
+    unshared = 0
+    for _, _, _, attr_urls, effc_urls in types:
+        dogma_urls.update(attr_urls)
+        dogma_urls.update(effc_urls)
+        unshared += len(attr_urls) + len(effc_urls)
+
+    dogma = multi_request(dogma_urls)
+    for _, ret, res, attr_urls, effc_urls in types:
+        if ret == 200:
+            _expand_dogma(res, attr_urls, effc_urls, responses=dogma)
+
+    comment = "Compared {:,d} items ({:,d} requests in {:,.0f}ms, {:,d} " \
+              "saved by sharing dogma lookups)".format(
+                  len(types),
+                  len(type_urls) + len(dogma_urls),
+                  (time.time() - start) * 1000,
+                  unshared - len(dogma_urls),
+              )
+
+    return SNIPPET(
+        content=_comparison_table(types),
+        filename="compare-{}.txt".format("-".join(type_ids)),
+        filetype="text",
+        comment=comment,
+        title="Item comparison",
+    )
+
+
+def _comparison_table(types):
+    """Render expanded types as a text table, one column per type."""
+
+    columns = []  # [(heading, {row: value})]
+    rows = set()
+    for type_id, ret, res, _, _ in types:
+        if ret != 200:
+            columns.append(("{} (error {})".format(type_id, ret), {}))
+            continue
+
+        values = {"type_id": type_id}
+        for key, value in sorted(res.items()):
+            if key not in ("name", "description") and \
+                    not isinstance(value, (dict, list)):
+                values[key] = value
+        for name, value in sorted(res.get("dogma_attributes", {}).items()):
+            values["attr: {}".format(name)] = value
+        for effect in res.get("dogma_effects", []):
+            name = effect.get("effect", {}).get("name", effect["effect_id"])
+            values["effect: {}".format(name)] = "default" if \
+                effect.get("is_default") else "yes"
+
+        rows.update(values)
+        columns.append((res["name"], values))
+
+    # type details first, then attributes, then effects
+    rows = sorted(rows, key=lambda x: (
+        x.startswith("attr: ") + 2 * x.startswith("effect: "),
+        x != "type_id",
+        x,
+    ))
+    table = [["", *(x[0] for x in columns)]]
+    for row in rows:
+        table.append([row, *(str(x[1].get(row, "-")) for x in columns)])
+
+    widths = [
+        min(max(len(x[i]) for x in table), MAX_COLUMN)
+        for i in range(len(table[0]))
+    ]
+    lines = []
+    for index, cells in enumerate(table):
+        lines.append(" | ".join(
+            cell[:width].ljust(width) for cell, width in zip(cells, widths)
+        ).rstrip())
+        if index == 0:
+            lines.append("-+-".join("-" * x for x in widths))
+    return "\n".join(lines)
+
+
+def _find_type(names, query):
+    """Resolve a type name to an ID with the local type name index.
+
+    Returns:
+        integer type ID, or a string reply if it can't be resolved
+    """
+
+    matches = names.find(query)
+    if not matches and names.ready:
+        matches = names.search_esi(query)
+
+    if len(matches) == 1:
+        return matches[0][0]
+    if matches:
+        return "did you mean: {}".format(", ".join(
+            "{} (`{}`)".format(name, type_id) for type_id, name in matches
+        ))
+    if not names.ready:
+        return "I'm still building my type name index, try again in a bit"
+    return "I couldn't find any type named `{}`".format(query)
+
+
 def _get_dogma_urls(msg, res):
     """Modify the item response to extract dogma urls."""
 
@@ -67,9 +237,16 @@ def _get_dogma_urls(msg, res):
     return attr_urls, effc_urls
 
 
-def _expand_dogma(res, attr_urls, effc_urls):
+def _expand_dogma(res, attr_urls, effc_urls, responses=None):
     """Expands dogma information in the type returns.
 
+    Args:
+        res: type details, modified in place
+        attr_urls: dictionary of {url: dogma attribute}
+        effc_urls: dictionary of {url: dogma effect}
+        responses: optional {url: (status, content)} of already fetched
+                   dogma urls, otherwise they're requested here
+
     Returns:
         integer number of additional requests made
     """
@@ -78,8 +255,10 @@ def _expand_dogma(res, attr_urls, effc_urls):
     dogma_effects = []
 
     all_urls = list(attr_urls) + list(effc_urls)
-    for url, response in multi_request(all_urls).items():
-        _ret, _res = response
+    if responses is None:
+        responses = multi_request(all_urls)
+    for url in all_urls:
+        _ret, _res = responses[url]
 
         if url in attr_urls:
             attr = attr_urls[url]
@@ -0,0 +1,395 @@
+"""Structural diffs between ESI spec versions, kept in memory."""
+
+
+import time
+import hashlib
+from collections import namedtuple
+
+from esi_bot import ESI
+from esi_bot import ESI_CHINA
+from esi_bot import SNIPPET
+from esi_bot import codec
+from esi_bot import command
+from esi_bot.routes import route_table
+from esi_bot.utils import esi_base_url
+
+
+METHODS = ("get", "post", "put", "delete", "patch", "head", "options")
+OPERATION = namedtuple(
+    "Operation",
+    ("digest", "params", "responses", "fields", "scopes", "cache"),
+)
+SPEC_DIFF = namedtuple(
+    "SpecDiff",
+    ("added", "removed", "changed", "timestamp"),
+)
+
+# (from, to) version pairs, (version, version) is the last refresh's diff
+DIFFS = {ESI: {}, ESI_CHINA: {}}  # {base_url: {(from, to): SPEC_DIFF}}
+
+_OPERATIONS = {}  # {(base_url, version): {(method, path): OPERATION}}
+_RAW_DIGESTS = {}  # {(base_url, version): set of raw path item digests}
+_SUMMARIES = {}  # {raw path item digest: {method: OPERATION}}
+_CHANGES = {}  # {(digest, digest): [change strings]}
+
+
+def update_diffs(base_url, specs, versions):
+    """Recompute the diffs touching the updated spec versions.
+
+    Only routes whose content hash changed get re-summarised or re-diffed,
+    everything else is answered from the memoised summaries and changes.
+
+    Args:
+        base_url: ESI base url the specs belong to
+        specs: ESI_SPECS[base_url]
+        versions: list of spec versions which were just refreshed
+    """
+
+    now = time.time()
+    diffs = DIFFS.setdefault(base_url, {})
+
+    for version in versions:
+        table = route_table(base_url, version, specs[version])
+        if table is None:
+            continue
+        previous = _OPERATIONS.get((base_url, version))
+        current, raw_digests = _summarise(table)
+        _OPERATIONS[(base_url, version)] = current
+        _RAW_DIGESTS[(base_url, version)] = raw_digests
+        if previous is not None:
+            diffs[(version, version)] = _diff(previous, current, now)
+
+    loaded = sorted(x for x in specs if (base_url, x) in _OPERATIONS)
+    for from_version in loaded:
+        for to_version in loaded:
+            if from_version != to_version and (
+                    from_version in versions or to_version in versions):
+                diffs[(from_version, to_version)] = _diff(
+                    _OPERATIONS[(base_url, from_version)],
+                    _OPERATIONS[(base_url, to_version)],
+                    now,
+                )
+
+    _prune()
+
+
+def spec_operations(base_url, version):
+    """Return the {(method, path): OPERATION} summaries of a spec version.
+
+    NB: these are kept current by update_diffs, empty until it's run
+    """
+
+    return _OPERATIONS.get((base_url, version), {})
+
+
+@command(trigger=("diff", "diffs"))
+def diff(msg):
+    """Show the differences between two ESI spec versions.
+
+    Usage:
+        diff                 latest vs dev
+        diff <version>       changes since my last refresh of version
+        diff <from> <to>     any two loaded spec versions
+    """
+
+    base_url = esi_base_url(msg)
+    versions = [x for x in msg.args if not x.startswith("-")]
+    versions = [x for x in versions if x not in ("china", "cn", "serenity")]
+    from_version, to_version = (versions + ["latest", "dev"])[:2]
+    if len(versions) == 1:
+        to_version = from_version
+
+    hosted = "{}/diff/{}/{}/".format(base_url, from_version, to_version)
+    spec_diff = DIFFS.get(base_url, {}).get((from_version, to_version))
+    if spec_diff is None:
+        if from_version == to_version:
+            return "I need to refresh the {} spec again to diff it".format(
+                from_version
+            )
+        return "I don't have a diff for {} to {} yet, try {}".format(
+            from_version,
+            to_version,
+            hosted,
+        )
+
+    lines = []
+    for method, path in spec_diff.added:
+        lines.append("+ {} {}".format(method.upper(), path))
+    for method, path in spec_diff.removed:
+        lines.append("- {} {}".format(method.upper(), path))
+    for (method, path), changes in sorted(spec_diff.changed.items()):
+        lines.append("! {} {}".format(method.upper(), path))
+        lines.extend("    {}".format(change) for change in changes)
+
+    if from_version == to_version:
+        title = "Changes to the {} ESI{} spec on my last refresh".format(
+            from_version,
+            " China" * int(base_url == ESI_CHINA),
+        )
+        detail = time.strftime(
+            "refreshed %Y-%m-%d %H:%M:%S UTC",
+            time.gmtime(spec_diff.timestamp),
+        )
+    else:
+        title = "Changes from {} to {} in ESI{}".format(
+            from_version,
+            to_version,
+            " China" * int(base_url == ESI_CHINA),
+        )
+        detail = hosted
+
+    return SNIPPET(
+        content="\n".join(lines) or "no changes",
+        filename="{}-{}.diff".format(from_version, to_version),
+        filetype="diff",
+        comment="{:,d} added, {:,d} removed, {:,d} changed ({})".format(
+            len(spec_diff.added),
+            len(spec_diff.removed),
+            len(spec_diff.changed),
+            detail,
+        ),
+        title=title,
+    )
+
+
+def _digest(node):
+    """Return a stable content hash for a json-able node."""
+
+    return hashlib.sha1(codec.dumps(node)).hexdigest()
+
+
+def _summarise(table):
+    """Summarise every operation in the spec, reusing unchanged routes.
+
+    Returns:
+        tuple of ({(method, path): OPERATION}, set of raw route digests)
+    """
+
+    direct = {}  # {ref: set of refs it uses}
+    ref_digests = {}  # {ref: digest of the node it points to}
+
+    operations = {}
+    raw_digests = set()
+    for path, route in table.routes.items():
+        # the route's raw cache key covers the shared params and
+        # definitions it references, so changing one only re-summarises
+        # the routes which use it
+        refs = sorted(_references(table, route.operations, direct))
+        for ref in refs:
+            if ref not in ref_digests:
+                ref_digests[ref] = _digest(table.lookup(ref))
+        raw_digest = _digest([
+            route.operations,
+            [(x, ref_digests[x]) for x in refs],
+        ])
+        raw_digests.add(raw_digest)
+        summary = _SUMMARIES.get(raw_digest)
+        if summary is None:
+            summary = _summarise_route(table, route)
+            _SUMMARIES[raw_digest] = summary
+        for method, operation in summary.items():
+            operations[(method, path)] = operation
+
+    return operations, raw_digests
+
+
+def _references(table, node, direct):
+    """Return the local $refs a node uses, directly or through other refs.
+
+    Args:
+        table: the spec's RouteTable
+        node: json-able node to look for $refs in
+        direct: dictionary of {ref: set of refs}, the $refs used directly
+                by each referenced node, shared between calls
+
+    Returns:
+        set of $ref strings
+    """
+
+    found = set()
+    pending = _direct_references(node)
+    while pending:
+        ref = pending.pop()
+        if ref in found:
+            continue
+        found.add(ref)
+        if ref not in direct:
+            direct[ref] = _direct_references(table.lookup(ref))
+        pending.update(direct[ref])
+    return found
+
+
+def _direct_references(node):
+    """Return the local $refs within a node, not following them."""
+
+    refs = set()
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/"):
+            refs.add(ref)
+        for value in node.values():
+            refs.update(_direct_references(value))
+    elif isinstance(node, list):
+        for value in node:
+            refs.update(_direct_references(value))
+    return refs
+
+
+def _summarise_route(table, route):
+    """Summarise the operations in a single route.
+
+    Returns:
+        dictionary of {method: OPERATION}
+    """
+
+    shared_params = route.operations.get("parameters", [])
+    summary = {}
+    for method in METHODS:
+        if method not in route.operations:
+            continue
+
+        operation = table.expand(route.operations[method])
+        params = {}
+        for param in table.expand(shared_params) + operation.get(
+                "parameters", []):
+            params["{} ({})".format(param.get("name"), param.get("in"))] = \
+                _digest(param)
+
+        responses = {}
+        fields = frozenset()
+        for code, response in operation.get("responses", {}).items():
+            responses[code] = _digest(response.get("schema"))
+            if code.startswith("2"):
+                fields = fields.union(_fields(response.get("schema")))
+
+        scopes = set()
+        for security in operation.get("security", []):
+            for values in security.values():
+                scopes.update(values)
+
+        summary[method] = OPERATION(
+            digest=_digest([shared_params, operation]),
+            params=params,
+            responses=responses,
+            fields=fields,
+            scopes=frozenset(scopes),
+            cache=operation.get("x-cached-seconds"),
+        )
+
+    return summary
+
+
+def _fields(schema, prefix=""):
+    """Flatten a response schema into a set of field descriptions."""
+
+    if not isinstance(schema, dict):
+        return set()
+
+    if schema.get("type") == "array":
+        return _fields(schema.get("items"), "{}[]".format(prefix))
+
+    properties = schema.get("properties")
+    if not properties:
+        return {"{} {}{}".format(
+            prefix or "response",
+            schema.get("type", "object"),
+            " ({})".format(schema["format"]) if "format" in schema else "",
+        )}
+
+    fields = set()
+    required = set(schema.get("required", []))
+    for name, prop in properties.items():
+        path = "{}.{}".format(prefix, name) if prefix else name
+        if name in required:
+            fields.add("{} required".format(path))
+        fields.update(_fields(prop, path))
+    return fields
+
+
+def _diff(previous, current, timestamp):
+    """Compare two operation summaries.
+
+    Returns:
+        SPEC_DIFF namedtuple
+    """
+
+    changed = {}
+    for key in set(previous).intersection(current):
+        old, new = previous[key], current[key]
+        if old.digest == new.digest:
+            continue
+        cache_key = (old.digest, new.digest)
+        if cache_key not in _CHANGES:
+            _CHANGES[cache_key] = _changes(old, new)
+        changed[key] = _CHANGES[cache_key]
+
+    return SPEC_DIFF(
+        added=sorted(set(current).difference(previous), key=_path_order),
+        removed=sorted(set(previous).difference(current), key=_path_order),
+        changed=changed,
+        timestamp=timestamp,
+    )
+
+
+def _path_order(key):
+    """Sort (method, path) keys by path first."""
+
+    return key[1], key[0]
+
+
+def _changes(old, new):
+    """Describe the differences between two versions of an operation.
+
+    Returns:
+        list of change description strings
+    """
+
+    changes = []
+    for name in sorted(set(new.params).difference(old.params)):
+        changes.append("param {} added".format(name))
+    for name in sorted(set(old.params).difference(new.params)):
+        changes.append("param {} removed".format(name))
+    for name in sorted(set(old.params).intersection(new.params)):
+        if old.params[name] != new.params[name]:
+            changes.append("param {} changed".format(name))
+
+    for code in sorted(set(new.responses).difference(old.responses)):
+        changes.append("response {} added".format(code))
+    for code in sorted(set(old.responses).difference(new.responses)):
+        changes.append("response {} removed".format(code))
+    for code in sorted(set(old.responses).intersection(new.responses)):
+        if old.responses[code] != new.responses[code]:
+            changes.append("response {} schema changed".format(code))
+
+    for field in sorted(new.fields.difference(old.fields)):
+        changes.append("field added: {}".format(field))
+    for field in sorted(old.fields.difference(new.fields)):
+        changes.append("field removed: {}".format(field))
+
+    for scope in sorted(new.scopes.difference(old.scopes)):
+        changes.append("scope added: {}".format(scope))
+    for scope in sorted(old.scopes.difference(new.scopes)):
+        changes.append("scope removed: {}".format(scope))
+
+    if old.cache != new.cache:
+        changes.append("cache time changed from {}s to {}s".format(
+            old.cache,
+            new.cache,
+        ))
+
+    return changes or ["description or metadata changed"]
+
+
+def _prune():
+    """Drop memoised summaries and changes no longer referenced."""
+
+    digests = set()
+    for operations in _OPERATIONS.values():
+        digests.update(x.digest for x in operations.values())
+
+    for key in [x for x in _CHANGES if not digests.issuperset(x)]:
+        _CHANGES.pop(key)
+
+    live = set().union(*_RAW_DIGESTS.values())
+    for key in [x for x in _SUMMARIES if x not in live]:
+        _SUMMARIES.pop(key)
@@ -0,0 +1,133 @@
+"""Cached, rate limit aware access to the GitHub API."""
+
+
+import time
+
+from esi_bot import LOG
+from esi_bot import MEMORY
+from esi_bot import codec
+from esi_bot import ESI_ISSUES
+from esi_bot import GITHUB_API
+from esi_bot import do_request
+from esi_bot import multi_request
+from esi_bot.memory import evict_oldest
+
+
+ISSUES_API = "{}issues".format(ESI_ISSUES.replace(
+    "https://github.com/",
+    "{}/repos/".format(GITHUB_API),
+))
+
+RATE_LIMIT = {"remaining": None, "reset": 0}
+CACHE = {}  # {url: {"etag": str, "content": json, "timestamp": float}}
+MAX_CACHED = 500  # responses kept, the least recently stored are dropped
+MEMORY.register(
+    "github-cache",
+    lambda: CACHE,
+    budget=16,
+    evict=lambda x: evict_oldest(CACHE, x),
+)
+
+
+def github_request(url, cache=True):
+    """Make a conditional GET request to the GitHub API.
+
+    Responses are cached by ETag; a 304 doesn't count against the rate
+    limit and is answered from the cache. Cached content is also used
+    while we're throttled, or if the request fails outright.
+
+    Args:
+        url: GitHub API url to GET
+        cache: boolean, False for urls which won't be requested again,
+               ie with a `since=`, which are neither cached nor looked up
+
+    Returns:
+        tuple of (status code, json content)
+    """
+
+    cached = CACHE.get(url) if cache else None
+    if throttled():
+        if cached:
+            return 200, cached["content"]
+        return 429, "GitHub rate limit exceeded, resets at {}".format(
+            time.strftime("%H:%M:%S UTC", time.gmtime(RATE_LIMIT["reset"]))
+        )
+
+    headers = {"Accept": "application/vnd.github.v3+json"}
+    if cached:
+        headers["If-None-Match"] = cached["etag"]
+
+    res = do_request(url, return_response=True, headers=headers)
+    if isinstance(res, tuple):
+        # failed to connect at all
+        return (200, cached["content"]) if cached else res
+
+    _track_rate_limit(res.headers)
+
+    if res.status_code == 304 and cached:
+        cached["timestamp"] = time.time()
+        return 200, cached["content"]
+
+    try:
+        content = codec.loads(res.content)
+    except ValueError:
+        content = res.text
+
+    if cache and res.status_code == 200 and "ETag" in res.headers:
+        _store(url, {
+            "etag": res.headers["ETag"],
+            "content": content,
+            "timestamp": time.time(),
+        })
+    elif res.status_code in (403, 429) and cached:
+        LOG.warning("GitHub throttled %s, using cached content", url)
+        return 200, cached["content"]
+
+    return res.status_code, content
+
+
+def github_requests(urls):
+    """Make many conditional GitHub requests concurrently.
+
+    Returns:
+        dictionary of {url: (status code, json content)}
+    """
+
+    return multi_request(urls, request_func=github_request)
+
+
+def _store(url, entry):
+    """Cache a response, dropping the oldest if the cache is full."""
+
+    CACHE.pop(url, None)  # so a refreshed url is the newest again
+    while len(CACHE) >= MAX_CACHED:
+        CACHE.pop(next(iter(CACHE)), None)
+    CACHE[url] = entry
+
+
+def throttled():
+    """Return boolean of if we're out of unauthenticated GitHub requests."""
+
+    if RATE_LIMIT["remaining"] is None or RATE_LIMIT["remaining"] > 0:
+        return False
+    if time.time() >= RATE_LIMIT["reset"]:
+        RATE_LIMIT["remaining"] = None
+        return False
+    return True
+
+
+def _track_rate_limit(headers):
+    """Record the rate limit state from GitHub response headers."""
+
+    try:
+        RATE_LIMIT["remaining"] = int(headers["X-RateLimit-Remaining"])
+        RATE_LIMIT["reset"] = int(headers["X-RateLimit-Reset"])
+    except (KeyError, ValueError):
+        return
+
+    if RATE_LIMIT["remaining"] < 10:
+        LOG.warning(
+            "%d GitHub requests remaining until %s",
+            RATE_LIMIT["remaining"],
+            time.strftime("%H:%M:%S UTC", time.gmtime(RATE_LIMIT["reset"])),
+        )
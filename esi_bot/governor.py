@@ -0,0 +1,142 @@
+"""Process wide governor for ESI's error limit."""
+
+
+import os
+import time
+import random
+import threading
+
+
+ERROR_LIMIT = 100  # errors allowed per ESI error limit window
+ERROR_WINDOW = 60  # seconds, used if ESI doesn't tell us the reset
+ERROR_FLOOR = int(os.environ.get("ESI_BOT_ERROR_FLOOR", 20))
+HARD_FLOOR = 5  # even essential requests stop here
+BACKOFF_BASE = 0.5  # seconds, doubled per consecutive 5xx
+BACKOFF_MAX = 30  # seconds
+MAX_WAIT = 5  # seconds a non-essential request will wait out a backoff
+
+
+class ErrorLimitGovernor:
+    """Track ESI's error limit and back off before we get banned.
+
+    Non-essential requests are refused once the remaining error budget
+    drops to ERROR_FLOOR, essential ones (spec and status refreshes) can
+    continue down to HARD_FLOOR. 5xx responses trigger an exponential
+    backoff with full jitter, a 420 blocks everything until the reset.
+    """
+
+    def __init__(self):
+        """Start with a full error budget."""
+
+        self._lock = threading.Lock()
+        self.remain = ERROR_LIMIT
+        self.reset_at = 0  # when the current error window ends
+        self.blocked_until = 0  # set by a 420
+        self.backoff_until = 0
+        self.failures = 0  # consecutive 5xx responses
+        self.inflight = 0  # admitted requests without a response yet
+        self.pending = 0  # fan out requests queued or running
+        self.refused = 0
+
+    def remaining(self):
+        """Return the error budget left in the current window."""
+
+        if time.time() >= self.reset_at:
+            return ERROR_LIMIT
+        return self.remain
+
+    def admit(self, essential=False, wait=True):
+        """Decide if a request may be made, waiting out short backoffs.
+
+        Args:
+            essential: boolean, allow the request closer to the limit
+            wait: boolean, sleep out any backoff here. Async callers should
+                  pass False and wait for backoff() themselves
+
+        Returns:
+            None if the request may proceed, otherwise a refusal string
+        """
+
+        now = time.time()
+        refusal = None
+        if now < self.blocked_until:
+            refusal = "ESI error limited for {:.0f}s".format(
+                self.blocked_until - now
+            )
+        elif self.remaining() <= (HARD_FLOOR if essential else ERROR_FLOOR):
+            refusal = "ESI error budget low ({} left, resets in {:.0f}s)" \
+                      "".format(self.remaining(), self.reset_at - now)
+        elif self.backoff_until - now > MAX_WAIT and not essential:
+            refusal = "backing off ESI for {:.0f}s after errors".format(
+                self.backoff_until - now
+            )
+
+        if refusal:
+            with self._lock:
+                self.refused += 1
+            return refusal
+
+        if wait and self.backoff():
+            time.sleep(self.backoff())
+
+        with self._lock:
+            self.inflight += 1
+        return None
+
+    def fanout(self, count):
+        """Count fan out requests queued (positive) or finished (negative)."""
+
+        with self._lock:
+            self.pending += count
+
+    def backoff(self):
+        """Return the seconds left of the current 5xx backoff."""
+
+        return max(self.backoff_until - time.time(), 0)
+
+    def record(self, status_code=None, headers=None):
+        """Record the outcome of an admitted request.
+
+        Args:
+            status_code: integer HTTP status, or None if the request failed
+            headers: response headers mapping
+        """
+
+        headers = headers or {}
+        now = time.time()
+        with self._lock:
+            self.inflight -= 1
+
+            try:
+                self.remain = int(headers["X-Esi-Error-Limit-Remain"])
+                self.reset_at = now + int(headers["X-Esi-Error-Limit-Reset"])
+            except (KeyError, ValueError):
+                pass
+
+            if status_code == 420:
+                self.remain = 0
+                self.reset_at = max(self.reset_at, now + ERROR_WINDOW)
+                self.blocked_until = self.reset_at
+            elif status_code is None or status_code >= 500:
+                self.failures += 1
+                backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** self.failures)
+                self.backoff_until = max(
+                    self.backoff_until,
+                    now + random.uniform(0, backoff),
+                )
+            else:
+                self.failures = 0
+
+    def concurrency(self, maximum):
+        """Scale a worker count down as the error budget shrinks."""
+
+        budget = self.remaining() - ERROR_FLOOR
+        if budget <= 0:
+            return 1
+        return max(1, min(
+            maximum,
+            int(maximum * budget / (ERROR_LIMIT - ERROR_FLOOR)),
+        ))
+
+
+GOVERNOR = ErrorLimitGovernor()
@@ -0,0 +1,133 @@
+"""Process wide cache of ESI responses, shared by every workspace."""
+
+
+import time
+import threading
+from email.utils import parsedate_to_datetime
+
+
+MAX_ENTRIES = 5000
+WAIT = 30  # seconds to wait on an identical in-flight request
+
+
+class ResponseCache:
+    """Cache ESI responses until they expire, coalescing in-flight requests.
+
+    Raw response bodies are cached rather than parsed content, so callers
+    are free to modify what they're given. Only one of any concurrent
+    identical requests goes upstream, the rest wait for its response.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        """Create a new, empty cache."""
+
+        self._lock = threading.Lock()
+        self._entries = {}  # {key: (expires, status, raw body)}
+        self._inflight = {}  # {key: threading.Event}
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        """Return the number of cached responses."""
+
+        return len(self._entries)
+
+    def get(self, key):
+        """Return a (status, raw body) tuple for the key, or None."""
+
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            return None
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def lead(self, key):
+        """Claim the upstream request for the key.
+
+        Returns:
+            boolean, True if the caller should make the request and then
+            call done(), False once an identical request has finished
+        """
+
+        with self._lock:
+            event = self._inflight.get(key)
+            if event is None:
+                self._inflight[key] = threading.Event()
+                self.misses += 1
+                return True
+
+        event.wait(WAIT)
+        self.coalesced += 1
+        return False
+
+    def done(self, key, res=None):
+        """Store the response if it's cacheable, release any waiters.
+
+        Args:
+            key: the key previously passed to lead()
+            res: requests.Response, or None if the request failed
+        """
+
+        if res is not None and not isinstance(res, tuple):
+            self.store(key, res.status_code, res.headers, res.content)
+
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event:
+            event.set()
+
+    def store(self, key, status, headers, raw):
+        """Cache a response body if it was successful and has an expiry."""
+
+        expires = _expires(status, headers)
+        if not expires:
+            return
+
+        with self._lock:
+            self._store(key, (expires, status, raw))
+
+    def compact(self, fraction):
+        """Drop expired entries, then the oldest until fraction are gone.
+
+        Returns:
+            integer number of entries dropped
+        """
+
+        with self._lock:
+            count = int(len(self._entries) * fraction + 0.5)
+            now = time.time()
+            expired = [k for k, v in self._entries.items() if v[0] <= now]
+            for key in expired:
+                self._entries.pop(key)
+            remaining = max(count - len(expired), 0)
+            oldest = list(self._entries)[:remaining]
+            for key in oldest:
+                self._entries.pop(key)
+            return len(expired) + len(oldest)
+
+    def _store(self, key, entry):
+        """Add an entry, dropping expired or the oldest entries if full."""
+
+        if len(self._entries) >= self._max_entries:
+            now = time.time()
+            for expired in [k for k, v in self._entries.items() if v[0] <= now]:
+                self._entries.pop(expired)
+        if len(self._entries) >= self._max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = entry
+
+
+def _expires(status, headers):
+    """Return the unix time a successful response expires, or None."""
+
+    if status != 200:
+        return None
+
+    try:
+        expires = parsedate_to_datetime(headers["Expires"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    return expires if expires > time.time() else None
@@ -0,0 +1,134 @@
+"""Local, searchable mirror of the esi-issues repository."""
+
+
+import threading
+
+from esi_bot import LOG
+from esi_bot.github import ISSUES_API
+from esi_bot.github import github_request
+from esi_bot.search import InvertedIndex
+from esi_bot.utils import load_cache
+from esi_bot.utils import save_cache
+
+
+MIRROR_FILE = "esi-issues.json"
+SYNC_INTERVAL = 600  # seconds between incremental syncs, by the scheduler
+MAX_BODY = 2000  # characters of each issue body to keep
+PER_PAGE = 100
+
+
+class IssueMirror:
+    """Compact copy of esi-issues, synced incrementally with `since=`."""
+
+    def __init__(self):
+        """Create the mirror, loading any persisted copy."""
+
+        self._issues = {}  # {number: [title, labels, state, body]}
+        self._index = InvertedIndex(weights={"title": 3, "labels": 2})
+        self._lock = threading.Lock()
+        self.since = None  # newest updated_at seen, ISO 8601
+
+        cached = load_cache(MIRROR_FILE)
+        if cached:
+            self.since = cached["since"]
+            for number, details in cached["issues"].items():
+                self._store(int(number), *details)
+
+    @property
+    def ready(self):
+        """Boolean of if the mirror has been synced at least once."""
+
+        return self.since is not None
+
+    def __len__(self):
+        """Return the number of mirrored issues."""
+
+        return len(self._issues)
+
+    def _store(self, number, title, labels, state, body):
+        """Store and index a single issue."""
+
+        self._issues[number] = [title, labels, state, body]
+        self._index.add(number, {
+            "title": title,
+            "labels": " ".join(labels),
+            "body": body,
+        })
+
+    def sync(self):
+        """Fetch issues updated since the last sync from GitHub.
+
+        Returns:
+            integer number of issues updated, or None if already syncing
+        """
+
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            updated = 0
+            since = self.since
+            page = 1
+            while True:
+                url = "{}?state=all&sort=updated&direction=asc" \
+                      "&per_page={}&page={}{}".format(
+                          ISSUES_API,
+                          PER_PAGE,
+                          page,
+                          "&since={}".format(since) if since else "",
+                      )
+                # each sync's since= is new, caching the pages is a leak
+                status, issues = github_request(url, cache=False)
+                if status != 200:
+                    LOG.warning("failed to sync esi-issues: %r", issues)
+                    break
+
+                for details in issues:
+                    self.since = max(self.since or "", details["updated_at"])
+                    if "pull_request" in details:
+                        continue
+                    issue = [
+                        details["title"],
+                        [x["name"] for x in details.get("labels", [])],
+                        details["state"],
+                        (details.get("body") or "")[:MAX_BODY],
+                    ]
+                    if self._issues.get(details["number"]) != issue:
+                        self._store(details["number"], *issue)
+                        updated += 1
+
+                if len(issues) < PER_PAGE:
+                    break
+                page += 1
+
+            if updated or since != self.since:
+                save_cache(MIRROR_FILE, {
+                    "since": self.since,
+                    "issues": self._issues,
+                })
+            return updated
+        finally:
+            self._lock.release()
+
+    def search(self, query, limit=5):
+        """Search the mirror.
+
+        Returns:
+            list of (number, title, labels, state) tuples, best first
+        """
+
+        return [
+            (number, *self._issues[number][:3])
+            for _, number in self._index.search(query, limit)
+        ]
+
+
+_MIRROR = []  # lazily created IssueMirror
+
+
+def issue_mirror():
+    """Return the shared IssueMirror, loading it on first use."""
+
+    if not _MIRROR:
+        _MIRROR.append(IssueMirror())
+    return _MIRROR[0]
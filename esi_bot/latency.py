@@ -0,0 +1,351 @@
+"""Synthetic latency probes of ESI's public GET routes.
+
+Every GET route in the latest spec which needs no authentication, and
+whose path and required query params all have a known good sample below,
+is a probe target. Each run of the scheduler's job probes the next few
+targets of each datasource, concurrently and uncached, at most
+ESI_BOT_PROBE_BUDGET requests per datasource per run. Results are kept
+as counts in logarithmic latency bins per five minute slot, for the last
+hour, not as raw samples.
+
+NB: a 404 from a stale sample is still an answer, only 5xx responses,
+    timeouts and connection failures count as errors
+"""
+
+
+import os
+import math
+import time
+import bisect
+import threading
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from esi_bot import ESI
+from esi_bot import ESI_CHINA
+from esi_bot import LOG
+from esi_bot import MEMORY
+from esi_bot import command
+from esi_bot import do_request
+from esi_bot import multi_request
+from esi_bot.request import ESI_SPECS
+from esi_bot.memory import evict_oldest
+from esi_bot.routes import route_table
+
+
+PROBE_BUDGET = int(os.environ.get("ESI_BOT_PROBE_BUDGET", 6))
+PROBE_INTERVAL = 60  # seconds between probe runs
+PROBE_TIMEOUT = 10  # seconds
+PROBE_MAX_BYTES = 64 * 1024  # of each response read
+SLOT_SECONDS = 300
+SLOTS = 12  # slots kept, an hour of them
+BOUNDS = tuple(0.025 * 1.5 ** x for x in range(16))  # bin upper bounds, s
+
+SAMPLES = {  # known good values for path and required query params
+    "alliance_id": 434243723,  # C C P Alliance
+    "corporation_id": 109299958,  # C C P
+    "character_id": 2112625428,
+    "type_id": 34,  # Tritanium
+    "group_id": 18,  # Mineral
+    "category_id": 4,  # Material
+    "region_id": 10000002,  # The Forge
+    "constellation_id": 20000020,  # Kimotoro
+    "system_id": 30000142,  # Jita
+    "station_id": 60003760,  # Jita IV - Moon 4 - Caldari Navy Assembly Plant
+    "origin": 30000142,  # Jita
+    "destination": 30002187,  # Amarr
+    "attribute_id": 9,  # hp
+    "order_type": "all",
+}
+
+HISTOGRAMS = {}  # {(base_url, route template): Histogram}
+_LOCK = threading.Lock()
+
+
+def _evict(fraction):
+    """Drop the first probed routes' histograms, for the memory registry."""
+
+    with _LOCK:
+        return evict_oldest(HISTOGRAMS, fraction)
+
+
+MEMORY.register("latency", lambda: HISTOGRAMS, budget=4, evict=_evict)
+
+
+class Histogram:
+    """Probe counts per latency bin, per time slot, and their errors."""
+
+    __slots__ = ("_slots",)
+
+    def __init__(self):
+        """Create an empty histogram."""
+
+        self._slots = {}  # {slot number: [count per bin..., errors]}
+
+    def add(self, seconds, error, now=None):
+        """Count a probe, dropping slots that have aged out."""
+
+        slot = int((now or time.time()) // SLOT_SECONDS)
+        counts = self._slots.get(slot)
+        if counts is None:
+            counts = self._slots[slot] = [0] * (len(BOUNDS) + 2)
+            for old in [x for x in self._slots if x <= slot - SLOTS]:
+                del self._slots[old]
+
+        counts[bisect.bisect_left(BOUNDS, seconds)] += 1
+        counts[-1] += int(error)
+
+    def counts(self, now=None):
+        """Return the bin counts (then errors) summed over recent slots."""
+
+        slot = int((now or time.time()) // SLOT_SECONDS)
+        merged = [0] * (len(BOUNDS) + 2)
+        for number, counts in list(self._slots.items()):
+            if number > slot - SLOTS:
+                merged = [x + y for x, y in zip(merged, counts)]
+        return merged
+
+
+def percentile(counts, percent):
+    """Return the upper bound in seconds of the bin holding the percentile.
+
+    Args:
+        counts: bin counts then errors, as from Histogram.counts
+
+    Returns:
+        float seconds, infinite for the overflow bin
+    """
+
+    rank = math.ceil(sum(counts[:-1]) * percent / 100)
+    seen = 0
+    for index, count in enumerate(counts[:-1]):
+        seen += count
+        if count and seen >= rank:
+            return BOUNDS[index] if index < len(BOUNDS) else math.inf
+    return 0.0
+
+
+def record(base_url, template, seconds, error):
+    """Add a probe of the route to its histogram."""
+
+    key = (base_url, template)
+    with _LOCK:
+        if key not in HISTOGRAMS:
+            HISTOGRAMS[key] = Histogram()
+        HISTOGRAMS[key].add(seconds, error)
+
+
+def family(template):
+    """Return the route family of a template, its first section."""
+
+    return "/{}/".format(template.strip("/").split("/")[0])
+
+
+def report(base_url, prefix=None):
+    """Summarise recent probes by route family, or by route for a prefix.
+
+    Returns:
+        dictionary of {name: (probes, p50 seconds, p95 seconds, errors)}
+    """
+
+    groups = defaultdict(lambda: [0] * (len(BOUNDS) + 2))
+    with _LOCK:
+        histograms = list(HISTOGRAMS.items())
+
+    for (probed, template), histogram in histograms:
+        if probed != base_url:
+            continue
+        if prefix is None:
+            name = family(template)
+        elif template.startswith(prefix):
+            name = template
+        else:
+            continue
+        groups[name] = [x + y for x, y in zip(
+            groups[name],
+            histogram.counts(),
+        )]
+
+    return {
+        name: (
+            sum(counts[:-1]),
+            percentile(counts, 50),
+            percentile(counts, 95),
+            counts[-1],
+        )
+        for name, counts in groups.items() if sum(counts[:-1])
+    }
+
+
+class Prober:
+    """Chooses a datasource's probe targets and rotates through them."""
+
+    def __init__(self, base_url):
+        """Create a prober, targets are found from the loaded spec."""
+
+        self.base_url = base_url
+        self._targets = []  # [(template, url)]
+        self._spec_timestamp = None
+        self._next = 0
+
+    def targets(self):
+        """Return the [(template, url)] to probe, from the latest spec."""
+
+        details = ESI_SPECS[self.base_url].get("latest", {})
+        if details.get("timestamp") != self._spec_timestamp:
+            table = route_table(self.base_url, "latest", details)
+            if table is not None:
+                self._targets = self._find_targets(table)
+                LOG.info("%d latency probe targets for %s",
+                         len(self._targets), self.base_url)
+            self._spec_timestamp = details.get("timestamp")
+        return self._targets
+
+    def _find_targets(self, table):
+        """Return the routes of the table which can be probed."""
+
+        targets = []
+        for template, route in sorted(table.routes.items()):
+            if route.get is None or route.get.get("security"):
+                continue
+
+            path_names = list(route.pattern.groupindex)
+            if any(x not in SAMPLES for x in path_names + route.required):
+                continue
+
+            path_params = {x: str(SAMPLES[x]) for x in path_names}
+            query = urlencode({x: SAMPLES[x] for x in route.required})
+            if route.validate(path_params, query):
+                continue  # the spec disagrees with our samples
+
+            targets.append((template, "{}/latest{}{}{}".format(
+                self.base_url,
+                template.format(**path_params),
+                "?" * int(bool(query)),
+                query,
+            )))
+        return targets
+
+    def probe(self):
+        """Probe the next targets, up to PROBE_BUDGET of them.
+
+        Returns:
+            integer number of probes recorded
+        """
+
+        targets = self.targets()
+        if not targets:
+            return 0
+
+        count = min(PROBE_BUDGET, len(targets))
+        batch = [
+            targets[(self._next + x) % len(targets)] for x in range(count)
+        ]
+        self._next = (self._next + count) % len(targets)
+
+        templates = {url: template for template, url in batch}
+        recorded = 0
+        for url, result in multi_request(templates, _probe).items():
+            if result is not None:
+                record(self.base_url, templates[url], *result)
+                recorded += 1
+        return recorded
+
+
+def _probe(url):
+    """Time an uncached request for the url.
+
+    Returns:
+        tuple of (seconds, boolean of if it failed), or None if refused
+    """
+
+    start = time.perf_counter()
+    res = do_request(
+        url,
+        return_response=True,
+        timeout=PROBE_TIMEOUT,
+        max_bytes=PROBE_MAX_BYTES,
+    )
+    seconds = time.perf_counter() - start
+    if isinstance(res, tuple):
+        # refused by the error limit governor, or failed outright
+        return None if res[0] == 420 else (seconds, True)
+    return seconds, res.status_code >= 500
+
+
+PROBERS = {x: Prober(x) for x in (ESI, ESI_CHINA)}
+DATASOURCES = (("tranquility", ESI), ("serenity", ESI_CHINA))
+
+
+def probe_all():
+    """Probe every datasource once, for the scheduler's job."""
+
+    for prober in PROBERS.values():
+        prober.probe()
+
+
+def _cells(stats):
+    """Return the columns for a row's (probes, p50, p95, errors) stats."""
+
+    if stats is None:
+        return "{:>5} {:>7} {:>7} {:>5}".format("-", "-", "-", "-")
+    probes, p50, p95, errors = stats
+    return "{:>5,d} {:>7} {:>7} {:>5.0%}".format(
+        probes,
+        _millis(p50),
+        _millis(p95),
+        errors / probes,
+    )
+
+
+def _millis(seconds):
+    """Format a bin's upper bound in milliseconds."""
+
+    if seconds == math.inf:
+        return ">{:,.0f}".format(BOUNDS[-1] * 1000)
+    return "{:,.0f}".format(seconds * 1000)
+
+
+@command(trigger="latency", cost="cheap")
+def latency(msg):
+    """Show ESI latency and error rates from my background probes.
+
+    Usage:
+        latency             by route family, for the last hour
+        latency <prefix>    each probed route under the prefix, ie /universe/
+
+    NB: p50 and p95 are bin upper bounds in ms, errors are 5xx and timeouts
+    """
+
+    prefix = None
+    if msg.args:
+        prefix = "/{}".format(msg.args[0].strip("/"))
+
+    reports = {name: report(url, prefix) for name, url in DATASOURCES}
+    rows = sorted(set().union(*reports.values()))
+    if not rows:
+        return "I haven't probed any{} routes yet, I probe {} per ESI every {}s".format(
+            " {}".format(prefix) if prefix else "",
+            PROBE_BUDGET,
+            PROBE_INTERVAL,
+        )
+
+    width = max(len(x) for x in rows + ["route"])
+    lines = [
+        "{} {:^27}   {:^27}".format(
+            " " * width,
+            *[x for x, _ in DATASOURCES],
+        ).rstrip(),
+        "{}   {}".format(
+            "{:<{}} {:>5} {:>7} {:>7} {:>5}".format(
+                "route" if prefix else "family", width,
+                "n", "p50", "p95", "err",
+            ),
+            "{:>5} {:>7} {:>7} {:>5}".format("n", "p50", "p95", "err"),
+        ),
+    ]
+    for row in rows:
+        lines.append("{:<{}} {}   {}".format(row, width, *[
+            _cells(reports[x].get(row)) for x, _ in DATASOURCES
+        ]))
+    return "```{}```".format("\n".join(lines))
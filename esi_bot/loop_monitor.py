@@ -0,0 +1,220 @@
+"""Event loop lag and blocking monitor.
+
+Samples how late a short sleep on the gevent hub (or asyncio loop) wakes
+up, and records the stack of anything that holds the loop for longer than
+ESI_BOT_BLOCKING_THRESHOLD seconds, with the command and message being
+processed by the blocking greenlet, if any.
+
+Under gevent, blocks are detected by the hub's own monitor thread. On the
+asyncio engine a watchdog thread samples the loop thread's stack instead.
+"""
+
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from contextlib import contextmanager
+from collections import deque
+from collections import namedtuple
+
+from esi_bot import LOG
+from esi_bot import ENGINE
+
+
+THRESHOLD = float(os.environ.get("ESI_BOT_BLOCKING_THRESHOLD", 0.5))
+LAG_INTERVAL = 0.1  # seconds between lag samples
+MAX_BLOCKS = 50  # recent blocks kept
+MAX_SAMPLES = 600  # recent lag samples kept, for percentiles
+
+BLOCK = namedtuple("Block", ("when", "seconds", "command", "text", "stack"))
+
+
+class LoopMonitor:
+    """Event loop lag samples and blocking reports."""
+
+    def __init__(self, threshold=THRESHOLD):
+        """Create a monitor with no samples, start() begins watching."""
+
+        self.threshold = threshold
+        self._context = {}  # {thread/greenlet ident: (command, text)}
+        self._pending = None  # BLOCK, finished by the lag sampler
+        self.blocks = deque(maxlen=MAX_BLOCKS)
+        self.commands = {}  # {command: [blocks, total seconds, max seconds]}
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self.lag_count = 0
+        self.lag_total = 0
+        self.lag_max = 0
+        self.started = False
+
+    @contextmanager
+    def context(self, command, text):
+        """Attribute any blocking inside the block to the command."""
+
+        ident = threading.get_ident()
+        self._context[ident] = (command, text)
+        try:
+            yield
+        finally:
+            self._context.pop(ident, None)
+
+    def record_lag(self, lag):
+        """Record a lag sample, finishing any pending blocking report."""
+
+        lag = max(lag, 0)
+        self.samples.append(lag)
+        self.lag_count += 1
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+
+        # the sample after a block measures it, a report without a late
+        # sample came in after the loop had already moved on
+        pending, self._pending = self._pending, None
+        if pending is not None and lag >= self.threshold:
+            self._record_block(pending._replace(seconds=lag))
+
+    def _blocked(self, ident, stack):
+        """Note that ident is blocking the loop, from a monitor thread.
+
+        NB: only swaps a reference, gevent's locks can't be used from the
+            monitor thread and the lag sampler can't run until it's over
+        """
+
+        if self._pending is None:
+            command, text = self._context.get(ident, (None, None))
+            self._pending = BLOCK(time.time(), None, command, text, stack)
+
+    def _record_block(self, block):
+        """Store a finished block against its command."""
+
+        self.blocks.append(block)
+
+        totals = self.commands.setdefault(block.command, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += block.seconds
+        totals[2] = max(totals[2], block.seconds)
+
+        LOG.warning(
+            "event loop blocked for %.3fs by %s: %s",
+            block.seconds,
+            block.command or "non-command work",
+            block.stack[-1].strip() if block.stack else "unknown",
+        )
+
+    def percentile(self, percent):
+        """Return the lag at the percentile of the recent samples."""
+
+        if not self.samples:
+            return 0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def summary(self):
+        """Return a dictionary of lag and blocking stats, seconds."""
+
+        return {
+            "engine": ENGINE,
+            "threshold": self.threshold,
+            "lag_samples": self.lag_count,
+            "lag_avg": self.lag_total / self.lag_count if self.lag_count else 0,
+            "lag_p99": self.percentile(99),
+            "lag_max": self.lag_max,
+            "blocks": sum(x[0] for x in self.commands.values()),
+            "blocked": sum(x[1] for x in self.commands.values()),
+            "commands": {k: tuple(v) for k, v in self.commands.items()},
+        }
+
+    def start(self):
+        """Start watching the gevent hub, once."""
+
+        if self.started or ENGINE != "gevent":
+            return
+        self.started = True
+
+        # pylint: disable=import-outside-toplevel
+        import gevent
+        import warnings
+        from gevent import events
+
+        gevent.config.max_blocking_time = self.threshold
+        gevent.config.print_blocking_reports = False  # we log a summary
+        gevent.config.monitor_thread = True
+        events.subscribers.append(self._on_gevent_event)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # memory monitoring needs psutil
+            gevent.get_hub().start_periodic_monitoring_thread()
+
+        gevent.spawn(self._sample_gevent)
+        LOG.info("watching the hub for blocks over %ss", self.threshold)
+
+    def _on_gevent_event(self, event):
+        """Subscriber for gevent events, picking out blocked hub reports."""
+
+        from gevent import events  # pylint: disable=import-outside-toplevel
+
+        if isinstance(event, events.EventLoopBlocked):
+            self._blocked(id(event.greenlet), _blocked_stack(event.info))
+
+    def _sample_gevent(self):
+        """Sample hub lag forever, in a greenlet."""
+
+        import gevent  # pylint: disable=import-outside-toplevel
+
+        while True:
+            before = time.perf_counter()
+            gevent.sleep(LAG_INTERVAL)
+            self.record_lag(time.perf_counter() - before - LAG_INTERVAL)
+
+    async def watch_async(self):
+        """Sample the running loop's lag forever, for the asyncio engine.
+
+        Blocks are caught by a watchdog thread, which records the loop
+        thread's stack once a sample is more than the threshold overdue.
+        """
+
+        loop_thread = threading.get_ident()
+        beat = [time.perf_counter()]
+        threading.Thread(
+            target=self._watchdog,
+            args=(loop_thread, beat),
+            name="loop-watchdog",
+            daemon=True,
+        ).start()
+        self.started = True
+
+        while True:
+            before = beat[0] = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.record_lag(time.perf_counter() - before - LAG_INTERVAL)
+
+    def _watchdog(self, loop_thread, beat):
+        """Report the loop thread's stack whenever its samples stall."""
+
+        while True:
+            time.sleep(self.threshold)
+            overdue = time.perf_counter() - beat[0] - LAG_INTERVAL
+            frame = sys._current_frames().get(loop_thread)  # pylint: disable=W0212
+            if overdue > self.threshold and frame is not None:
+                self._blocked(loop_thread, traceback.format_stack(frame))
+
+
+def _blocked_stack(info):
+    """Return the blocked stack lines from a gevent blocking report."""
+
+    lines = "\n".join(info).splitlines()
+    try:
+        start = next(i for i, x in enumerate(lines) if x.startswith("Blocked"))
+    except StopIteration:
+        return []
+
+    stack = []
+    for line in lines[start + 1:]:
+        if not line.strip() or line.startswith("Info:"):
+            break
+        stack.append(line)
+    return stack
+
+
+MONITOR = LoopMonitor()
@@ -0,0 +1,260 @@
+"""Memory accounting for the bot's long lived in-memory stores.
+
+Each store registers itself by name with a function returning its
+structure, an optional byte budget and a function to evict a fraction of
+its entries. The scheduler's job measures every store's entry count and
+approximate deep size, logs them, and has any store over its budget
+evict down to COMPACT_TO of it. See the admin `memory` command.
+
+Sizes are estimated from a sample of SAMPLE children per container, so
+measuring a large spec costs milliseconds, not a walk of every object.
+Budgets are in MB and can be set with ESI_BOT_MEMORY_BUDGETS, ie
+`esi-specs=128,response-cache=32`, a budget of 0 only reports the store.
+"""
+
+
+import os
+import sys
+import time
+import threading
+
+from esi_bot import LOG
+
+
+MEASURE_INTERVAL = 300  # seconds between measurements by the scheduler
+SAMPLE = 32  # children sized per container, the rest are extrapolated
+COMPACT_TO = 0.8  # fraction of its budget a store evicts down to
+MB = 1024 ** 2
+
+
+def deep_size(obj, seen=None):
+    """Return the approximate size in bytes of an object and its contents.
+
+    Objects already seen (ie shared between entries) are only counted once.
+    Containers with more than SAMPLE children have evenly spaced children
+    sized, which are scaled up to the full count.
+    """
+
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)):
+        return size
+
+    if isinstance(obj, dict):
+        children = list(obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = list(obj)
+    elif hasattr(obj, "__dict__"):
+        children = [vars(obj)]
+    elif hasattr(obj, "__slots__"):
+        children = [getattr(obj, x, None) for x in obj.__slots__]
+    else:
+        return size
+
+    if not children:
+        return size
+
+    sampled = children[::max(1, len(children) // SAMPLE)]
+    total = 0
+    for child in sampled:
+        if isinstance(obj, dict):
+            total += deep_size(child[0], seen) + deep_size(child[1], seen)
+        else:
+            total += deep_size(child, seen)
+    return size + total * len(children) // len(sampled)
+
+
+def evict_oldest(mapping, fraction):
+    """Drop the first inserted fraction of a dictionary's entries.
+
+    Returns:
+        integer number of entries dropped
+    """
+
+    count = int(len(mapping) * fraction + 0.5)
+    for key in list(mapping)[:count]:
+        mapping.pop(key, None)
+    return count
+
+
+class Store:
+    """A registered in-memory structure, its last measurement and budget."""
+
+    def __init__(self, name, target, budget=None, evict=None, count=None):
+        """Create a store, measured when the registry next measures.
+
+        Args:
+            name: string unique name for the store
+            target: function returning the structure, looked up each time
+            budget: bytes the store may use, or None to only report it
+            evict: function taking the fraction of entries to drop,
+                   returning how many were, or None to only report it
+            count: function returning the number of entries, defaults to
+                   the length of the structure
+        """
+
+        self.name = name
+        self.target = target
+        self.budget = budget
+        self.evict = evict
+        self.count = count
+        self.entries = 0
+        self.bytes = 0
+        self.measured = None  # time.time() of the last measurement
+        self.evictions = 0  # times the store was over its budget
+        self.evicted = 0  # entries dropped in total
+
+    def measure(self):
+        """Count the store's entries and estimate its size."""
+
+        structure = self.target()
+        if self.count is not None:
+            self.entries = self.count()
+        else:
+            self.entries = len(structure)
+        self.bytes = deep_size(structure)
+        self.measured = time.time()
+
+    def enforce(self):
+        """Measure the store, evicting entries if it's over its budget.
+
+        Returns:
+            integer number of entries evicted
+        """
+
+        self.measure()
+        if not self.budget or self.evict is None or self.bytes <= self.budget:
+            return 0
+
+        over = self.bytes
+        dropped = self.evict(1 - self.budget * COMPACT_TO / over) or 0
+        self.evictions += 1
+        self.evicted += dropped
+        self.measure()
+        LOG.warning(
+            "memory store %s was over its %.1fMB budget at %.1fMB, "
+            "evicted %d entries down to %.1fMB",
+            self.name,
+            self.budget / MB,
+            over / MB,
+            dropped,
+            self.bytes / MB,
+        )
+        return dropped
+
+    def summary(self):
+        """Return a dictionary of the store's last measurement."""
+
+        return {
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "budget": self.budget,
+            "measured": self.measured,
+            "evictions": self.evictions,
+            "evicted": self.evicted,
+        }
+
+
+def _parse_budgets(config):
+    """Parse ESI_BOT_MEMORY_BUDGETS into {store name: bytes}."""
+
+    budgets = {}
+    for part in config.split(","):
+        try:
+            name, budget = part.split("=")
+            budgets[name.strip()] = int(float(budget) * MB)
+        except ValueError:
+            continue
+    return budgets
+
+
+class Registry:
+    """Every registered Store, measured together."""
+
+    def __init__(self, budgets=None):
+        """Create an empty registry.
+
+        Args:
+            budgets: dictionary of {store name: bytes} overriding the
+                     budgets stores register with
+        """
+
+        self.stores = {}  # {name: Store}
+        self._budgets = budgets or {}
+        self._lock = threading.Lock()
+
+    def register(self, name, target, budget=None, evict=None, count=None):
+        """Add a store, see Store. Budgets are given in MB.
+
+        A name already taken, ie by another workspace's store, is suffixed
+        with #2 and so on, the configured budget for the name applies to
+        each of them.
+
+        Returns:
+            the new Store
+        """
+
+        budget = self._budgets.get(name, budget and int(budget * MB))
+        with self._lock:
+            unique = name
+            number = 1
+            while unique in self.stores:
+                number += 1
+                unique = "{}#{}".format(name, number)
+            store = Store(unique, target, budget, evict, count)
+            self.stores[unique] = store
+        return store
+
+    def enforce(self):
+        """Measure every store and hold them to their budgets, log totals.
+
+        Returns:
+            integer number of entries evicted
+        """
+
+        evicted = 0
+        start = time.perf_counter()
+        for store in list(self.stores.values()):
+            try:
+                evicted += store.enforce()
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception("failed to measure memory store %s", store.name)
+
+        LOG.info(
+            "memory: %.1fMB in %d stores, measured in %.0fms (%s)",
+            self.total / MB,
+            len(self.stores),
+            (time.perf_counter() - start) * 1000,
+            ", ".join(
+                "{}={:.1f}MB/{:,d}".format(x.name, x.bytes / MB, x.entries)
+                for x in self.stores.values()
+            ),
+        )
+        return evicted
+
+    @property
+    def total(self):
+        """Return the bytes used by every store, as last measured."""
+
+        return sum(x.bytes for x in list(self.stores.values()))
+
+
+def rss():
+    """Return the process's resident memory in bytes, or None."""
+
+    try:
+        with open("/proc/self/status", "r") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+MEMORY = Registry(_parse_budgets(os.environ.get("ESI_BOT_MEMORY_BUDGETS", "")))
@@ -0,0 +1,191 @@
+"""Per-host HTTP connection pools with pre-warming and timings."""
+
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.connection import HTTPConnection
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.connectionpool import HTTPSConnectionPool
+
+
+KEEPALIVE_INTERVAL = 45  # seconds a host can idle before we refresh it
+
+STATS = {}  # {hostname: HostStats}
+_STATS_LOCK = threading.Lock()
+
+
+class HostStats:
+    """Connection and request timings for a single host."""
+
+    def __init__(self, host):
+        """Create empty stats for the host."""
+
+        self.host = host
+        self.connects = 0
+        self.connect_time = 0.0  # TCP, seconds
+        self.tls_time = 0.0  # seconds
+        self.requests = 0
+        self.ttfb_time = 0.0  # seconds
+        self.last_used = 0
+
+    def summary(self):
+        """Return a dictionary of averages, in milliseconds."""
+
+        return {
+            "connections": self.connects,
+            "connect_ms": self.connect_time / (self.connects or 1) * 1000,
+            "tls_ms": self.tls_time / (self.connects or 1) * 1000,
+            "requests": self.requests,
+            "ttfb_ms": self.ttfb_time / (self.requests or 1) * 1000,
+            "idle_s": time.time() - self.last_used if self.last_used else None,
+        }
+
+
+def host_stats(host):
+    """Return the HostStats for a hostname, creating it if needed."""
+
+    with _STATS_LOCK:
+        if host not in STATS:
+            STATS[host] = HostStats(host)
+        return STATS[host]
+
+
+class _TimedConnectionMixin:
+    """Record TCP and TLS setup times for new connections."""
+
+    _tcp_time = 0.0
+
+    def _new_conn(self):
+        """Time the TCP connection."""
+
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        self._tcp_time = time.perf_counter() - start
+        return sock
+
+    def connect(self):
+        """Time the full connection setup, TLS is whatever TCP wasn't."""
+
+        start = time.perf_counter()
+        super().connect()
+        total = time.perf_counter() - start
+        stats = host_stats(self.host)
+        stats.connects += 1
+        stats.connect_time += self._tcp_time
+        stats.tls_time += max(total - self._tcp_time, 0)
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    """Timed plain HTTP connection."""
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    """Timed HTTPS connection."""
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    """HTTP connection pool using timed connections."""
+
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool using timed connections."""
+
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class HostAdapter(HTTPAdapter):
+    """HTTPAdapter for a single host which records connection timings."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Use the timed connection pool classes."""
+
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        """Send the request, recording the time to the response headers."""
+
+        start = time.perf_counter()
+        res = super().send(request, **kwargs)
+        stats = host_stats(urlparse(request.url).hostname)
+        stats.requests += 1
+        stats.ttfb_time += time.perf_counter() - start
+        stats.last_used = time.time()
+        return res
+
+
+class TimeoutRetry(Retry):
+    """Retry, except for read timeouts, the caller chose that deadline.
+
+    NB: otherwise a request with a 5 second timeout can take 20 seconds
+    """
+
+    def increment(self, *args, **kwargs):  # pylint: disable=W0221
+        """Reraise read timeouts, count anything else as usual."""
+
+        if isinstance(kwargs.get("error"), ReadTimeoutError):
+            return Retry.increment(self.new(read=False), *args, **kwargs)
+        return super().increment(*args, **kwargs)
+
+
+def mount_pools(session, pools, max_retries=3):
+    """Mount a HostAdapter per configured host on the session.
+
+    Args:
+        session: requests.Session
+        pools: {base_url: (pool size, warm connections, ping path)}
+    """
+
+    for base_url, (pool_size, _, _) in pools.items():
+        session.mount("{}/".format(base_url), HostAdapter(
+            max_retries=TimeoutRetry.from_int(max_retries),
+            pool_connections=1,
+            pool_maxsize=pool_size,
+        ))
+
+
+def warm(session, base_url, connections, path):
+    """Open connections to a host in advance with concurrent cheap requests.
+
+    Returns:
+        integer number of successful requests
+    """
+
+    def _ping(_):
+        try:
+            res = session.get("{}{}".format(base_url, path), timeout=10)
+            res.close()
+        except Exception:  # pylint: disable=broad-except
+            return False
+        return res.status_code < 500
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        return sum(pool.map(_ping, range(connections)))
+
+
+def warm_all(session, pools, idle=None):
+    """Warm every configured host, optionally only those idle for a while.
+
+    Args:
+        session: requests.Session
+        pools: {base_url: (pool size, warm connections, ping path)}
+        idle: optional seconds, skip hosts used more recently than this
+    """
+
+    now = time.time()
+    for base_url, (_, connections, path) in pools.items():
+        stats = host_stats(urlparse(base_url).hostname)
+        if idle is None or now - stats.last_used > idle:
+            warm(session, base_url, connections, path)
@@ -5,6 +5,9 @@ import re
 import time
 import random
 import typing
+import inspect
+import tempfile
+import threading
 from datetime import datetime
 
 from esi_bot import LOG
@@ -13,8 +16,14 @@ from esi_bot import EPHEMERAL
 from esi_bot import SNIPPET
 from esi_bot import MESSAGE
 from esi_bot import COMMANDS
+from esi_bot import COMMAND_COSTS
+from esi_bot import MEMORY
+from esi_bot import tracing
+from esi_bot.slack import upload_file
 from esi_bot.users import Users
+from esi_bot.admission import ADMISSION
 from esi_bot.channels import Channels
+from esi_bot.loop_monitor import MONITOR
 
 STARTUP_MSGS = (
     "hello, world",
@@ -51,31 +60,118 @@ REACTION_TRIGGERS = {
 
 UNMATCHED = object()
 
+# There is a 1 megabyte file size limit for files uploaded as snippets.
+MAX_SNIPPET = 1024 ** 2
+SNIPPED = b"<snipped>"
+SPOOL_MEMORY = 64 * 1024  # bytes of a snippet kept in memory before disk
+UPLOAD_TIMEOUT = 30  # seconds
+
+
+class Spool:
+    """Snippet content, encoded into a spooled temporary file.
+
+    Content can be a string or an iterable of strings, it's consumed only
+    up to the snippet size limit and measured on the way, so large replies
+    are never held in full. Used directly as a streaming request body.
+    """
+
+    def __init__(self, content):
+        """Spool the content, snipping it at MAX_SNIPPET bytes."""
+
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+        self.length = 0
+        self.newlines = 0
+
+        room = MAX_SNIPPET - len(SNIPPED)
+        for chunk in (content,) if isinstance(content, str) else content:
+            data = chunk.encode("utf-8")
+            if len(data) > room - self.length:
+                # drop any partial character left at the cut
+                data = data[:room - self.length].decode("utf-8", "ignore")
+                self._write(data.encode("utf-8") + SNIPPED)
+                break
+            self._write(data)
+
+        self.file.seek(0)
+
+    def __len__(self):
+        """Return the spooled length in bytes."""
+
+        return self.length
+
+    def __enter__(self):
+        """Use the spool as a context manager, closing it on exit."""
+
+        return self
+
+    def __exit__(self, *_):
+        """Release the spooled file."""
+
+        self.file.close()
+
+    def _write(self, data):
+        """Write bytes to the spool, counting them."""
+
+        self.file.write(data)
+        self.length += len(data)
+        self.newlines += data.count(b"\n")
+
+    def read(self, size=-1):
+        """Read bytes from the spool, for request bodies."""
+
+        return self.file.read(size)
+
+    def text(self):
+        """Return the full spooled content as a string."""
+
+        self.file.seek(0)
+        return self.file.read().decode("utf-8")
+
 
 class Processor:
     """Execute ESI-bot commands based on incoming messages."""
-    def __init__(self, slack):
-        """Create a new processor instance."""
+    def __init__(self, slack, run_coroutine=None):
+        """Create a new processor instance.
+
+        Args:
+            slack: SlackClient, or anything with a compatible api_call
+            run_coroutine: function to run async command replies with,
+                           defaults to a new event loop per reply
+        """
 
         self._slack = slack
+        self._run_coroutine = run_coroutine or _run_coroutine
         self._users = Users(slack)
         self._channels = Channels(slack)
         self._prefix = os.environ.get("ESI_BOT_PREFIX", "!esi")
         self._greenlet = None
         self._replied_to = {}  # {uuid: timestamp}
+        self._replied_lock = threading.Lock()
         self._edit_window = int(os.environ.get("ESI_BOT_EDIT_WINDOW", 300))
+        # only reported, it's the dedupe table of edits, pruned by age in
+        # garbage_collect, evicting from it would reply to edits twice
+        MEMORY.register("replied-to", lambda: self._replied_to)
 
     def garbage_collect(self):
-        """Prune the self._replied_to dictionary."""
+        """Prune the self._replied_to dictionary and idle rate limits."""
 
         prune_time = time.time() - self._edit_window
         prune_keys = []
-        for key, timestamp in self._replied_to.items():
+        for key, timestamp in list(self._replied_to.items()):
             if timestamp < prune_time:
                 prune_keys.append(key)
 
-        for key in prune_keys:
-            self._replied_to.pop(key)
+        with self._replied_lock:
+            for key in prune_keys:
+                self._replied_to.pop(key, None)
+
+        ADMISSION.prune()
+
+    def sync_names(self):
+        """Refresh the workspace's user and channel names."""
+
+        self._users.update_names()
+        self._channels.update_names()
 
     def on_server_connect(self):
         """Join channels, start the daily announcements."""
@@ -85,10 +181,24 @@ class Processor:
             self._send_msg(random.choice(STARTUP_MSGS))
         return joined
 
+    def announce(self, msg):
+        """Send a notice to the primary channel."""
+
+        if self._channels.primary:
+            self._send_msg(msg)
+
+    def _api_call(self, method, **kwargs):
+        """Call a Slack Web API method, in a span of any current trace."""
+
+        with tracing.span("slack", method=method) as span:
+            res = self._slack.api_call(method, **kwargs)
+            span.set(ok=bool(res.get("ok")))
+            return res
+
     def _send_msg(self, msg, attachments=None, unfurling=False, channel=None):
         """Send a message to the channel, or the primary channel."""
 
-        self._slack.api_call(
+        self._api_call(
             "chat.postMessage",
             channel=channel or self._channels.primary,
             text=msg,
@@ -102,7 +212,7 @@ class Processor:
     def _send_ephemeral(self, msg, user, channel, attachments=None):
         """Send an ephemeral message."""
 
-        self._slack.api_call(
+        self._api_call(
             "chat.postEphemeral",
             channel=channel,
             text=msg,
@@ -111,43 +221,69 @@ class Processor:
             as_user=True,
         )
 
-    def _send_snippet(self, reply, channel=None):
-        """Send a snippet to the channel, or the primary channel."""
+    def _send_snippet(self, reply, spool, channel=None):
+        """Send a snippet to the channel, or the primary channel.
 
-        # There is a 1 megabyte file size limit for files uploaded as snippets.
-        megb = 1024**2
-        if len(reply.content) > megb:
-            snip = "<snipped>"
-            content = "{}{}".format(reply.content[:megb - len(snip)], snip)
-        else:
-            content = reply.content
+        The spool is streamed to Slack with the external upload flow,
+        tokens which can't use that fall back to files.upload.
+        """
 
-        self._slack.api_call(
-            "files.upload",
-            content=content,
+        channel = channel or self._channels.primary
+        upload = self._api_call(
+            "files.getUploadURLExternal",
             filename=reply.filename,
-            filetype=reply.filetype,
+            length=len(spool),
+            snippet_type=reply.filetype,
+        )
+
+        if not upload.get("ok"):
+            LOG.info("falling back to files.upload: %s", upload.get("error"))
+            self._api_call(
+                "files.upload",
+                file=spool,
+                filename=reply.filename,
+                filetype=reply.filetype,
+                initial_comment=reply.comment,
+                title=reply.title,
+                editable=False,  # doesn't actually work
+                username="ESI (bot)",  # same, but maybe someday
+                channels=channel,
+            )
+            return
+
+        try:
+            with tracing.span("slack", method="upload", bytes=len(spool)):
+                upload_file(upload["upload_url"], spool, UPLOAD_TIMEOUT)
+        except Exception as error:
+            LOG.warning("failed to upload %s: %r", reply.filename, error)
+            return
+
+        self._api_call(
+            "files.completeUploadExternal",
+            files=[{"id": upload["file_id"], "title": reply.title}],
+            channel_id=channel,
             initial_comment=reply.comment,
-            title=reply.title,
-            editable=False,  # doesn't actually work
-            username="ESI (bot)",  # same, but maybe someday
-            channels=channel or self._channels.primary,
         )
 
     def _process_snippet_reply(self, reply, channel):
         """Process code snippet replies."""
 
-        if len(reply.content) > 2900 or reply.content.count("\n") > 9:
-            self._send_snippet(reply, channel=channel)
-        else:
-            self._send_msg(
-                "{}\n{}\n```{}```".format(
-                    reply.title,
-                    reply.comment,
-                    reply.content,
-                ),
-                channel=channel,
-            )
+        with tracing.span("encode") as span:
+            spool = Spool(reply.content)
+            span.set(bytes=len(spool))
+
+        with spool:
+            if len(spool) > 2900 or spool.newlines > 9:
+                self._send_snippet(reply, spool, channel=channel)
+            else:
+                self._send_msg(
+                    "{}\n{}\n```{}```".format(
+                        reply.title,
+                        reply.comment,
+                        spool.text(),
+                    ),
+                    channel=channel,
+                )
 
     def _process_message_reply(self, reply, channel):
         """Process text message replies."""
@@ -173,28 +309,41 @@ class Processor:
 
         LOG.debug("RTM event received: %r", event)
 
-        if event["type"] == "message":
-            if "user" in event and "client_msg_id" in event:
-                self._process_once(
-                    event["client_msg_id"],  # not present in self msgs
-                    event["ts"],
-                    event["channel"],
-                    event["user"],
-                    event["text"],
-                )
-            elif "message" in event and \
-                    "edited" in event["message"] and \
-                    "client_msg_id" in event["message"] and \
-                    event.get("subtype") == "message_changed" and \
-                    float(event["message"]["edited"]["ts"]) - \
-                    float(event["message"]["ts"]) < self._edit_window:
-                self._process_once(
-                    event["message"]["client_msg_id"],
-                    event["message"]["ts"],
-                    event["channel"],
-                    event["message"]["edited"]["user"],
-                    event["message"]["text"],
-                )
+        if event["type"] != "message":
+            return
+
+        # only trace messages for us, not every message in every channel
+        text = event.get("text") or event.get("message", {}).get("text", "")
+        if text.lower().startswith(self._prefix):
+            with tracing.trace("event", channel=event.get("channel", "")):
+                self._process_message_event(event)
+        else:
+            self._process_message_event(event)
+
+    def _process_message_event(self, event):
+        """Process new and edited messages, in the event's trace."""
+
+        if "user" in event and "client_msg_id" in event:
+            self._process_once(
+                event["client_msg_id"],  # not present in self msgs
+                event["ts"],
+                event["channel"],
+                event["user"],
+                event["text"],
+            )
+        elif "message" in event and \
+                "edited" in event["message"] and \
+                "client_msg_id" in event["message"] and \
+                event.get("subtype") == "message_changed" and \
+                float(event["message"]["edited"]["ts"]) - \
+                float(event["message"]["ts"]) < self._edit_window:
+            self._process_once(
+                event["message"]["client_msg_id"],
+                event["message"]["ts"],
+                event["channel"],
+                event["message"]["edited"]["user"],
+                event["message"]["text"],
+            )
 
     def _process_once(self, msg_id, timestamp, *args):
         """Process an event once.
@@ -204,12 +353,24 @@ class Processor:
             *args: arguments for self._process_event
         """
 
-        if msg_id in self._replied_to:
-            return
-
-        if self._process_event(timestamp, *args):  # pylint: disable=E1120
+        # events are processed concurrently, so reserve the uuid first or
+        # an edit arriving while the original is running is replied to too
+        with self._replied_lock:
+            if msg_id in self._replied_to:
+                return
             self._replied_to[msg_id] = float(timestamp)
 
+        replied = False
+        try:
+            replied = self._process_event(  # pylint: disable=E1120
+                timestamp,
+                *args,
+            )
+        finally:
+            if not replied:
+                with self._replied_lock:
+                    self._replied_to.pop(msg_id, None)
+
     def _process_event(self, timestamp, channel, user, text):
         """Process valid events, look for our prefix or add a reaction.
 
@@ -245,7 +406,18 @@ class Processor:
             prefix, command, *args = text, "help"
 
         if prefix == self._prefix:
-            command, reply = _process_msg(MESSAGE(user, command, args))
+            with MONITOR.context(command, text), \
+                    tracing.span("command", command=command):
+                command, reply = _process_msg(
+                    MESSAGE(user, command, args),
+                    admit=lambda trigger: ADMISSION.admit(
+                        user,
+                        channel,
+                        COMMAND_COSTS.get(trigger),
+                    ),
+                )
+                if inspect.isawaitable(reply):
+                    reply = self._run_coroutine(reply)
 
             if reply:
                 if isinstance(reply, SNIPPET):
@@ -264,7 +436,7 @@ class Processor:
             for trigger, reaction in REACTION_TRIGGERS.items():
                 if re.match(trigger, text):
                     reacted = True
-                    self._slack.api_call(
+                    self._api_call(
                         "reactions.add",
                         name=reaction,
                         channel=channel,
@@ -275,19 +447,37 @@ class Processor:
         return False
 
 
-def _process_msg(msg):
-    """Process events matching our prefix and in an allowed channel."""
+def _run_coroutine(coro):
+    """Run an async command's reply on its own event loop."""
+
+    from esi_bot import aio  # pylint: disable=import-outside-toplevel
+    return aio.run(coro)
+
+
+def _process_msg(msg, admit=None):
+    """Process events matching our prefix and in an allowed channel.
+
+    Args:
+        msg: MESSAGE tuple
+        admit: optional function of the matched trigger, returning a
+               refusal string if the command shouldn't run right now
+    """
 
     for triggers, func in COMMANDS.items():
         if isinstance(triggers, (list, tuple)):
-            if msg.command in triggers:
-                return msg.command, func(msg)
+            args = (msg,) if msg.command in triggers else None
         elif isinstance(triggers, typing.Pattern):
             match = re.match(triggers, msg.command)
-            if match:
-                return msg.command, func(match, msg)
-        elif msg.command == triggers:
-            return msg.command, func(msg)
+            args = (match, msg) if match else None
+        else:
+            args = (msg,) if msg.command == triggers else None
+
+        if args:
+            refusal = admit(triggers) if admit else None
+            if refusal:
+                # as if unmatched, so an edit can retry it once allowed
+                return UNMATCHED, EPHEMERAL(refusal, None)
+            return msg.command, func(*args)
 
     # unknown command
     return UNMATCHED, COMMANDS["help"](msg)
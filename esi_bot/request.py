@@ -1,19 +1,27 @@
 """Make GET requests to ESI."""
 
 
+import os
 import re
-import json
 import time
 import html
 import http
 
 from esi_bot import ESI
+from esi_bot import codec
 from esi_bot import ESI_CHINA
 from esi_bot import SNIPPET
 from esi_bot import command
 from esi_bot import do_request
 from esi_bot import multi_request
+from esi_bot import MEMORY
+from esi_bot.diffs import update_diffs
+from esi_bot.routes import route_table
+from esi_bot.routes import cached_table
+from esi_bot.routes import forget_table
 from esi_bot.utils import esi_base_url
+from esi_bot.spec_search import update_index
+from esi_bot.commands.status_esi import route_status
 
 
 def _initial_specs():
@@ -28,17 +36,68 @@ ESI_SPECS = {
     ESI: _initial_specs(),
     ESI_CHINA: _initial_specs(),
 }
+EVICT_FIRST = ("legacy", "dev")  # spec versions evicted before others
+SPEC_MAX_AGE = 3600  # seconds before the scheduled refresh refetches a spec
+REFRESH_MIN_AGE = 300  # seconds before the refresh command refetches one
+YELLOW_TIMEOUT = 5  # seconds to wait on routes status.json has as yellow
+MAX_BYTES = int(os.environ.get("ESI_BOT_MAX_RESPONSE_BYTES", 1024 ** 2))
+
+
+def _loaded_specs():
+    """Return [(base_url, version)] of every loaded spec but latest."""
+
+    return [
+        (base_url, version)
+        for base_url, specs in ESI_SPECS.items()
+        for version, details in list(specs.items())
+        if version != "latest" and details["spec"]
+    ]
+
+
+def _evict_specs(fraction):
+    """Drop loaded specs and their route tables, never the latest.
+
+    NB: dropped specs are fetched again once they're SPEC_MAX_AGE old
+    """
+
+    loaded = sorted(
+        _loaded_specs(),
+        key=lambda x: EVICT_FIRST.index(x[1]) if x[1] in EVICT_FIRST
+        else len(EVICT_FIRST),
+    )
+    dropped = loaded[:max(1, int(len(loaded) * fraction + 0.5))]
+    for base_url, version in dropped:
+        ESI_SPECS[base_url][version] = {"timestamp": time.time(), "spec": {}}
+        forget_table(base_url, version)
+    return len(dropped)
+
+
+MEMORY.register(
+    "esi-specs",
+    lambda: [
+        (details["spec"], cached_table(base_url, version))
+        for base_url, specs in ESI_SPECS.items()
+        for version, details in list(specs.items())
+        if details["spec"]
+    ],
+    budget=256,
+    evict=_evict_specs,
+)
 
 
 @command(trigger=re.compile(
     r"^<?(?P<esi>https://esi\.(evetech\.net|evepc\.163\.com))?"
     r"/(?P<esi_path>.+?)>?$"
-))
+), cost="heavy")
 def request(match, msg):
     """Make an ESI GET request, if the path is known.
 
     Options:
         --headers    nest the response and add the headers
+        --force      request it even if status.json has the route as red
+
+    Routes that are red in status.json aren't requested, yellow ones are
+    given up on after a few seconds, unless --force is used.
     """
 
     match_group = match.groupdict()
@@ -65,7 +124,29 @@ def request(match, msg):
 
     params = html.unescape(params)
     path = "/{}/".format("/".join(x for x in req_sections if x))
-    if _valid_path(base_url, path, version):
+    route, path_params = _find_route(base_url, path, version)
+    if route is not None and route.get is not None:
+        errors = route.validate(path_params, params)
+        if errors:
+            return "invalid request for GET {} in the {} ESI{} spec: {}".format(
+                route.template,
+                version,
+                " China" * int(base_url == ESI_CHINA),
+                ", ".join(errors),
+            )
+
+        color = None
+        if "--force" not in msg.args:
+            color = route_status(base_url, route.template)
+        if color == "red":
+            return (
+                ":fire: GET {} is red in ESI{}'s status.json, not requesting"
+                " it (add `--force` to try anyway)".format(
+                    route.template,
+                    " China" * int(base_url == ESI_CHINA),
+                )
+            )
+
         url = "{}/{}{}{}{}".format(
             base_url,
             version,
@@ -74,10 +155,26 @@ def request(match, msg):
             params,
         )
         start = time.time()
-        res = do_request(url, return_response=True)
+        res = do_request(
+            url,
+            return_response=True,
+            timeout=YELLOW_TIMEOUT if color == "yellow" else None,
+            max_bytes=MAX_BYTES,
+        )
+        if isinstance(res, tuple):
+            if color == "yellow" and res[0] == 499:
+                return (
+                    ":fire_engine: {} (GET {} is yellow in status.json, gave"
+                    " up after {}s, add `--force` to wait longer)".format(
+                        res[1],
+                        route.template,
+                        YELLOW_TIMEOUT,
+                    )
+                )
+            return res[1]
 
         try:
-            content = res.json()
+            content = codec.loads(res.content)
         except ValueError:
             content = res.text
 
@@ -88,13 +185,16 @@ def request(match, msg):
         else:
             status = "{} {}".format(status.value, status.name)  # pylint: disable=E1101
 
+        if res.truncated:
+            status = "{}, cut short at {:,d} bytes".format(status, MAX_BYTES)
+
         if "--headers" in msg.args:
             res = {"response": content, "headers": dict(res.headers)}
         else:
             res = content
 
         return SNIPPET(
-            content=json.dumps(res, sort_keys=True, indent=4),
+            content=codec.iterpretty(res),
             filename="response.json",
             filetype="json",
             comment="{} ({:,.0f}ms)".format(
@@ -111,12 +211,54 @@ def request(match, msg):
     )
 
 
-@command(trigger="refresh")
+@command
+def schema(msg):
+    """Describe a route from the loaded specs, without calling ESI.
+
+    Shows the parameters, cache time, scopes and response schema.
+
+    Usage:
+        !esi schema <path> [version]
+    """
+
+    args = [x for x in msg.args if x.lstrip("-") not in (
+        "china", "cn", "serenity",
+    )]
+    if not args:
+        return "usage: !esi schema <path> [version]"
+
+    base_url = esi_base_url(msg)
+    path = re.sub(r"^<?(https://esi\.[^/]+)?", "", args[0]).rstrip(">")
+    sections = [x for x in path.split("?")[0].split("/") if x]
+    version = args[1] if len(args) > 1 else "latest"
+    if sections and sections[0] in ESI_SPECS[base_url]:
+        version = sections.pop(0)
+
+    spec = " ESI{} spec".format(" China" * int(base_url == ESI_CHINA))
+    if version not in ESI_SPECS[base_url]:
+        return "I don't know the {} version of the{}".format(version, spec)
+
+    path = "/{}/".format("/".join(sections))
+    route, _ = _find_route(base_url, path, version)
+    if route is None or route.get is None:
+        return "failed to find GET {} in the {}{}".format(path, version, spec)
+
+    table = route_table(base_url, version, ESI_SPECS[base_url][version])
+    return SNIPPET(
+        content=table.summary(route),
+        filename="schema.txt",
+        filetype="text",
+        comment="from the {}{}".format(version, spec),
+        title="GET /{}{}".format(version, route.template),
+    )
+
+
+@command(trigger="refresh", cost="heavy")
 def refresh(msg):
     """Refresh internal specs."""
 
     base_url = esi_base_url(msg)
-    refreshed = do_refresh(base_url)
+    refreshed = do_refresh(base_url, REFRESH_MIN_AGE)
     if refreshed:
         return "I refreshed my internal copy of the {}{}{} spec{}{}".format(
             ", ".join(refreshed[:-1]),
@@ -128,14 +270,22 @@ def refresh(msg):
     return "my internal specs are up to date (try again later)"
 
 
-def do_refresh(base_url):
+def do_refresh(base_url, max_age=SPEC_MAX_AGE):
     """DRY helper to refresh all stale ESI specs.
 
+    Args:
+        base_url: ESI base url to refresh the specs of
+        max_age: seconds since a spec was fetched (or evicted) before it's
+                 stale, specs never fetched always are
+
     Returns:
         list of updated ESI spec versions
     """
 
-    status, versions = do_request("{}/versions/".format(base_url))
+    status, versions = do_request(
+        "{}/versions/".format(base_url),
+        essential=True,
+    )
     if status == 200:
         for version in versions:
             if version not in ESI_SPECS[base_url]:
@@ -143,32 +293,44 @@ def do_refresh(base_url):
 
     spec_urls = {}  # url: version
     for version, details in ESI_SPECS[base_url].items():
-        if not details["spec"] or details["timestamp"] < time.time() + 300:
+        if details["timestamp"] < time.time() - max_age:
             url = "{}/{}/swagger.json".format(base_url, version)
             spec_urls[url] = version
 
     updates = {}
-    for url, result in multi_request(spec_urls.keys()).items():
+    for url, result in multi_request(spec_urls, essential=True).items():
         status, spec = result
         if status == 200:
             updates[spec_urls[url]] = {"timestamp": time.time(), "spec": spec}
 
     ESI_SPECS[base_url].update(updates)
+    for version in updates:
+        # precompile the route validators and summaries while we're off
+        # the hot path
+        table = route_table(base_url, version, ESI_SPECS[base_url][version])
+        if table is not None:
+            table.summarise()
+    update_diffs(base_url, ESI_SPECS[base_url], list(updates))
+    for version in updates:
+        table = route_table(base_url, version, ESI_SPECS[base_url][version])
+        if table is not None:
+            update_index(base_url, version, table)
     return list(updates)
 
 
-def _valid_path(base_url, path, version):
-    """Check if the path is known."""
+def _find_route(base_url, path, version):
+    """Find the spec route matching the path.
+
+    Returns:
+        tuple of (Route, {path param: raw value}) or (None, None)
+    """
 
     try:
-        spec = ESI_SPECS[base_url][version]["spec"]
+        details = ESI_SPECS[base_url][version]
     except KeyError:
-        return False
-
-    for spec_path, operations in spec["paths"].items():
-        # we could pre-validate arguments.... *effort* though
-        if re.match(re.sub(r"{.*}", "[^/]+", spec_path), path):
-            # we only make get requests
-            return "get" in operations
+        return None, None
 
-    return False
+    table = route_table(base_url, version, details)
+    if table is None:
+        return None, None
+    return table.match(path)
@@ -0,0 +1,515 @@
+"""Precompiled route matching and parameter validation for ESI specs."""
+
+
+import re
+from collections import defaultdict
+from urllib.parse import parse_qsl
+
+
+INT32 = (-2**31, 2**31 - 1)
+INT64 = (-2**63, 2**63 - 1)
+COLLECTION_SEPARATORS = {"csv": ",", "ssv": " ", "tsv": "\t", "pipes": "|"}
+MAX_ENUM = 8  # enum values shown in a summary before eliding the rest
+
+_TABLES = {}  # {(base_url, version): (timestamp, RouteTable)}
+
+
+def route_table(base_url, version, details):
+    """Return the compiled RouteTable for a spec, cached per spec version.
+
+    Args:
+        base_url: ESI base url the spec belongs to
+        version: spec version name (latest, dev, legacy, ...)
+        details: the ESI_SPECS entry ({"timestamp": float, "spec": dict})
+
+    Returns:
+        RouteTable instance, or None if the spec isn't loaded
+    """
+
+    if not details.get("spec"):
+        return None
+
+    key = (base_url, version)
+    cached = _TABLES.get(key)
+    if cached is None or cached[0] != details["timestamp"]:
+        cached = (details["timestamp"], RouteTable(details["spec"]))
+        _TABLES[key] = cached
+    return cached[1]
+
+
+def cached_table(base_url, version):
+    """Return the compiled RouteTable for a spec version if there is one."""
+
+    cached = _TABLES.get((base_url, version))
+    return cached and cached[1]
+
+
+def forget_table(base_url, version):
+    """Drop the compiled RouteTable for a spec version, ie once evicted."""
+
+    _TABLES.pop((base_url, version), None)
+
+
+class RouteTable:
+    """All routes in a single spec, indexed by their first path section."""
+
+    def __init__(self, spec):
+        """Compile every path in the spec."""
+
+        self.spec = spec
+        self.routes = {}  # {template: Route}
+        self._by_root = defaultdict(list)  # {first section: [Route]}
+        self._expanded = {}  # {$ref: expanded node}
+        self._summaries = {}  # {template: summary string}
+
+        for template, operations in spec.get("paths", {}).items():
+            route = Route(template, operations, spec)
+            self.routes[template] = route
+            self._by_root[_root(template)].append(route)
+
+        # literal sections should win over templated ones on ambiguous paths
+        for routes in self._by_root.values():
+            routes.sort(key=lambda x: (x.template.count("{"), x.template))
+
+    def match(self, path):
+        """Find the route for a concrete path.
+
+        Returns:
+            tuple of (Route, {path param: raw value}) or (None, None)
+        """
+
+        for root in (_root(path), ""):
+            for route in self._by_root.get(root, ()):
+                match = route.pattern.match(path)
+                if match:
+                    return route, match.groupdict()
+        return None, None
+
+    def expand(self, node):
+        """Return a copy of node with local $refs expanded.
+
+        NB: expansions are memoised per $ref and shared, don't mutate them
+        """
+
+        return _expand(self.spec, node, self._expanded, ())
+
+    def lookup(self, ref):
+        """Return the unexpanded node a local $ref points to."""
+
+        return _lookup(self.spec, ref)
+
+    def summary(self, route):
+        """Return a text summary of a route's GET operation, memoised.
+
+        Covers the parameters, cache time, scopes, responses and the
+        resolved schema of the successful response.
+        """
+
+        if route.template not in self._summaries:
+            self._summaries[route.template] = _summarise(self, route)
+        return self._summaries[route.template]
+
+    def summarise(self):
+        """Summarise every GET route now, ie while off the hot path."""
+
+        for route in self.routes.values():
+            if route.get is not None:
+                self.summary(route)
+
+
+class Route:
+    """A single spec path with precompiled parameter validators."""
+
+    def __init__(self, template, operations, spec):
+        """Compile the path pattern and the GET parameter validators."""
+
+        self.template = template
+        self.operations = operations
+        self.pattern = _compile_pattern(template)
+
+        self._path_checks = {}  # {name: check}
+        self._query_checks = {}  # {name: (item check, array check)}
+        self._required = []  # required query params without a default
+
+        operation = operations.get("get")
+        if operation is None:
+            return
+
+        parameters = operations.get("parameters", []) + \
+            operation.get("parameters", [])
+        for param in (_resolve(spec, x) for x in parameters):
+            if param.get("in") == "path":
+                self._path_checks[param["name"]] = _compile_check(param)
+            elif param.get("in") == "query":
+                if param.get("type") == "array":
+                    item_check = _compile_check(param.get("items", {}))
+                else:
+                    item_check = _compile_check(param)
+                self._query_checks[param["name"]] = (
+                    item_check,
+                    _compile_array_check(param),
+                )
+                if param.get("required") and "default" not in param:
+                    self._required.append(param["name"])
+
+    @property
+    def get(self):
+        """Return the GET operation for this route, if any."""
+
+        return self.operations.get("get")
+
+    @property
+    def required(self):
+        """Return the names of required query params without a default."""
+
+        return list(self._required)
+
+    def validate(self, path_params, query_string):
+        """Validate concrete path params and a raw query string.
+
+        Returns:
+            list of string error messages, empty if the request looks valid
+        """
+
+        errors = []
+        for name, value in path_params.items():
+            check = self._path_checks.get(name)
+            error = check and check(value)
+            if error:
+                errors.append("`{}` {}".format(name, error))
+
+        query = defaultdict(list)
+        for key, value in parse_qsl(query_string, keep_blank_values=True):
+            query[key].append(value)
+
+        for name, values in query.items():
+            if name not in self._query_checks:
+                continue  # ESI ignores unknown query params
+            item_check, array_check = self._query_checks[name]
+            if array_check:
+                items, error = array_check(values)
+                if error:
+                    errors.append("`{}` {}".format(name, error))
+            else:
+                items = values[-1:]
+            for value in items:
+                error = item_check(value)
+                if error:
+                    errors.append("`{}` {}".format(name, error))
+
+        for name in self._required:
+            if name not in query:
+                errors.append("`{}` is a required query param".format(name))
+
+        return errors
+
+
+def _summarise(table, route):
+    """Describe a route's GET operation, see RouteTable.summary."""
+
+    operation = table.expand(route.get)
+    lines = ["GET {}{}".format(
+        route.template,
+        " (deprecated)" * int(bool(operation.get("deprecated"))),
+    )]
+    if operation.get("summary"):
+        lines.append(operation["summary"])
+
+    scopes = sorted({
+        scope for security in operation.get("security", [])
+        for values in security.values() for scope in values
+    })
+    lines.append("")
+    lines.append("cache: {}".format(
+        "{}s".format(operation["x-cached-seconds"])
+        if "x-cached-seconds" in operation else "not cached"
+    ))
+    lines.append("scopes: {}".format(", ".join(scopes) or "none, public"))
+
+    parameters = table.expand(route.operations.get("parameters", [])) + \
+        operation.get("parameters", [])
+    if parameters:
+        lines.append("")
+        lines.append("parameters:")
+        for param in parameters:
+            lines.append("  {} ({}{}): {}".format(
+                param.get("name"),
+                param.get("in"),
+                ", required" * int(bool(param.get("required"))),
+                _describe_type(param.get("schema", param)),
+            ))
+
+    responses = operation.get("responses", {})
+    lines.append("")
+    lines.append("responses:")
+    for code in sorted(responses):
+        lines.append("  {}: {}".format(
+            code,
+            responses[code].get("description", ""),
+        ))
+
+    for code in sorted(responses):
+        if code.startswith("2") and "schema" in responses[code]:
+            lines.append("")
+            lines.append("schema ({}):".format(code))
+            lines.extend(_describe_schema(responses[code]["schema"], 1))
+            break
+
+    return "\n".join(lines)
+
+
+def _describe_schema(schema, depth, name=None, required=False):
+    """Return indented lines describing a schema, one per field."""
+
+    prefix = "{}{}{}".format(
+        "  " * depth,
+        "{}: ".format(name) if name else "",
+        "required " * int(required),
+    )
+
+    if "$ref" in schema:  # left in place because it's recursive
+        return ["{}{} (recursive)".format(prefix, schema["$ref"].split("/")[-1])]
+
+    if schema.get("type") == "array":
+        items = schema.get("items", {})
+        if items.get("properties"):
+            return ["{}array of objects".format(prefix)] + \
+                _describe_properties(items, depth + 1)
+        return ["{}array of {}".format(prefix, _describe_type(items))]
+
+    if schema.get("properties"):
+        return ["{}object".format(prefix)] + \
+            _describe_properties(schema, depth + 1)
+
+    return ["{}{}".format(prefix, _describe_type(schema))]
+
+
+def _describe_properties(schema, depth):
+    """Return lines describing each property of an object schema."""
+
+    required = set(schema.get("required", []))
+    lines = []
+    for name in sorted(schema["properties"]):
+        lines.extend(_describe_schema(
+            schema["properties"][name],
+            depth,
+            name,
+            name in required,
+        ))
+    return lines
+
+
+def _describe_type(node):
+    """Describe a scalar schema or parameter, with its constraints."""
+
+    if node.get("type") == "array":
+        return "array of {}".format(_describe_type(node.get("items", {})))
+
+    parts = [node.get("type", "object")]
+    if "format" in node:
+        parts.append("({})".format(node["format"]))
+    if "enum" in node:
+        enum = [str(x) for x in node["enum"]]
+        parts.append("one of {}{}".format(
+            ", ".join(enum[:MAX_ENUM]),
+            " (+{} more)".format(len(enum) - MAX_ENUM) * int(
+                len(enum) > MAX_ENUM
+            ),
+        ))
+    for key, label in (("minimum", "min"), ("maximum", "max"),
+                       ("default", "default")):
+        if key in node:
+            parts.append("{} {}".format(label, node[key]))
+    return " ".join(parts)
+
+
+def _root(path):
+    """Return the first literal section of a path, or an empty string."""
+
+    section = path.strip("/").split("/", 1)[0]
+    return "" if section.startswith("{") else section
+
+
+def _compile_pattern(template):
+    """Compile a path template into an anchored regex with named groups."""
+
+    parts = []
+    for part in re.split(r"({[^}/]+})", template):
+        if part.startswith("{"):
+            parts.append("(?P<{}>[^/]+)".format(part[1:-1]))
+        elif part:
+            parts.append(re.escape(part))
+    return re.compile("^{}$".format("".join(parts)))
+
+
+def _lookup(spec, ref):
+    """Return the node a local $ref points to."""
+
+    resolved = spec
+    for part in ref[2:].split("/"):
+        resolved = resolved.get(part, {})
+    return resolved
+
+
+def _resolve(spec, param):
+    """Resolve a local $ref parameter."""
+
+    ref = param.get("$ref")
+    if not ref or not ref.startswith("#/"):
+        return param
+    return _lookup(spec, ref)
+
+
+def _expand(spec, node, memo, stack):
+    """Recursively expand local $refs, leaving recursive ones in place."""
+
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/"):
+            if ref in memo:
+                return memo[ref]
+            if ref in stack:
+                return node
+            expanded = _expand(spec, _lookup(spec, ref), memo, stack + (ref,))
+            memo[ref] = expanded
+            return expanded
+        return {k: _expand(spec, v, memo, stack) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_expand(spec, x, memo, stack) for x in node]
+    return node
+
+
+def _compile_check(param):
+    """Build a single value check for a swagger parameter or items object.
+
+    Returns:
+        function taking a raw string and returning an error string or None
+    """
+
+    param_type = param.get("type", "string")
+    enum = param.get("enum")
+    checks = []
+
+    if param_type == "integer":
+        low, high = INT64 if param.get("format") == "int64" else INT32
+        checks.append(_number_check(int, "an integer", param, low, high))
+    elif param_type == "number":
+        checks.append(_number_check(float, "a number", param, None, None))
+    elif param_type == "boolean":
+        checks.append(_boolean_check)
+    elif param_type == "string":
+        checks.append(_string_check(param))
+
+    if enum:
+        choices = {str(x).lower() for x in enum}
+        message = "must be one of {}".format(
+            ", ".join("`{}`".format(x) for x in enum)
+        )
+        checks.append(lambda x: None if x.lower() in choices else message)
+
+    def check(value):
+        for func in checks:
+            error = func(value)
+            if error:
+                return "{} (got `{}`)".format(error, value)
+        return None
+
+    return check
+
+
+def _boolean_check(value):
+    """Check a raw boolean query value."""
+
+    if value in ("true", "false"):
+        return None
+    return "must be `true` or `false`"
+
+
+def _number_check(cast, type_name, param, low, high):
+    """Build a numeric check including any minimum/maximum bounds."""
+
+    minimum = param.get("minimum", low)
+    maximum = param.get("maximum", high)
+    exclusive_min = param.get("exclusiveMinimum", False)
+    exclusive_max = param.get("exclusiveMaximum", False)
+
+    def check(value):
+        try:
+            number = cast(value)
+        except ValueError:
+            return "must be {}".format(type_name)
+
+        if minimum is not None:
+            if number < minimum or (exclusive_min and number == minimum):
+                return "must be {} {}".format(
+                    "greater than" if exclusive_min else "at least",
+                    minimum,
+                )
+        if maximum is not None:
+            if number > maximum or (exclusive_max and number == maximum):
+                return "must be {} {}".format(
+                    "less than" if exclusive_max else "at most",
+                    maximum,
+                )
+        return None
+
+    return check
+
+
+def _string_check(param):
+    """Build a string check for length and pattern constraints."""
+
+    min_length = param.get("minLength")
+    max_length = param.get("maxLength")
+    pattern = re.compile(param["pattern"]) if "pattern" in param else None
+
+    def check(value):
+        if min_length is not None and len(value) < min_length:
+            return "must be at least {} characters".format(min_length)
+        if max_length is not None and len(value) > max_length:
+            return "must be at most {} characters".format(max_length)
+        if pattern is not None and not pattern.search(value):
+            return "must match `{}`".format(pattern.pattern)
+        return None
+
+    return check
+
+
+def _compile_array_check(param):
+    """Build a splitter/checker for array query params, or None for scalars.
+
+    Returns:
+        None, or function taking the list of raw values for the key and
+        returning a tuple of (list of item values, error string or None)
+    """
+
+    if param.get("type") != "array":
+        return None
+
+    collection = param.get("collectionFormat", "csv")
+    separator = COLLECTION_SEPARATORS.get(collection)
+    min_items = param.get("minItems")
+    max_items = param.get("maxItems")
+    unique = param.get("uniqueItems", False)
+
+    def check(values):
+        if collection == "multi":
+            items = values
+        else:
+            items = [x for x in values[-1].split(separator) if x != ""]
+
+        if min_items is not None and len(items) < min_items:
+            return items, "needs at least {} item{}".format(
+                min_items,
+                "s" * int(min_items != 1),
+            )
+        if max_items is not None and len(items) > max_items:
+            return items, "allows at most {} item{}".format(
+                max_items,
+                "s" * int(max_items != 1),
+            )
+        if unique and len(set(items)) != len(items):
+            return items, "must not contain duplicates"
+        return items, None
+
+    return check
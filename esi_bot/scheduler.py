@@ -0,0 +1,190 @@
+"""Periodic background jobs, each run on its own thread or greenlet.
+
+Jobs are registered by name with an interval (seconds), and are spread
+out by a random jitter of a fraction of it either way. A job never runs
+concurrently with itself, a run asked for while one is going (ie by the
+admin `jobs run` command) is skipped and counted instead. Run times and
+failures are kept per job, see the admin `jobs` command.
+"""
+
+
+import time
+import random
+import threading
+
+from esi_bot import LOG
+from esi_bot.loop_monitor import MONITOR
+
+
+JITTER = 0.1  # default fraction of the interval added or taken at random
+
+
+class Job:
+    """A named function run every interval seconds, with its run stats."""
+
+    def __init__(self, name, func, interval, jitter=JITTER, delay=0):
+        """Create a job, which runs after delay seconds once started.
+
+        Args:
+            name: string unique name for the job
+            func: function to run, without arguments
+            interval: seconds between the start of each run
+            jitter: fraction of the interval to vary each wait by
+            delay: seconds to wait before the first run
+        """
+
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.delay = delay
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0  # asked to run while running
+        self.overruns = 0  # took longer than the interval
+        self.total = 0.0  # seconds
+        self.longest = 0.0  # seconds
+        self.last_run = None  # time.time() the last run started
+        self.last_duration = None  # seconds
+        self.last_error = None  # repr of the last exception
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        """Return if the job is running now."""
+
+        return self._lock.locked()
+
+    def run(self):
+        """Run the job once, unless it's already running.
+
+        Returns:
+            boolean of if the job ran, successful or not
+        """
+
+        if not self._lock.acquire(blocking=False):
+            self.skipped += 1
+            return False
+
+        self.last_run = time.time()
+        start = time.perf_counter()
+        try:
+            with MONITOR.context("job {}".format(self.name), None):
+                self.func()
+        except Exception as error:  # pylint: disable=broad-except
+            self.failures += 1
+            self.last_error = repr(error)
+            LOG.exception("job %s failed", self.name)
+        finally:
+            self.last_duration = time.perf_counter() - start
+            self.runs += 1
+            self.total += self.last_duration
+            self.longest = max(self.longest, self.last_duration)
+            self._lock.release()
+        return True
+
+    def wait(self):
+        """Return the jittered seconds between two runs."""
+
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def summary(self):
+        """Return a dictionary of the job's run stats, in seconds."""
+
+        return {
+            "interval": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "overruns": self.overruns,
+            "avg": self.total / self.runs if self.runs else 0,
+            "max": self.longest,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """Runs every added job forever, once started."""
+
+    def __init__(self):
+        """Create a scheduler with no jobs."""
+
+        self.jobs = {}  # {name: Job}
+        self.started = False
+        self._lock = threading.Lock()
+
+    def add(self, name, func, interval, jitter=JITTER, delay=0):
+        """Add a job, starting it if the scheduler is running.
+
+        Raises:
+            ValueError if there is already a job with the name
+
+        Returns:
+            the new Job
+        """
+
+        job = Job(name, func, interval, jitter=jitter, delay=delay)
+        with self._lock:
+            if name in self.jobs:
+                raise ValueError("there is already a job named {}".format(name))
+            self.jobs[name] = job
+            started = self.started
+
+        if started:
+            self._start(job)
+        return job
+
+    def start(self):
+        """Start running the jobs, once."""
+
+        with self._lock:
+            if self.started:
+                return
+            self.started = True
+            jobs = list(self.jobs.values())
+
+        for job in jobs:
+            self._start(job)
+        LOG.info("scheduled %d jobs: %s", len(jobs), ", ".join(self.jobs))
+
+    def run_now(self, name):
+        """Run a job in the background now, outside of its schedule.
+
+        Returns:
+            boolean of if the job exists
+        """
+
+        job = self.jobs.get(name)
+        if job is None:
+            return False
+        threading.Thread(target=job.run, daemon=True).start()
+        return True
+
+    def _start(self, job):
+        """Start the job's thread."""
+
+        threading.Thread(
+            target=self._run,
+            args=(job,),
+            name="job-{}".format(job.name),
+            daemon=True,
+        ).start()
+
+    @staticmethod
+    def _run(job):
+        """Run the job on its schedule forever."""
+
+        time.sleep(job.delay)
+        while True:
+            start = time.monotonic()
+            job.run()
+            wait = job.wait() - (time.monotonic() - start)
+            if wait < 0:
+                job.overruns += 1
+            time.sleep(max(wait, 0))
+
+
+SCHEDULER = Scheduler()
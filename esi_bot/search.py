@@ -0,0 +1,136 @@
+"""In-memory inverted index with BM25 ranking."""
+
+
+import re
+import math
+import heapq
+from collections import Counter
+from collections import defaultdict
+
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how",
+    "i", "in", "is", "it", "of", "on", "or", "that", "the", "this", "to",
+    "was", "what", "when", "where", "which", "with",
+))
+
+
+def tokenize(text):
+    """Split text into normalised search terms."""
+
+    return [
+        _stem(x) for x in TOKEN.findall((text or "").lower())
+        if x not in STOP_WORDS
+    ]
+
+
+def _stem(term):
+    """Very light plural stripping, so structure matches structures."""
+
+    if len(term) > 4 and term.endswith("ies"):
+        return "{}y".format(term[:-3])
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+class InvertedIndex:
+    """Incrementally updatable inverted index, ranked with BM25.
+
+    Documents are dictionaries of {field: text}, fields can be weighted so
+    that ie a title match counts for more than a body match.
+    """
+
+    def __init__(self, weights=None, k1=1.2, b=0.75):
+        """Create a new, empty index."""
+
+        self._weights = weights or {}  # {field: term frequency multiplier}
+        self._k1 = k1
+        self._b = b
+        self._postings = defaultdict(dict)  # {term: {doc_id: weighted tf}}
+        self._terms = {}  # {doc_id: (term, ...)}
+        self._lengths = {}  # {doc_id: weighted document length}
+        self._total_length = 0
+
+    def __len__(self):
+        """Return the number of documents in the index."""
+
+        return len(self._lengths)
+
+    def __contains__(self, doc_id):
+        """Return boolean of if the document is indexed."""
+
+        return doc_id in self._lengths
+
+    def add(self, doc_id, fields):
+        """Add or replace a document.
+
+        Args:
+            doc_id: hashable document identifier
+            fields: dictionary of {field name: text}
+        """
+
+        self.remove(doc_id)
+
+        frequencies = Counter()
+        for field, text in fields.items():
+            weight = self._weights.get(field, 1)
+            for term in tokenize(text):
+                frequencies[term] += weight
+
+        for term, frequency in frequencies.items():
+            self._postings[term][doc_id] = frequency
+
+        length = sum(frequencies.values())
+        self._terms[doc_id] = tuple(frequencies)
+        self._lengths[doc_id] = length
+        self._total_length += length
+
+    def remove(self, doc_id):
+        """Remove a document from the index, if it's present."""
+
+        if doc_id not in self._lengths:
+            return
+
+        for term in self._terms.pop(doc_id):
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                self._postings.pop(term)
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def search(self, query, limit=10):
+        """Rank documents against the query.
+
+        Returns:
+            list of (score, doc_id) tuples, best first
+        """
+
+        if not self._lengths:
+            return []
+
+        count = len(self._lengths)
+        average = self._total_length / count or 1
+        scores = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(
+                1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for doc_id, frequency in postings.items():
+                norm = self._k1 * (
+                    1 - self._b + self._b * self._lengths[doc_id] / average
+                )
+                scores[doc_id] += idf * frequency * (self._k1 + 1) / (
+                    frequency + norm
+                )
+
+        return heapq.nlargest(
+            limit,
+            ((score, doc_id) for doc_id, score in scores.items()),
+            key=lambda x: x[0],
+        )
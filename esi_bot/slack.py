@@ -0,0 +1,168 @@
+"""Slack Web API transport, over a pooled keep-alive session.
+
+slackclient's own requester makes every call on a new connection, paying
+for a TLS handshake to slack.com each time. Calls made through here share
+a session with per-host pools instead (whose connection timings show in
+the admin `connections` command), have separate connect and read timeouts
+and are timed per method for the admin `slack` command.
+
+Responses are gzip compressed, Slack doesn't take compressed requests.
+"""
+
+
+import re
+import time
+import threading
+from urllib.parse import urlparse
+
+import requests
+from slackclient.slackrequest import SlackRequest
+
+from esi_bot import SLACK_API
+from esi_bot import __version__
+from esi_bot.pools import HostAdapter
+from esi_bot.pools import TimeoutRetry
+
+
+CONNECT_TIMEOUT = 5  # seconds
+READ_TIMEOUT = 30  # seconds, unless the caller gives one
+POOL_SIZE = 20  # connections kept per Slack host
+_OK = re.compile(rb'"ok"\s*:\s*true')
+
+_ORIGIN = urlparse(SLACK_API)
+SLACK_POOLS = {  # for pools.warm_all, as HOST_POOLS
+    "{}://{}".format(_ORIGIN.scheme, _ORIGIN.netloc): (
+        POOL_SIZE,
+        2,
+        "{}/api.test".format(_ORIGIN.path.rstrip("/")),
+    ),
+}
+
+METHODS = {}  # {Web API method: MethodStats}
+_METHODS_LOCK = threading.Lock()
+
+
+class MethodStats:
+    """Call counts and timings for a single Web API method."""
+
+    def __init__(self, method):
+        """Create empty stats for the method."""
+
+        self.method = method
+        self.calls = 0
+        self.errors = 0  # failed, or not "ok"
+        self.total = 0.0  # seconds
+        self.longest = 0.0  # seconds
+
+    def summary(self):
+        """Return a dictionary of the stats, in milliseconds."""
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": self.total / (self.calls or 1) * 1000,
+            "max_ms": self.longest * 1000,
+        }
+
+
+def record(method, seconds, ok):
+    """Record a call to a Web API method, by either engine."""
+
+    with _METHODS_LOCK:
+        if method not in METHODS:
+            METHODS[method] = MethodStats(method)
+        stats = METHODS[method]
+        stats.calls += 1
+        stats.errors += int(not ok)
+        stats.total += seconds
+        stats.longest = max(stats.longest, seconds)
+
+
+def _build_session():
+    """Build the requests session for every Slack host."""
+
+    ses = requests.Session()
+    ses.headers["User-Agent"] = "esi-bot/{}".format(__version__)
+    adapt = HostAdapter(
+        max_retries=TimeoutRetry(3),  # POSTs aren't retried once sent
+        pool_connections=4,  # hosts, ie slack.com and files.slack.com
+        pool_maxsize=POOL_SIZE,
+    )
+    ses.mount("http://", adapt)
+    ses.mount("https://", adapt)
+    return ses
+
+
+SLACK_SESSION = _build_session()
+
+
+def _ok(res):
+    """Return if a Web API response was a success."""
+
+    # slackclient parses the body for the caller, don't parse it twice
+    return res.status_code == 200 and _OK.search(res.content) is not None
+
+
+class PooledSlackRequest(SlackRequest):
+    """slackclient's Web API requester, on the pooled session."""
+
+    def post_http_request(self, token, api_method, post_data, files=None,
+                          timeout=None, domain=None):
+        """Submit a Web API request, as upstream but to SLACK_API."""
+
+        if post_data is not None and "token" in post_data:
+            token = post_data["token"]
+
+        start = time.perf_counter()
+        try:
+            res = SLACK_SESSION.post(
+                "{}/{}".format(SLACK_API, api_method),
+                headers={
+                    "user-agent": self.get_user_agent(),
+                    "Authorization": "Bearer {}".format(token),
+                },
+                data=post_data,
+                files=files,
+                timeout=(CONNECT_TIMEOUT, timeout or READ_TIMEOUT),
+                proxies=self.proxies,
+            )
+        except Exception:
+            record(api_method, time.perf_counter() - start, False)
+            raise
+
+        record(api_method, time.perf_counter() - start, _ok(res))
+        return res
+
+
+def pooled(slack):
+    """Make a SlackClient's Web API calls on the pooled session.
+
+    Returns:
+        the SlackClient
+    """
+
+    slack.server.api_requester = PooledSlackRequest(
+        proxies=slack.server.proxies,
+    )
+    return slack
+
+
+def upload_file(url, data, timeout):
+    """Post a file's content to an external upload URL from Slack.
+
+    Raises:
+        requests.RequestException if the upload failed
+    """
+
+    start = time.perf_counter()
+    ok = False
+    try:
+        res = SLACK_SESSION.post(
+            url,
+            data=data,
+            timeout=(CONNECT_TIMEOUT, timeout),
+        )
+        res.raise_for_status()
+        ok = True
+    finally:
+        record("upload", time.perf_counter() - start, ok)
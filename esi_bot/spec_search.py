@@ -0,0 +1,155 @@
+"""Search over the operations in the loaded ESI specs."""
+
+
+import threading
+
+from esi_bot import ESI_CHINA
+from esi_bot import MEMORY
+from esi_bot import command
+from esi_bot.diffs import spec_operations
+from esi_bot.search import InvertedIndex
+from esi_bot.search import tokenize
+from esi_bot.utils import esi_base_url
+
+
+WEIGHTS = {  # term frequency multipliers per operation field
+    "path": 3,
+    "summary": 3,
+    "tags": 2,
+    "operation_id": 2,
+    "method": 1,
+    "description": 1,
+}
+FILLER = frozenset(("route", "endpoint", "esi", "api"))  # as stemmed
+LIMIT = 8  # operations returned per search
+
+INDEXES = {}  # {(base_url, version): InvertedIndex}
+_INDEXED = {}  # {(base_url, version): {(method, path): (digest, details)}}
+_LOCK = threading.Lock()
+MEMORY.register(  # only reported, an evicted index would be rebuilt
+    "spec-search",
+    lambda: (INDEXES, _INDEXED),
+    count=lambda: sum(len(x) for x in list(INDEXES.values())),
+)
+
+
+def update_index(base_url, version, table):
+    """Index a refreshed spec version, after its diffs are updated.
+
+    Operations are matched up by the digests the diffs were computed with,
+    so only new or changed operations are (re)indexed and removed ones
+    are dropped, the rest of the index is left as it was.
+
+    Args:
+        base_url: ESI base url the spec belongs to
+        version: spec version name (latest, dev, legacy, ...)
+        table: the spec's RouteTable
+
+    Returns:
+        integer number of operations indexed
+    """
+
+    key = (base_url, version)
+    operations = spec_operations(base_url, version)
+    indexed = 0
+    with _LOCK:
+        index = INDEXES.setdefault(key, InvertedIndex(WEIGHTS))
+        known = _INDEXED.setdefault(key, {})
+
+        for doc_id in [x for x in known if x not in operations]:
+            index.remove(doc_id)
+            known.pop(doc_id)
+
+        for (method, path), operation in operations.items():
+            if known.get((method, path), (None,))[0] == operation.digest:
+                continue
+            raw = table.routes[path].operations[method]
+            index.add((method, path), {
+                "method": method,
+                "path": path,
+                "summary": raw.get("summary"),
+                # the rest is alternate routes and cache times
+                "description": (raw.get("description") or "").split("---")[0],
+                "tags": " ".join(raw.get("tags", [])),
+                "operation_id": raw.get("operationId"),
+            })
+            known[(method, path)] = (operation.digest, (
+                raw.get("summary") or "",
+                raw.get("tags", []),
+                raw.get("operationId") or "",
+            ))
+            indexed += 1
+
+    return indexed
+
+
+def search_operations(base_url, version, query, limit=LIMIT):
+    """Rank a spec version's operations against the query.
+
+    Words like "route" or "endpoint" describe every operation, so they're
+    dropped from the query unless nothing else is left.
+
+    Returns:
+        list of (method, path, summary, tags, operation_id) tuples, best
+        first, or None if the spec version isn't indexed
+    """
+
+    wanted = [x for x in query.split() if not set(tokenize(x)) <= FILLER]
+    with _LOCK:
+        index = INDEXES.get((base_url, version))
+        if index is None:
+            return None
+        known = _INDEXED[(base_url, version)]
+        return [
+            (method, path, *known[(method, path)][1])
+            for _, (method, path) in index.search(
+                " ".join(wanted) or query,
+                limit,
+            )
+        ]
+
+
+@command
+def search(msg):
+    """Find ESI operations in my copy of the specs, by relevance.
+
+    Matches words in the path, summary, description, tags and operationId.
+
+    Usage:
+        search <words>              ie search corporation structures
+        search <words> --<version>  in another spec version, ie --dev
+    """
+
+    base_url = esi_base_url(msg)
+    version = "latest"
+    words = []
+    for arg in msg.args:
+        if arg.lstrip("-") in ("china", "cn", "serenity"):
+            continue
+        if arg.startswith("--"):
+            version = arg[2:]
+        else:
+            words.append(arg)
+
+    if not words:
+        return "usage: !esi search <words> [--<version>]"
+
+    query = " ".join(words)
+    spec = "the {} ESI{} spec".format(
+        version,
+        " China" * int(base_url == ESI_CHINA),
+    )
+    results = search_operations(base_url, version, query)
+    if results is None:
+        return "I haven't loaded {} yet, try again in a bit".format(spec)
+    if not results:
+        return "no operations in {} match `{}`".format(spec, query)
+
+    lines = ["{} {}  {}{}  ({})".format(
+        method.upper(),
+        path,
+        summary,
+        "".join(" [{}]".format(x) for x in tags),
+        operation_id,
+    ) for method, path, summary, tags, operation_id in results]
+    return "```{}```".format("\n".join(lines))
@@ -0,0 +1,311 @@
+"""Request tracing, from a Slack event through to its reply.
+
+Each message event with the bot's prefix gets a trace, with spans for name
+lookups, command dispatch, ESI requests, encoding and the Slack calls made
+in reply. The current span is kept in a context variable, so spans opened
+anywhere below a trace join it and work outside of one costs a lookup.
+
+Finished traces are appended as json lines to ESI_BOT_TRACE_FILE, and/or
+posted as OTLP/HTTP json to ESI_BOT_OTLP_ENDPOINT, ie a collector at
+http://localhost:4318, from a thread of their own. At most MAX_QUEUED
+traces wait on the collector, more are dropped and counted. The slowest
+ESI_BOT_TRACE_KEEP are kept in memory.
+"""
+
+
+import os
+import time
+import heapq
+import queue
+import threading
+import contextvars
+from functools import partial
+from contextlib import contextmanager
+
+from esi_bot import LOG
+from esi_bot import codec
+
+
+TRACE_FILE = os.environ.get("ESI_BOT_TRACE_FILE")
+OTLP_ENDPOINT = os.environ.get("ESI_BOT_OTLP_ENDPOINT")
+KEEP_SLOWEST = int(os.environ.get("ESI_BOT_TRACE_KEEP", 20))
+EXPORT_TIMEOUT = 10  # seconds
+MAX_QUEUED = 100  # traces waiting to be exported, more are dropped
+
+_CURRENT = contextvars.ContextVar("esi_bot_span", default=None)
+_LOCK = threading.Lock()
+# its own thread, so a slow collector can't take fan out request threads
+_EXPORTS = queue.Queue(maxsize=MAX_QUEUED)
+_EXPORTER = []  # the export thread, once started
+SLOWEST = []  # heap of (duration, trace id, Trace)
+EXPORTS = {"exported": 0, "dropped": 0}
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attrs", "start",
+                 "duration", "_clock")
+
+    def __init__(self, trace, name, parent_id=None, attrs=None):
+        """Start timing a span, adding it to the trace."""
+
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.time()
+        self.duration = None
+        self._clock = time.perf_counter()
+        trace.spans.append(self)
+
+    def set(self, **attrs):
+        """Add attributes to the span."""
+
+        self.attrs.update(attrs)
+
+    def finish(self):
+        """Stop timing the span."""
+
+        self.duration = time.perf_counter() - self._clock
+
+    def as_dict(self):
+        """Return the span as a json serializable dictionary."""
+
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attrs": self.attrs,
+        }
+
+
+class _NoSpan:
+    """Stands in for a span outside of any trace."""
+
+    def set(self, **attrs):
+        """Ignore the attributes."""
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """The spans of one event, the first is the root."""
+
+    def __init__(self):
+        """Create an empty trace with a new ID."""
+
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+
+    @property
+    def root(self):
+        """Return the root span."""
+
+        return self.spans[0]
+
+    @property
+    def duration(self):
+        """Return the root span's duration in seconds."""
+
+        return self.root.duration or 0
+
+    def attr(self, name):
+        """Return the first value any span has for the attribute, or None."""
+
+        for span in self.spans:
+            if name in span.attrs:
+                return span.attrs[name]
+        return None
+
+    def as_dict(self):
+        """Return the trace as a json serializable dictionary."""
+
+        return {
+            "trace_id": self.trace_id,
+            "spans": [x.as_dict() for x in self.spans],
+        }
+
+
+@contextmanager
+def trace(name, **attrs):
+    """Start a new trace, its root span is the context manager's."""
+
+    root = Span(Trace(), name, attrs=attrs)
+    token = _CURRENT.set(root)
+    try:
+        yield root
+    finally:
+        root.finish()
+        _CURRENT.reset(token)
+        _finished(root.trace)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a child of the current span, if there is one."""
+
+    parent = _CURRENT.get()
+    if parent is None:
+        yield NO_SPAN
+        return
+
+    child = Span(parent.trace, name, parent.span_id, attrs)
+    token = _CURRENT.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _CURRENT.reset(token)
+
+
+def propagate(func):
+    """Wrap a function to run in a copy of the current context.
+
+    Use when submitting work to an executor, so its spans join the trace.
+    """
+
+    return partial(contextvars.copy_context().run, func)
+
+
+def find(trace_id):
+    """Return a kept trace by its ID or an ID prefix, or None."""
+
+    with _LOCK:
+        for _, kept_id, kept in SLOWEST:
+            if kept_id.startswith(trace_id):
+                return kept
+    return None
+
+
+def slowest():
+    """Return the kept traces, slowest first."""
+
+    with _LOCK:
+        return [x[2] for x in sorted(SLOWEST, reverse=True)]
+
+
+def _finished(finished):
+    """Keep the trace if it's one of the slowest, export it."""
+
+    with _LOCK:
+        entry = (finished.duration, finished.trace_id, finished)
+        if len(SLOWEST) < KEEP_SLOWEST:
+            heapq.heappush(SLOWEST, entry)
+        elif SLOWEST and entry[:2] > SLOWEST[0][:2]:
+            heapq.heapreplace(SLOWEST, entry)
+
+    if TRACE_FILE:
+        _export_file(finished)
+
+    if OTLP_ENDPOINT:
+        _queue_export(finished)
+
+
+def _export_file(finished):
+    """Append the trace to TRACE_FILE as a json line."""
+
+    try:
+        with _LOCK, open(TRACE_FILE, "ab") as trace_file:
+            trace_file.write(codec.dumps(finished.as_dict()) + b"\n")
+    except OSError as error:
+        LOG.warning("failed to write trace: %r", error)
+
+
+def _queue_export(finished):
+    """Queue the trace for the export thread, or drop it if it's behind."""
+
+    with _LOCK:
+        if not _EXPORTER:
+            _EXPORTER.append(threading.Thread(
+                target=_export_forever,
+                name="trace-export",
+                daemon=True,
+            ))
+            _EXPORTER[0].start()
+
+    try:
+        _EXPORTS.put_nowait(finished)
+    except queue.Full:
+        with _LOCK:
+            EXPORTS["dropped"] += 1
+
+
+def _export_forever():
+    """Export queued traces to the OTLP collector, one at a time."""
+
+    while True:
+        _export_otlp(_EXPORTS.get())
+
+
+def _export_otlp(finished):
+    """Post the trace to the OTLP/HTTP collector as json."""
+
+    # pylint: disable=import-outside-toplevel
+    from esi_bot import SESSION
+    from esi_bot import __version__
+
+    try:
+        res = SESSION.post(
+            "{}/v1/traces".format(OTLP_ENDPOINT.rstrip("/")),
+            data=codec.dumps(_otlp(finished, __version__)),
+            headers={"Content-Type": "application/json"},
+            timeout=EXPORT_TIMEOUT,
+        )
+        res.raise_for_status()
+    except Exception as error:  # pylint: disable=broad-except
+        LOG.warning("failed to export trace: %r", error)
+    else:
+        with _LOCK:
+            EXPORTS["exported"] += 1
+
+
+def _otlp(finished, version):
+    """Return the OTLP json payload for a trace."""
+
+    spans = []
+    for exported in finished.spans:
+        start = int(exported.start * 1e9)
+        spans.append({
+            "traceId": finished.trace_id,
+            "spanId": exported.span_id,
+            "parentSpanId": exported.parent_id or "",
+            "name": exported.name,
+            "kind": 1,  # internal
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(
+                start + int((exported.duration or 0) * 1e9)
+            ),
+            "attributes": _otlp_attributes(exported.attrs),
+        })
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({
+            "service.name": "esi-bot",
+        })},
+        "scopeSpans": [{
+            "scope": {"name": "esi_bot", "version": version},
+            "spans": spans,
+        }],
+    }]}
+
+
+def _otlp_attributes(attrs):
+    """Return OTLP key values for a dictionary of attributes."""
+
+    values = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            value = {"boolValue": value}
+        elif isinstance(value, int):
+            value = {"intValue": str(value)}
+        elif isinstance(value, float):
+            value = {"doubleValue": value}
+        else:
+            value = {"stringValue": str(value)}
+        values.append({"key": key, "value": value})
+    return values
@@ -0,0 +1,391 @@
+"""Local, persisted index of EVE type names for name lookups."""
+
+
+import re
+import time
+import bisect
+import threading
+from collections import Counter
+from collections import defaultdict
+from urllib.parse import quote
+
+from esi_bot import ESI
+from esi_bot import ESI_CHINA
+from esi_bot import LOG
+from esi_bot import MEMORY
+from esi_bot import codec
+from esi_bot import do_request
+from esi_bot import multi_request
+from esi_bot.utils import load_cache
+from esi_bot.utils import save_cache
+
+
+DEFAULT_LANGUAGE = {ESI: "en", ESI_CHINA: "zh"}
+LANGUAGES = ("en", "de", "fr", "ja", "ru", "ko", "zh", "es")  # ESI's own
+DATASOURCE = {ESI: "tranquility", ESI_CHINA: "serenity"}
+MAX_AGE = 86400  # seconds between incremental type list syncs
+SYNC_CHECK = 600  # seconds between the scheduler's checks for old indexes
+FUZZY_CUTOFF = 0.3  # minimum trigram similarity for fuzzy matches
+MAX_RESOLVE = 10  # types resolved one request each in other languages
+
+INDEXES = {}  # {(base_url, language): TypeNames}
+
+
+def _evict_indexes(fraction):
+    """Drop indexes in other languages than the default, for the registry.
+
+    Default language indexes are kept, they'd only be rebuilt.
+
+    Returns:
+        integer number of types dropped
+    """
+
+    other = [x for x, index in list(INDEXES.items()) if not index.bulk]
+    dropped = 0
+    for key in other[:max(1, int(len(other) * fraction + 0.5))]:
+        dropped += len(INDEXES.pop(key, ()))
+    return dropped
+
+
+MEMORY.register(
+    "type-names",
+    lambda: INDEXES,
+    budget=256,
+    evict=_evict_indexes,
+    count=lambda: sum(len(x) for x in list(INDEXES.values())),
+)
+
+
+def type_names(base_url, language=None):
+    """Return the TypeNames index for the datasource and language.
+
+    Raises:
+        ValueError if the language isn't one ESI supports
+    """
+
+    language = language or DEFAULT_LANGUAGE[base_url]
+    if language not in LANGUAGES:
+        raise ValueError("ESI doesn't support language {}".format(language))
+    key = (base_url, language)
+    index = INDEXES.get(key)
+    if index is None:
+        index = INDEXES[key] = TypeNames(base_url, language)
+        if not index.ready and index.bulk:
+            # rather than wait for the job, which may be busy syncing
+            # another index and would skip a run asked for now
+            threading.Thread(target=index.sync, daemon=True).start()
+    return index
+
+
+def sync_stale():
+    """Sync every index older than MAX_AGE, for the scheduler.
+
+    Each datasource's default language index is created first if need
+    be, so it's built before anyone asks for it.
+    """
+
+    for key in DEFAULT_LANGUAGE.items():
+        if key not in INDEXES:
+            INDEXES[key] = TypeNames(*key)
+    for index in list(INDEXES.values()):
+        if index.bulk and time.time() - index.synced >= MAX_AGE:
+            index.sync()
+
+
+def _normalise(name):
+    """Normalise a type name or query for matching."""
+
+    return " ".join(name.lower().split())
+
+
+def _trigrams(name):
+    """Return the set of padded trigrams in a normalised name."""
+
+    padded = "  {} ".format(name)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TypeNames:
+    """Prefix and trigram searchable type names for one datasource/language.
+
+    The full type list is bulk loaded once and persisted in the local cache,
+    after that only new type IDs are resolved, and types seen through other
+    lookups are added as they come in.
+
+    NB: only the datasource's default language is bulk loaded, names in
+        other languages can only be resolved one request per type, so
+        those indexes hold just the types seen through lookups
+    """
+
+    def __init__(self, base_url, language):
+        """Create a new index, loading any persisted names."""
+
+        self._base_url = base_url
+        self._language = language
+        self._filename = "types-{}-{}.json".format(
+            DATASOURCE[base_url],
+            language,
+        )
+        self._names = {}  # {type_id: name}
+        self._prefixes = []  # sorted [(normalised name, type_id)]
+        self._trigrams = defaultdict(set)  # {trigram: {type_id}}
+        self._trigram_counts = {}  # {type_id: number of trigrams}
+        self._lock = threading.Lock()  # held while syncing, never waited on
+        # held while reading or changing the index, commands add to it
+        # from their own threads while a sync may be adding too
+        self._index_lock = threading.RLock()
+        self.bulk = language == DEFAULT_LANGUAGE[base_url]
+        self.synced = 0
+
+        cached = self.bulk and load_cache(self._filename)
+        if cached:
+            self.synced = cached["synced"]
+            self._bulk_add(
+                (int(type_id), name)
+                for type_id, name in cached["names"].items()
+            )
+
+    @property
+    def ready(self):
+        """Boolean of if the index has ever been built, or needn't be."""
+
+        return self.synced > 0 or not self.bulk
+
+    def __len__(self):
+        """Return the number of types in the index."""
+
+        return len(self._names)
+
+    def add(self, type_id, name):
+        """Add or rename a single type in the index."""
+
+        with self._index_lock:
+            if self._names.get(type_id) == name:
+                return
+
+            self._remove(type_id)
+            normalised = _normalise(name)
+            self._names[type_id] = name
+            bisect.insort(self._prefixes, (normalised, type_id))
+            trigrams = _trigrams(normalised)
+            self._trigram_counts[type_id] = len(trigrams)
+            for trigram in trigrams:
+                self._trigrams[trigram].add(type_id)
+
+    def _remove(self, type_id):
+        """Remove a type from the index, if it's present."""
+
+        with self._index_lock:
+            name = self._names.pop(type_id, None)
+            if name is None:
+                return
+
+            normalised = _normalise(name)
+            index = bisect.bisect_left(self._prefixes, (normalised, type_id))
+            if self._prefixes[index:index + 1] == [(normalised, type_id)]:
+                self._prefixes.pop(index)
+            self._trigram_counts.pop(type_id, None)
+            for trigram in _trigrams(normalised):
+                self._trigrams[trigram].discard(type_id)
+
+    def _bulk_add(self, names):
+        """Add many types at once, sorting the prefix index only once."""
+
+        with self._index_lock:
+            for type_id, name in names:
+                normalised = _normalise(name)
+                self._names[type_id] = name
+                self._prefixes.append((normalised, type_id))
+                trigrams = _trigrams(normalised)
+                self._trigram_counts[type_id] = len(trigrams)
+                for trigram in trigrams:
+                    self._trigrams[trigram].add(type_id)
+            self._prefixes.sort()
+
+    def find(self, query, limit=10):
+        """Find types by name.
+
+        Exact matches win, then prefix matches, then fuzzy trigram matches.
+
+        Returns:
+            list of (type_id, name) tuples, best matches first
+        """
+
+        query = _normalise(query)
+        if not query:
+            return []
+
+        with self._index_lock:
+            index = bisect.bisect_left(self._prefixes, (query,))
+            matches = []
+            while index < len(self._prefixes) and len(matches) < limit:
+                name, type_id = self._prefixes[index]
+                if not name.startswith(query):
+                    break
+                matches.append((type_id, self._names[type_id]))
+                index += 1
+
+            exact = [x for x in matches if _normalise(x[1]) == query]
+            if exact:
+                return exact
+            if matches:
+                return matches
+            return self._fuzzy(query, limit)
+
+    def _fuzzy(self, query, limit):
+        """Rank types by trigram similarity to the query."""
+
+        trigrams = _trigrams(query)
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+
+        scored = []
+        for type_id, count in shared.items():
+            score = count / (
+                len(trigrams) + self._trigram_counts[type_id] - count
+            )
+            if score >= FUZZY_CUTOFF:
+                scored.append((-score, self._names[type_id], type_id))
+
+        scored.sort()
+        return [(type_id, name) for _, name, type_id in scored[:limit]]
+
+    def search_esi(self, query):
+        """Fall back to ESI's search for names missing from the index.
+
+        Any results are added to the index.
+
+        Returns:
+            list of (type_id, name) tuples
+        """
+
+        status, results = do_request(
+            "{}/v2/search/?categories=inventory_type&language={}"
+            "&search={}".format(self._base_url, self._language, quote(query))
+        )
+        if status != 200 or not results.get("inventory_type"):
+            return []
+
+        names = self._resolve(results["inventory_type"][:100])
+        for type_id, name in names.items():
+            self.add(type_id, name)
+        return sorted(names.items(), key=lambda x: x[1])
+
+    def sync(self):
+        """Bulk build, or incrementally update, the index from ESI.
+
+        Only type IDs not already in the index have their names resolved.
+
+        Returns:
+            integer number of types added, or None if already syncing
+        """
+
+        if not self.bulk:
+            return 0
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            type_ids = self._type_ids()
+            if type_ids is None:
+                return 0
+
+            new_ids = [x for x in type_ids if x not in self._names]
+            names = self._resolve(new_ids)
+            with self._index_lock:
+                if self._names:
+                    for type_id, name in names.items():
+                        self.add(type_id, name)
+                else:
+                    self._bulk_add(names.items())
+
+            self.synced = time.time()
+            with self._index_lock:
+                saved = dict(self._names)
+            save_cache(self._filename, {
+                "synced": self.synced,
+                "names": saved,
+            })
+            LOG.info(
+                "synced %d new type names for %s (%s), %d total",
+                len(names),
+                DATASOURCE[self._base_url],
+                self._language,
+                len(self._names),
+            )
+            return len(names)
+        finally:
+            self._lock.release()
+
+    def _type_ids(self):
+        """Return the list of all published type IDs, or None on failure."""
+
+        url = "{}/v1/universe/types/".format(self._base_url)
+        res = do_request(url, return_response=True)
+        if isinstance(res, tuple) or res.status_code != 200:
+            return None
+
+        type_ids = codec.loads(res.content)
+        pages = int(res.headers.get("X-Pages", 1))
+        urls = ["{}?page={}".format(url, x) for x in range(2, pages + 1)]
+        for status, page in multi_request(urls).values():
+            if status != 200:
+                return None
+            type_ids.extend(page)
+        return type_ids
+
+    def _resolve(self, type_ids):
+        """Resolve type IDs to names, in chunks of 1000.
+
+        Languages other than the datasource's default can only be resolved
+        one request per type, so only the first MAX_RESOLVE are.
+
+        Returns:
+            dictionary of {type_id: name}
+        """
+
+        names = {}
+        if self._language != DEFAULT_LANGUAGE[self._base_url]:
+            # universe/names only speaks the datasource's default language
+            urls = {
+                "{}/v3/universe/types/{}/?language={}".format(
+                    self._base_url,
+                    type_id,
+                    self._language,
+                ): type_id for type_id in type_ids[:MAX_RESOLVE]
+            }
+            for url, result in multi_request(urls).items():
+                status, details = result
+                if status == 200:
+                    names[urls[url]] = details["name"]
+            return names
+
+        url = "{}/v3/universe/names/".format(self._base_url)
+        for i in range(0, len(type_ids), 1000):
+            status, results = do_request(url, body=type_ids[i:i + 1000])
+            if status == 200:
+                names.update({x["id"]: x["name"] for x in results})
+            else:
+                LOG.warning("failed to resolve type names: %r", results)
+        return names
+
+
+def parse_language(args):
+    """Pull a language=xx argument out of the args.
+
+    NB: the language isn't checked, see LANGUAGES
+
+    Returns:
+        tuple of (language or None, remaining args)
+    """
+
+    language = None
+    remaining = []
+    for arg in args:
+        match = re.match(r"^-*(?:language|lang)=([a-z-]+)$", arg)
+        if match:
+            language = match.group(1)
+        else:
+            remaining.append(arg)
+    return language, remaining
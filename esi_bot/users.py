@@ -1,8 +1,9 @@
 """User ID -> name tracking."""
 
 
-import time
-
+from esi_bot import MEMORY
+from esi_bot.memory import evict_oldest
+from esi_bot import tracing
 from esi_bot.utils import paginated_id_to_names
 
 
@@ -13,17 +14,18 @@ class Users:
         """Create a new Users object and sync names."""
 
         self._names = {}  # {id: name}
-        self._last_sync = 0
         self._slack = slack
+        MEMORY.register(
+            "slack-users",
+            lambda: self._names,
+            budget=32,
+            evict=lambda x: evict_oldest(self._names, x),
+        )
         self.update_names()
 
     def update_names(self):
-        """Update our names cache once per minute at max."""
-
-        if time.time() - self._last_sync < 60:
-            return
+        """Update our names cache, run periodically by the scheduler."""
 
-        self._last_sync = time.time()
         names = paginated_id_to_names(self._slack, "users.list", "members")
         if names:
             self._names = names
@@ -31,11 +33,10 @@ class Users:
     def get_name(self, user_id):
         """Return the name for the user ID.
 
-        NB: this can return None if we fail to sync user id/names
+        NB: this returns None for users who joined since the last sync
         """
 
-        name = self._names.get(user_id)
-        if name is None:
-            self.update_names()
+        with tracing.span("users.get_name") as span:
             name = self._names.get(user_id)
-        return name
+            span.set(found=name is not None)
+            return name
@@ -1,8 +1,11 @@
 """Common ESI-bot helper functions."""
 
 
+import os
+
 from esi_bot import ESI
 from esi_bot import ESI_CHINA
+from esi_bot import codec
 
 
 def paginated_id_to_names(slack, method, key, **kwargs):
@@ -34,3 +37,40 @@ def esi_base_url(message):
                 "--{}".format(arg) in message.args:
             return ESI_CHINA
     return ESI
+
+
+def cache_path(filename):
+    """Return the path to a file in the local cache directory."""
+
+    cache_dir = os.environ.get(
+        "ESI_BOT_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "esi-bot"),
+    )
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, filename)
+
+
+def load_cache(filename):
+    """Load a json document from the local cache, or None."""
+
+    try:
+        with open(cache_path(filename), "rb") as cache_file:
+            return codec.loads(cache_file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def save_cache(filename, content):
+    """Atomically write a json document to the local cache."""
+
+    path = cache_path(filename)
+    with open("{}.tmp".format(path), "wb") as cache_file:
+        cache_file.write(codec.dumps(content))
+    os.replace("{}.tmp".format(path), path)
+
+
+def is_admin(message):
+    """Return boolean of if the message speaker is a bot admin."""
+
+    admins = os.environ.get("ESI_BOT_ADMINS", "").split(",")
+    return message.speaker in admins
@@ -23,6 +23,10 @@ setup(
         "slackclient == 1.3.2",
         "gevent >= 1.2.2",
     ],
+    extras_require={
+        "json": ["orjson >= 3.0"],
+        "asyncio": ["aiohttp >= 3.6"],
+    },
     setup_requires=["setuphelpers >= 0.1.2"],
     entry_points={"console_scripts": ["esi-bot = esi_bot.bot:main"]},
     classifiers=[
@@ -0,0 +1,41 @@
+"""Tests for the admission token buckets."""
+
+
+from unittest import mock
+
+from esi_bot import admission
+from esi_bot.admission import TokenBucket
+
+
+def _bucket(capacity, rate):
+    """Return a bucket on a mocked clock, and the clock."""
+
+    clock = mock.Mock(return_value=1000.0)
+    with mock.patch.object(admission.time, "monotonic", clock):
+        bucket = TokenBucket(capacity, rate)
+    return bucket, clock
+
+
+def test_wait_for():
+    """Waits are for the missing tokens at the refill rate."""
+
+    bucket, clock = _bucket(10, 2)
+    with mock.patch.object(admission.time, "monotonic", clock):
+        assert bucket.wait_for(10) == 0
+        bucket.tokens -= 10
+        assert bucket.wait_for(4) == 2
+        assert bucket.wait_for(11) == float("inf")
+
+
+def test_refill():
+    """Buckets refill over time, up to their capacity."""
+
+    bucket, clock = _bucket(10, 2)
+    bucket.tokens = 0
+    with mock.patch.object(admission.time, "monotonic", clock):
+        clock.return_value += 3
+        assert bucket.wait_for(6) == 0
+        assert not bucket.full
+        clock.return_value += 60
+        assert bucket.full
+        assert bucket.tokens == 10
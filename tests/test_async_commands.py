@@ -0,0 +1,101 @@
+"""Tests for async commands, under either engine."""
+
+
+import time
+import asyncio
+import threading
+from email.utils import formatdate
+from unittest import mock
+
+import pytest
+
+from esi_bot import ESI
+from esi_bot import COMMANDS
+from esi_bot import MESSAGE
+from esi_bot import RESPONSES
+from esi_bot import aio
+from esi_bot.processor import Processor
+from esi_bot.processor import _process_msg
+
+
+URLS = ["{}/latest/universe/types/{}/".format(ESI, x) for x in (34, 35)]
+
+
+async def _names(msg):
+    """Look up some type names concurrently, as an async command."""
+
+    results = await aio.multi_request(URLS)
+    return "{}: {}".format(msg.command, ", ".join(
+        results[x][1]["name"] for x in URLS
+    ))
+
+
+@pytest.fixture(autouse=True)
+def _cached_types():
+    """Register the async command, with its responses already cached."""
+
+    expires = {"Expires": formatdate(time.time() + 60, usegmt=True)}
+    for url, name in zip(URLS, ("Tritanium", "Pyerite")):
+        RESPONSES.store(
+            (url, None),
+            200,
+            expires,
+            '{{"name": "{}"}}'.format(name).encode(),
+        )
+    with mock.patch.dict(COMMANDS, {"names": _names}):
+        yield
+
+
+@pytest.fixture
+def _event_loop():
+    """Run an event loop on another thread, as the asyncio engine does."""
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def _reply(processor):
+    """Process a message for the async command, return the reply sent."""
+
+    with mock.patch.object(processor, "_process_str_reply") as reply:
+        processor._process_event(  # pylint: disable=W0212
+            "1.0", "channel", "user", "!esi names",
+        )
+    return reply.call_args[0][0]
+
+
+def _processor(run_coroutine=None):
+    """Return a processor on a mock Slack client."""
+
+    slack = mock.Mock()
+    slack.api_call.return_value = {"ok": False}
+    processor = Processor(slack, run_coroutine=run_coroutine)
+    processor._channels.get_name = lambda _: "channel"  # pylint: disable=W0212
+    return processor
+
+
+def test_dispatch_returns_coroutine():
+    """Async commands are matched like any other, replying a coroutine."""
+
+    command, reply = _process_msg(MESSAGE("user", "names", []))
+    assert command == "names"
+    assert asyncio.iscoroutine(reply)
+    assert aio.run(reply) == "names: Tritanium, Pyerite"
+
+
+def test_gevent_engine():
+    """Under gevent, async replies run on an event loop of their own."""
+
+    assert _reply(_processor()) == "names: Tritanium, Pyerite"
+
+
+def test_asyncio_engine(_event_loop):  # pylint: disable=redefined-outer-name
+    """Under asyncio, async replies run on the bot's event loop."""
+
+    bridge = aio.SlackBridge(mock.Mock(), _event_loop)
+    assert _reply(_processor(bridge.wait)) == "names: Tritanium, Pyerite"
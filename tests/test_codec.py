@@ -0,0 +1,29 @@
+"""Tests for the JSON codec helpers."""
+
+
+import json
+
+from esi_bot import codec
+
+
+def test_truncate_keeps_complete_items():
+    """Top level arrays and objects are cut after a complete item."""
+
+    assert codec.truncate(b"[1, 2, 3, 4]", 8) == b"[1, 2]"
+    assert codec.truncate(b'{"a": 1, "b": 2}', 12) == b'{"a": 1}'
+    assert json.loads(codec.truncate(b"[1, 2, 3, 4]", 8)) == [1, 2]
+
+
+def test_truncate_other_values():
+    """Short enough JSON is unchanged, other values are just cut."""
+
+    assert codec.truncate(b"[1,2]", 100) == b"[1,2]"
+    assert codec.truncate(b'"abcdef"', 4) == b'"abc'
+
+
+def test_pretty_matches_json():
+    """Pretty output is the same as the standard library's."""
+
+    obj = {"b": [1, {"c": None, "d": 1.5}], "a": "é", "e": True}
+    assert codec.pretty(obj) == json.dumps(obj, sort_keys=True, indent=4)
+    assert codec.pretty([]) == json.dumps([], sort_keys=True, indent=4)
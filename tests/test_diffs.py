@@ -0,0 +1,69 @@
+"""Tests for structural diffs between spec versions."""
+
+
+from esi_bot.diffs import OPERATION
+from esi_bot.diffs import _diff
+
+
+def _operation(digest, **changes):
+    """Return an operation summary, with changes to the defaults."""
+
+    values = {
+        "digest": digest,
+        "params": {"datasource (query)": "a"},
+        "responses": {"200": "b"},
+        "fields": frozenset(("name required", "name string")),
+        "scopes": frozenset(),
+        "cache": 300,
+    }
+    values.update(changes)
+    return OPERATION(**values)
+
+
+def test_added_and_removed():
+    """Routes only in one version are added or removed, sorted by path."""
+
+    previous = {
+        ("get", "/b/"): _operation("1"),
+        ("get", "/c/"): _operation("2"),
+    }
+    current = {
+        ("post", "/a/"): _operation("3"),
+        ("get", "/a/"): _operation("4"),
+        ("get", "/b/"): _operation("1"),
+    }
+    diff = _diff(previous, current, 123)
+    assert diff.added == [("get", "/a/"), ("post", "/a/")]
+    assert diff.removed == [("get", "/c/")]
+    assert diff.changed == {}
+    assert diff.timestamp == 123
+
+
+def test_changed():
+    """Changed operations describe what changed."""
+
+    previous = {("get", "/a/"): _operation("1")}
+    current = {("get", "/a/"): _operation(
+        "2",
+        params={"page (query)": "c", "datasource (query)": "d"},
+        fields=frozenset(("name string",)),
+        scopes=frozenset(("esi-a.v1",)),
+        cache=600,
+    )}
+    assert _diff(previous, current, 0).changed == {("get", "/a/"): [
+        "param page (query) added",
+        "param datasource (query) changed",
+        "field removed: name required",
+        "scope added: esi-a.v1",
+        "cache time changed from 300s to 600s",
+    ]}
+
+
+def test_metadata_only():
+    """Changes outside of the summarised parts are still noted."""
+
+    previous = {("get", "/a/"): _operation("1")}
+    current = {("get", "/a/"): _operation("3")}
+    assert _diff(previous, current, 0).changed == {
+        ("get", "/a/"): ["description or metadata changed"],
+    }
@@ -0,0 +1,80 @@
+"""Tests for the cached GitHub API access."""
+
+
+import time
+from unittest import mock
+
+import pytest
+
+from esi_bot import github
+
+
+URL = "https://api.github.com/repos/esi/esi-issues/issues/1"
+
+
+@pytest.fixture(autouse=True)
+def _clean_state():
+    """Start each test with an empty cache and no rate limit."""
+
+    with mock.patch.dict(github.CACHE, clear=True), \
+            mock.patch.dict(github.RATE_LIMIT, remaining=None, reset=0):
+        yield
+
+
+def _response(status, content=b"", etag=None, remaining=100):
+    """Return a mock GitHub response."""
+
+    headers = {
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(time.time()) + 60),
+    }
+    if etag:
+        headers["ETag"] = etag
+    return mock.Mock(status_code=status, content=content, headers=headers)
+
+
+def test_etag_revalidation():
+    """Cached responses are revalidated with their ETag."""
+
+    fresh = _response(200, b'{"number": 1}', etag='"a"')
+    with mock.patch.object(github, "do_request", return_value=fresh) as req:
+        assert github.github_request(URL) == (200, {"number": 1})
+        assert "If-None-Match" not in req.call_args[1]["headers"]
+
+    with mock.patch.object(github, "do_request",
+                           return_value=_response(304)) as req:
+        assert github.github_request(URL) == (200, {"number": 1})
+        assert req.call_args[1]["headers"]["If-None-Match"] == '"a"'
+
+
+def test_uncached_requests():
+    """Requests made with cache=False are neither cached nor looked up."""
+
+    fresh = _response(200, b"[]", etag='"a"')
+    with mock.patch.object(github, "do_request", return_value=fresh):
+        assert github.github_request(URL, cache=False) == (200, [])
+    assert URL not in github.CACHE
+
+
+def test_throttled():
+    """Out of requests, cached content is used or a 429 returned."""
+
+    spent = _response(200, b'{"number": 1}', etag='"a"', remaining=0)
+    with mock.patch.object(github, "do_request", return_value=spent):
+        github.github_request(URL)
+
+    with mock.patch.object(github, "do_request") as req:
+        assert github.github_request(URL) == (200, {"number": 1})
+        status, _ = github.github_request("{}0".format(URL))
+        assert status == 429
+        assert not req.called
+
+
+def test_cache_capped():
+    """The cache drops its oldest responses once full."""
+
+    with mock.patch.object(github, "MAX_CACHED", 2):
+        for number in range(3):
+            github._store(number, {})  # pylint: disable=W0212
+        github._store(1, {})  # pylint: disable=W0212
+    assert list(github.CACHE) == [2, 1]
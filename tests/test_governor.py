@@ -0,0 +1,66 @@
+"""Tests for the ESI error limit governor."""
+
+
+from esi_bot.governor import ERROR_FLOOR
+from esi_bot.governor import ERROR_LIMIT
+from esi_bot.governor import HARD_FLOOR
+from esi_bot.governor import ErrorLimitGovernor
+
+
+def _governor(remain):
+    """Return a governor told there are remain errors left."""
+
+    governor = ErrorLimitGovernor()
+    assert governor.admit() is None
+    governor.record(200, {
+        "X-Esi-Error-Limit-Remain": str(remain),
+        "X-Esi-Error-Limit-Reset": "30",
+    })
+    return governor
+
+
+def test_floors():
+    """Requests are refused at the floor, essential ones only lower."""
+
+    governor = _governor(ERROR_FLOOR)
+    assert "budget low" in governor.admit()
+    assert governor.admit(essential=True) is None
+    assert governor.refused == 1
+
+    governor = _governor(HARD_FLOOR)
+    assert governor.admit(essential=True) is not None
+
+
+def test_error_limited():
+    """A 420 blocks every request until the window resets."""
+
+    governor = _governor(50)
+    assert governor.admit() is None
+    governor.record(420)
+    assert governor.remaining() == 0
+    assert "error limited" in governor.admit(essential=True)
+    assert governor.inflight == 0
+
+
+def test_backoff():
+    """Server errors back off, a success resets the count."""
+
+    governor = _governor(50)
+    for _ in range(3):
+        assert governor.admit(wait=False) is None
+        governor.record(502)
+    assert governor.failures == 3
+    assert 0 <= governor.backoff() <= 4
+
+    assert governor.admit(wait=False) is None
+    governor.record(200)
+    assert governor.failures == 0
+
+
+def test_concurrency():
+    """Concurrency scales down with the error budget left."""
+
+    assert ErrorLimitGovernor().concurrency(100) == 100
+    assert _governor(ERROR_FLOOR).concurrency(100) == 1
+    half = ERROR_FLOOR + (ERROR_LIMIT - ERROR_FLOOR) // 2
+    assert _governor(half).concurrency(100) == 50
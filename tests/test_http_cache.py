@@ -0,0 +1,76 @@
+"""Tests for the shared ESI response cache."""
+
+
+import time
+import threading
+from email.utils import formatdate
+from unittest import mock
+
+from esi_bot.http_cache import ResponseCache
+
+
+def _response(expires=60):
+    """Return a mock successful response expiring in expires seconds."""
+
+    return mock.Mock(
+        status_code=200,
+        headers={"Expires": formatdate(time.time() + expires, usegmt=True)},
+        content=b"{}",
+    )
+
+
+def test_cached_until_expiry():
+    """Successful responses with an expiry are cached, others aren't."""
+
+    cache = ResponseCache()
+    cache.store("ok", 200, _response().headers, b"{}")
+    cache.store("error", 404, _response().headers, b"{}")
+    cache.store("expired", 200, _response(expires=-5).headers, b"{}")
+    cache.store("no expiry", 200, {}, b"{}")
+
+    assert cache.get("ok") == (200, b"{}")
+    assert cache.get("error") is None
+    assert cache.get("expired") is None
+    assert cache.get("no expiry") is None
+    assert len(cache) == 1
+
+
+def test_identical_requests_coalesced():
+    """Only one identical request leads, the rest wait for its response."""
+
+    cache = ResponseCache()
+    assert cache.lead("url") is True
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append((
+        cache.lead("url"),
+        cache.get("url"),
+    )))
+    waiter.start()
+    cache.done("url", _response())
+    waiter.join(5)
+
+    assert results == [(False, (200, b"{}"))]
+    assert cache.misses == 1
+    assert cache.coalesced == 1
+    assert cache.lead("url") is True  # released once done
+
+
+def test_failed_requests_release_waiters():
+    """A failed leader releases waiters without caching anything."""
+
+    cache = ResponseCache()
+    assert cache.lead("url") is True
+    cache.done("url", (499, "failed to request url"))
+    assert cache.get("url") is None
+    assert cache.lead("url") is True
+
+
+def test_full_cache():
+    """Full caches drop the oldest entry to store another."""
+
+    cache = ResponseCache(max_entries=2)
+    for key in range(3):
+        cache.store(key, 200, _response().headers, b"{}")
+    assert cache.get(0) is None
+    assert len(cache) == 2
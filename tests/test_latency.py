@@ -0,0 +1,52 @@
+"""Tests for the latency histograms."""
+
+
+import math
+
+from esi_bot.latency import BOUNDS
+from esi_bot.latency import SLOT_SECONDS
+from esi_bot.latency import SLOTS
+from esi_bot.latency import Histogram
+from esi_bot.latency import percentile
+
+
+NOW = 1000 * SLOT_SECONDS
+
+
+def test_counts():
+    """Probes are counted in their bins, errors separately."""
+
+    histogram = Histogram()
+    histogram.add(0.01, False, NOW)
+    histogram.add(BOUNDS[0], False, NOW)
+    histogram.add(BOUNDS[-1] * 2, True, NOW)
+    counts = histogram.counts(NOW)
+    assert counts[0] == 2
+    assert counts[-2] == 1
+    assert counts[-1] == 1
+
+
+def test_old_slots_dropped():
+    """Slots older than the window aren't counted, and are dropped."""
+
+    histogram = Histogram()
+    histogram.add(0.01, False, NOW)
+    later = NOW + SLOTS * SLOT_SECONDS
+    assert sum(histogram.counts(later)) == 0
+    histogram.add(0.01, False, later)
+    assert sum(histogram.counts(later)) == 1
+    assert len(histogram._slots) == 1  # pylint: disable=W0212
+
+
+def test_percentile():
+    """Percentiles are the upper bound of their bin."""
+
+    counts = [0] * (len(BOUNDS) + 2)
+    counts[1] = 90
+    counts[4] = 10
+    counts[-1] = 3
+    assert percentile(counts, 50) == BOUNDS[1]
+    assert percentile(counts, 95) == BOUNDS[4]
+    counts[-2] = 100
+    assert percentile(counts, 95) == math.inf
+    assert percentile([0] * (len(BOUNDS) + 2), 50) == 0.0
@@ -0,0 +1,67 @@
+"""Tests for the memory accounting helpers and the response cache."""
+
+
+import sys
+import time
+
+from esi_bot.http_cache import ResponseCache
+from esi_bot.memory import SAMPLE
+from esi_bot.memory import deep_size
+from esi_bot.memory import evict_oldest
+
+
+def _filled_cache(count, expired):
+    """Return a cache of count entries, the first expired of them stale."""
+
+    cache = ResponseCache(max_entries=count)
+    now = time.time()
+    for number in range(count):
+        expires = now - 1 if number < expired else now + 60
+        cache._store(number, (expires, 200, b"{}"))  # pylint: disable=W0212
+    return cache
+
+
+def test_compact_drops_expired_first():
+    """Expired entries count towards the fraction to drop."""
+
+    cache = _filled_cache(100, 30)
+    assert cache.compact(0.1) == 30
+    assert len(cache) == 70
+    assert cache.get(29) is None
+    assert cache.get(30) == (200, b"{}")
+
+
+def test_compact_then_oldest():
+    """Once expired entries are gone, the oldest make up the rest."""
+
+    cache = _filled_cache(100, 5)
+    assert cache.compact(0.2) == 20
+    assert len(cache) == 80
+    assert cache.get(19) is None
+    assert cache.get(20) == (200, b"{}")
+
+
+def test_evict_oldest():
+    """The first inserted entries are dropped, rounded to nearest."""
+
+    mapping = {x: x for x in range(10)}
+    assert evict_oldest(mapping, 0.25) == 3
+    assert list(mapping) == list(range(3, 10))
+    assert evict_oldest({}, 0.5) == 0
+
+
+def test_deep_size_counts_contents():
+    """Containers are sized with their contents, shared objects once."""
+
+    text = "x" * 1000
+    assert deep_size(text) == sys.getsizeof(text)
+    assert deep_size([text]) > sys.getsizeof(text)
+    assert deep_size([text, text]) < 2 * sys.getsizeof(text)
+
+
+def test_deep_size_samples_large_containers():
+    """Sampled sizes of large containers are close to the real total."""
+
+    values = ["{:08d}".format(x) * 10 for x in range(SAMPLE * 20)]
+    exact = sys.getsizeof(values, 0) + sum(sys.getsizeof(x) for x in values)
+    assert abs(deep_size(values) - exact) < exact * 0.05
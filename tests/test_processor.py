@@ -0,0 +1,60 @@
+"""Tests for processing Slack message events."""
+
+
+import threading
+from unittest import mock
+
+from esi_bot.processor import Processor
+
+
+def _processor():
+    """Return a processor on a mock Slack client."""
+
+    slack = mock.Mock()
+    slack.api_call.return_value = {"ok": False}
+    return Processor(slack)
+
+
+def test_edit_while_processing():
+    """An edit arriving while the original is processed isn't replied to."""
+
+    processor = _processor()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def _process_event(*args):
+        """Block the first call until released."""
+
+        calls.append(args)
+        started.set()
+        release.wait(5)
+        return True
+
+    with mock.patch.object(processor, "_process_event", _process_event):
+        thread = threading.Thread(
+            target=processor._process_once,  # pylint: disable=W0212
+            args=("uuid", "1.0", "channel", "user", "!esi status"),
+        )
+        thread.start()
+        assert started.wait(5)
+        processor._process_once(  # pylint: disable=W0212
+            "uuid", "2.0", "channel", "user", "!esi status",
+        )
+        release.set()
+        thread.join(5)
+
+    assert len(calls) == 1
+
+
+def test_unreplied_released():
+    """Events which weren't replied to can be processed again."""
+
+    processor = _processor()
+    with mock.patch.object(processor, "_process_event",
+                           return_value=False) as process:
+        for _ in range(2):
+            processor._process_once(  # pylint: disable=W0212
+                "uuid", "1.0", "channel", "user", "hello",
+            )
+    assert process.call_count == 2
@@ -0,0 +1,45 @@
+"""Tests for refreshing the ESI specs."""
+
+
+from unittest import mock
+
+from esi_bot import ESI
+from esi_bot import request
+
+
+def _refresh(*args):
+    """Refresh the specs with every request mocked out.
+
+    Returns:
+        list of refreshed spec versions
+    """
+
+    def _multi_request(urls, essential=False):
+        """Answer every spec url with an empty spec."""
+
+        assert essential
+        return {x: (200, {"paths": {}}) for x in urls}
+
+    with mock.patch.object(request, "do_request", return_value=(200, [])), \
+            mock.patch.object(request, "multi_request", _multi_request), \
+            mock.patch.object(request, "update_diffs"), \
+            mock.patch.object(request, "update_index"), \
+            mock.patch.dict(request.ESI_SPECS, {ESI: request._initial_specs()}):
+        return [request.do_refresh(ESI, *args) for _ in range(2)]
+
+
+def test_fresh_specs_not_refetched():
+    """Specs are only fetched again once they're stale."""
+
+    first, second = _refresh()
+    assert sorted(first) == ["dev", "latest", "legacy"]
+    assert second == []
+
+
+def test_max_age():
+    """A shorter max age refetches sooner."""
+
+    assert [sorted(x) for x in _refresh(-1)] == [
+        ["dev", "latest", "legacy"],
+        ["dev", "latest", "legacy"],
+    ]
@@ -0,0 +1,66 @@
+"""Tests for validating requests against a spec's routes."""
+
+
+from esi_bot.routes import RouteTable
+
+
+SPEC = {"paths": {"/characters/{character_id}/": {"get": {"parameters": [
+    {
+        "name": "character_id",
+        "in": "path",
+        "type": "integer",
+        "format": "int32",
+        "required": True,
+    },
+    {
+        "name": "datasource",
+        "in": "query",
+        "type": "string",
+        "enum": ["tranquility", "singularity"],
+        "default": "tranquility",
+    },
+    {
+        "name": "ids",
+        "in": "query",
+        "type": "array",
+        "items": {"type": "integer"},
+        "maxItems": 3,
+        "required": True,
+    },
+]}}}}
+
+
+def _route():
+    """Return the route of the test spec."""
+
+    return RouteTable(SPEC).routes["/characters/{character_id}/"]
+
+
+def test_valid_request():
+    """A request matching the spec has no errors."""
+
+    assert _route().validate({"character_id": "123"}, "ids=1,2") == []
+    assert _route().required == ["ids"]
+
+
+def test_invalid_values():
+    """Bad types and enum values are described, with missing params."""
+
+    assert _route().validate({"character_id": "abc"}, "datasource=nope") == [
+        "`character_id` must be an integer (got `abc`)",
+        "`datasource` must be one of `tranquility`, `singularity` "
+        "(got `nope`)",
+        "`ids` is a required query param",
+    ]
+
+
+def test_ranges_and_array_lengths():
+    """Integers are range checked and arrays limited to maxItems."""
+
+    assert _route().validate(
+        {"character_id": "99999999999"},
+        "ids=1,2,3,4&unknown=1",
+    ) == [
+        "`character_id` must be at most 2147483647 (got `99999999999`)",
+        "`ids` allows at most 3 items",
+    ]
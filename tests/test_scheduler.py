@@ -0,0 +1,42 @@
+"""Tests for the background job scheduler."""
+
+
+import threading
+
+from esi_bot.scheduler import Job
+
+
+def test_overlapping_runs_skipped():
+    """A job asked to run while it's running is skipped and counted."""
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def _func():
+        """Block until released."""
+
+        started.set()
+        release.wait(5)
+
+    job = Job("test", _func, 60)
+    thread = threading.Thread(target=job.run)
+    thread.start()
+    assert started.wait(5)
+
+    assert job.running
+    assert job.run() is False
+    release.set()
+    thread.join(5)
+
+    assert not job.running
+    assert job.summary()["runs"] == 1
+    assert job.summary()["skipped"] == 1
+
+
+def test_failures_counted():
+    """Failing runs still count as runs, with their error."""
+
+    job = Job("test", lambda: 1 / 0, 60)
+    assert job.run() is True
+    assert job.failures == 1
+    assert "ZeroDivisionError" in job.last_error
@@ -0,0 +1,47 @@
+"""Tests for the inverted index and its BM25 ranking."""
+
+
+from esi_bot.search import InvertedIndex
+from esi_bot.search import tokenize
+
+
+def _index():
+    """Return an index of a few operations."""
+
+    index = InvertedIndex({"path": 3})
+    index.add(1, {"path": "/corporations/structures/", "summary": "list"})
+    index.add(2, {"path": "/universe/structures/", "summary": "structure"})
+    index.add(3, {"path": "/markets/orders/", "summary": "corporation"})
+    return index
+
+
+def test_tokenize():
+    """Stop words are dropped and plurals stemmed."""
+
+    assert tokenize("The Corporation's Structures") == [
+        "corporation", "s", "structure",
+    ]
+    assert tokenize(None) == []
+
+
+def test_ranking():
+    """Weighted fields and rarer terms rank higher."""
+
+    index = _index()
+    assert [x for _, x in index.search("corporation structures")] == [1, 2, 3]
+    assert [x for _, x in index.search("corporation")] == [1, 3]
+    assert index.search("nothing") == []
+
+
+def test_replace_and_remove():
+    """Documents can be replaced and removed incrementally."""
+
+    index = _index()
+    index.add(1, {"path": "/alliances/"})
+    assert len(index) == 3
+    assert [x for _, x in index.search("corporation")] == [3]
+
+    index.remove(3)
+    index.remove(3)
+    assert 3 not in index
+    assert index.search("corporation") == []
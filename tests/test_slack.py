@@ -0,0 +1,43 @@
+"""Tests for the pooled Slack Web API transport."""
+
+
+from unittest import mock
+
+from esi_bot import slack
+from esi_bot.slack import PooledSlackRequest
+
+
+def _response(status, content):
+    """Return a mock Web API response."""
+
+    return mock.Mock(status_code=status, content=content)
+
+
+def test_ok():
+    """Successes need a 200 and an ok of true in the body."""
+
+    _ok = slack._ok  # pylint: disable=W0212
+    assert _ok(_response(200, b'{"ok":true,"ts":"1"}'))
+    assert _ok(_response(200, b'{ "ok" : true }'))
+    assert not _ok(_response(200, b'{"ok":false,"error":"x"}'))
+    assert not _ok(_response(500, b'{"ok":true}'))
+    assert not _ok(_response(200, b""))
+
+
+def test_calls_recorded():
+    """Calls are timed per method, with their errors."""
+
+    responses = [
+        _response(200, b'{"ok":true}'),
+        _response(200, b'{"ok":false}'),
+    ]
+    requester = PooledSlackRequest()
+    with mock.patch.dict(slack.METHODS, clear=True), \
+            mock.patch.object(slack.SLACK_SESSION, "post",
+                              side_effect=responses):
+        for _ in responses:
+            requester.post_http_request("token", "chat.postMessage", {})
+        stats = slack.METHODS["chat.postMessage"]
+
+    assert stats.calls == 2
+    assert stats.errors == 1
@@ -0,0 +1,87 @@
+"""Tests for searching the operations in the loaded specs."""
+
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from esi_bot import ESI
+from esi_bot import spec_search
+from esi_bot.routes import RouteTable
+from esi_bot.spec_search import search_operations
+from esi_bot.spec_search import update_index
+
+
+def _spec(**summaries):
+    """Return a spec with a GET route per {path section: summary}."""
+
+    return {"paths": {
+        "/{}/".format(name): {"get": {
+            "summary": summary,
+            "tags": [name.capitalize()],
+            "operationId": "get_{}".format(name),
+        }}
+        for name, summary in summaries.items()
+    }}
+
+
+def _update(spec):
+    """Index the spec as the latest version, digesting its summaries.
+
+    Returns:
+        integer number of operations indexed
+    """
+
+    operations = {
+        ("get", path): SimpleNamespace(digest=route["get"]["summary"])
+        for path, route in spec["paths"].items()
+    }
+    with mock.patch.object(spec_search, "spec_operations",
+                           return_value=operations):
+        return update_index(ESI, "latest", RouteTable(spec))
+
+
+@pytest.fixture(autouse=True)
+def _empty_indexes():
+    """Start each test without any indexed specs."""
+
+    with mock.patch.dict(spec_search.INDEXES, clear=True), \
+            mock.patch.dict(spec_search._INDEXED, clear=True):  # pylint: disable=W0212
+        yield
+
+
+def _paths(query):
+    """Return the paths found for the query, best first."""
+
+    return [x[1] for x in search_operations(ESI, "latest", query)]
+
+
+def test_search():
+    """Operations are found by summary, path and tags."""
+
+    assert _update(_spec(
+        markets="Get market orders",
+        structures="Get structure information",
+    )) == 2
+    assert _paths("market orders") == ["/markets/"]
+    assert _paths("structures") == ["/structures/"]
+    assert _paths("structures endpoint") == ["/structures/"]
+    assert search_operations(ESI, "dev", "markets") is None
+
+
+def test_incremental_updates():
+    """Only new or changed operations are indexed, removed ones dropped."""
+
+    _update(_spec(markets="Get market orders", wars="List wars"))
+    assert _update(_spec(
+        markets="Get market history",
+        wars="List wars",
+        alliances="List alliances",
+    )) == 2
+    assert _paths("orders") == []
+    assert _paths("history") == ["/markets/"]
+
+    assert _update(_spec(alliances="List alliances")) == 0
+    assert _paths("wars") == []
+    assert _paths("list") == ["/alliances/"]
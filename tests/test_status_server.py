@@ -0,0 +1,48 @@
+"""Tests for server status change announcements."""
+
+
+from esi_bot.commands.status_server import ServerPoller
+from esi_bot.commands.status_server import _transitions
+
+
+ONLINE = (200, {"start_time": "2019-01-01T11:00:00Z", "players": 1})
+OFFLINE = (503, {"error": "offline"})
+RESTARTED = (200, {"start_time": "2019-01-02T11:00:00Z", "players": 1})
+FAILED = (502, {"error": "bad gateway"})
+
+
+def _announcements(*polls):
+    """Return what a poller announces over a series of poll results."""
+
+    poller = ServerPoller("tranquility")
+    announced = []
+    for result in polls:
+        announced.extend(poller._confirm(result))  # pylint: disable=W0212
+    return announced
+
+
+def test_transitions():
+    """Changes between two statuses are described."""
+
+    assert _transitions("Tranquility", ONLINE, OFFLINE) == [
+        ":fire: Tranquility is offline",
+    ]
+    assert _transitions("Tranquility", ONLINE, ONLINE) == []
+    assert _transitions("Tranquility", RESTARTED, ONLINE) != []
+
+
+def test_single_poll_not_announced():
+    """A single odd poll isn't announced, nor is its recovery."""
+
+    assert _announcements(ONLINE, OFFLINE, ONLINE, FAILED, ONLINE) == []
+
+
+def test_confirmed_changes_announced():
+    """Changes seen on consecutive polls are announced once."""
+
+    announced = _announcements(ONLINE, OFFLINE, OFFLINE, OFFLINE)
+    assert announced == [":fire: Tranquility is offline"]
+
+    announced = _announcements(ONLINE, RESTARTED, RESTARTED, RESTARTED)
+    assert len(announced) == 1
+    assert "restarted" in announced[0]
@@ -0,0 +1,78 @@
+"""Tests for request tracing."""
+
+
+import queue
+from unittest import mock
+
+from esi_bot import tracing
+from esi_bot.processor import Processor
+
+
+def test_spans_join_the_trace():
+    """Spans opened inside a trace are its children, in order."""
+
+    with mock.patch.object(tracing, "_finished"):
+        with tracing.trace("event", channel="C1") as root:
+            with tracing.span("command", command="status") as command:
+                with tracing.span("esi.request"):
+                    pass
+
+    spans = root.trace.spans
+    assert [x.name for x in spans] == ["event", "command", "esi.request"]
+    assert spans[1].parent_id == root.span_id
+    assert spans[2].parent_id == command.span_id
+    assert all(x.duration is not None for x in spans)
+    assert root.trace.attr("command") == "status"
+
+
+def test_spans_outside_a_trace():
+    """Spans outside of any trace record nothing."""
+
+    with tracing.span("users.get_name") as span:
+        span.set(found=True)
+    assert span is tracing.NO_SPAN
+
+
+def test_slowest_kept():
+    """Only the slowest traces are kept."""
+
+    with mock.patch.object(tracing, "SLOWEST", []), \
+            mock.patch.object(tracing, "KEEP_SLOWEST", 2), \
+            mock.patch.object(tracing, "TRACE_FILE", None), \
+            mock.patch.object(tracing, "OTLP_ENDPOINT", None):
+        for duration in (0.3, 0.1, 0.2):
+            finished = tracing.Trace()
+            tracing.Span(finished, "event").duration = duration
+            tracing._finished(finished)  # pylint: disable=W0212
+        kept = tracing.slowest()
+
+    assert [x.duration for x in kept] == [0.3, 0.2]
+
+
+def test_exports_bounded():
+    """Traces past the export queue's limit are dropped and counted."""
+
+    with mock.patch.object(tracing, "_EXPORTS", queue.Queue(maxsize=2)), \
+            mock.patch.object(tracing, "_EXPORTER", [mock.Mock()]), \
+            mock.patch.dict(tracing.EXPORTS, dropped=0):
+        for _ in range(5):
+            tracing._queue_export(tracing.Trace())  # pylint: disable=W0212
+        assert tracing._EXPORTS.qsize() == 2  # pylint: disable=W0212
+        assert tracing.EXPORTS["dropped"] == 3
+
+
+def test_only_messages_for_us_traced():
+    """Messages without the bot's prefix aren't traced."""
+
+    slack = mock.Mock()
+    slack.api_call.return_value = {"ok": False}
+    processor = Processor(slack)
+    with mock.patch.object(tracing, "trace") as trace, \
+            mock.patch.object(processor, "_process_message_event") as process:
+        processor.process_event({"type": "message", "text": "hello"})
+        processor.process_event({
+            "type": "message",
+            "message": {"text": "!ESI status"},
+        })
+    assert trace.call_count == 1
+    assert process.call_count == 2
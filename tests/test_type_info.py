@@ -0,0 +1,19 @@
+"""Tests for the item command."""
+
+
+from unittest import mock
+
+from esi_bot import COMMANDS
+from esi_bot import MESSAGE
+from esi_bot.commands import type_info
+
+
+def test_refused_request():
+    """A request refused by the governor gets a readable reply."""
+
+    refusal = (420, "refusing to request x: error limit is low")
+    msg = MESSAGE("user", "item", ["34"])
+    with mock.patch.object(type_info, "do_request", return_value=refusal), \
+            mock.patch.object(type_info, "type_names"):
+        reply = COMMANDS[("item", "item_id", "type", "type_id")](msg)
+    assert reply == "couldn't look up item 34: {}".format(refusal[1])
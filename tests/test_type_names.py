@@ -0,0 +1,91 @@
+"""Tests for the local type name index."""
+
+
+import threading
+from unittest import mock
+
+import pytest
+
+from esi_bot import ESI
+from esi_bot import type_names
+from esi_bot.type_names import MAX_RESOLVE
+from esi_bot.type_names import TypeNames
+from esi_bot.type_names import parse_language
+
+
+def _index():
+    """Return a small index, in a language which isn't bulk loaded."""
+
+    index = TypeNames(ESI, "de")
+    index.add(34, "Tritanium")
+    index.add(35, "Pyerite")
+    index.add(11399, "Morphite")
+    index.add(3683, "Oxygen")
+    return index
+
+
+def test_find():
+    """Exact matches win, then prefix matches, then fuzzy ones."""
+
+    index = _index()
+    index.add(99, "Tritanium Ore")
+    assert index.find("tritanium") == [(34, "Tritanium")]
+    assert index.find("  TRIT ") == [(34, "Tritanium"), (99, "Tritanium Ore")]
+    assert index.find("pyrite") == [(35, "Pyerite")]
+    assert index.find("zydrine") == []
+
+
+def test_rename():
+    """Adding a known type again replaces its name."""
+
+    index = _index()
+    index.add(34, "Tritanium II")
+    assert len(index) == 4
+    assert index.find("tritanium ii") == [(34, "Tritanium II")]
+    assert index.find("tritanium") == [(34, "Tritanium II")]
+
+
+def test_concurrent_adds():
+    """Types added from many threads at once all end up searchable."""
+
+    index = TypeNames(ESI, "de")
+    threads = [
+        threading.Thread(target=lambda x=x: [
+            index.add(x * 1000 + y, "type {} {}".format(x, y))
+            for y in range(200)
+        ])
+        for x in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(index) == 1600
+    assert len(index.find("type", limit=2000)) == 1600
+
+
+def test_languages():
+    """Only ESI's languages are accepted, and only defaults bulk load."""
+
+    with mock.patch.dict(type_names.INDEXES, clear=True):
+        assert not type_names.type_names(ESI, "de").bulk
+        with pytest.raises(ValueError):
+            type_names.type_names(ESI, "xx")
+    assert parse_language(["lang=de", "34"]) == ("de", ["34"])
+
+
+def test_other_languages_resolved_one_by_one():
+    """Names in other languages are resolved for a few types at most."""
+
+    index = TypeNames(ESI, "de")
+
+    def _multi_request(urls):
+        """Answer every type url with a name."""
+
+        return {x: (200, {"name": "Typ"}) for x in urls}
+
+    with mock.patch.object(type_names, "multi_request", _multi_request):
+        names = index._resolve(list(range(50)))  # pylint: disable=W0212
+    assert names == {x: "Typ" for x in range(MAX_RESOLVE)}
+    assert index.sync() == 0